@@ -0,0 +1,640 @@
+"""Offline benchmarks for the extraction pipeline.
+
+`dedup` times character deduplication on synthetic mentions. `pipeline` runs
+the full pipeline on synthetic PDFs against a local stand-in for the Ollama
+API, so throughput and prompt-prefix reuse regressions show up without a GPU
+or a real model.
+`prefilter` measures how many model calls --prefilter and --dramatis-personae
+save on a book with a cast list and sparse dialogue, and what they cost in
+recall. `cascade` compares --model-cascade against the large model alone.
+`passes` checks --single-pass against two-pass on a synthetic book: model calls
+made by each mode and single-pass recall, failing below --min-recall.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import string
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pymupdf
+
+from extract import (
+    DEFAULT_CONTEXT_FILL,
+    EXTRACTION_PASSES,
+    SINGLE_PASS,
+    TWO_PASS,
+    _chunk_text,
+    build_graph_data,
+    build_provider_config,
+    chunk_token_budget,
+    compare_pass_modes,
+    deduplicate_characters,
+    load_pdf_texts,
+    ModelCascade,
+    run_extraction,
+    write_graph_json,
+)
+from metrics import METRICS
+from names import name_key
+from scheduler import DEFAULT_CONCURRENCY, ChunkScheduler
+
+TITLES = ("Captain", "Lord", "First Captain", "Brother", "Warmaster", "Sergeant")
+FACTIONS = ("Luna Wolves", "Sons of Horus", "Imperial Army", "Unknown", "")
+ROLES = ("Captain", "Primarch", "Remembrancer", "Unknown", "")
+
+# Characters the synthetic books mention and the fake model "finds"
+CAST = (
+    ("Garviel Loken", "Luna Wolves", "Captain"),
+    ("Ezekyle Abaddon", "Luna Wolves", "First Captain"),
+    ("Horus Lupercal", "Luna Wolves", "Warmaster"),
+    ("Tarik Torgaddon", "Luna Wolves", "Captain"),
+    ("Mersadie Oliton", "Remembrancers", "Remembrancer"),
+    ("Kyril Sindermann", "Remembrancers", "Iterator"),
+    ("Nathaniel Garro", "Death Guard", "Battle-Captain"),
+    ("Saul Tarvitz", "Emperor's Children", "Captain"),
+)
+FILLER = (
+    "The fleet held position above the burning world.",
+    "Orders came down from the flagship before dawn.",
+    "Smoke rolled across the broken walls of the city.",
+    "Nobody spoke of the warp storm that had delayed them.",
+    "The lodge met again in the lower decks.",
+)
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 9))).capitalize()
+
+
+def synthetic_mentions(n: int, seed: int = 0, mentions_per_character: int = 20) -> list[dict]:
+    """Build n character mentions of n / mentions_per_character distinct people,
+    each mentioned by full name, first name, surname or title plus surname."""
+    rng = random.Random(seed)
+    people = [(_word(rng), _word(rng)) for _ in range(max(1, n // mentions_per_character))]
+    mentions = []
+    for _ in range(n):
+        first, last = rng.choice(people)
+        name = rng.choice((
+            f"{first} {last}",
+            first,
+            last,
+            f"{rng.choice(TITLES)} {last}",
+        ))
+        mentions.append({
+            "name": name,
+            "description": rng.choice(("", f"{name} of the {_word(rng)}")),
+            "faction": rng.choice(FACTIONS),
+            "role": rng.choice(ROLES),
+        })
+    return mentions
+
+
+def legacy_deduplicate_characters(characters: list[dict]) -> list[int]:
+    """The original first-match pairwise grouping, kept for comparison.
+
+    Returns only group sizes; the merging of fields is not what is being timed.
+    """
+    groups: dict[str, int] = {}
+    for char in characters:
+        name_parts = set(char["name"].lower().split())
+        for key in groups:
+            if name_parts & set(key.lower().split()):
+                groups[key] += 1
+                break
+        else:
+            groups[char["name"]] = 1
+    return list(groups.values())
+
+
+class FakeOllama:
+    """Local HTTP stand-in for the Ollama generate API.
+
+    Every request sleeps for `latency` seconds, fails with a 503 with
+    probability `error_rate`, and otherwise answers with canned fenced-JSON
+    extractions for the CAST members named in the chunk. `models` maps a
+    model name to its own (latency, weak_rate): with probability weak_rate
+    that model answers like a weak one, with no characters and with
+    relationships between nameless strangers.
+    """
+
+    def __init__(
+        self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+        models: dict[str, tuple[float, float]] | None = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.models = models or {}
+        self.model_requests: dict[str, int] = {}
+        self._last_prompt: dict[str, str] = {}
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._reply(200, {"models": []})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                latency, weak_rate = fake.models.get(body.get("model"), (fake.latency, 0.0))
+                time.sleep(latency)
+                with fake._lock:
+                    fake.requests += 1
+                    fake.model_requests[body.get("model")] = fake.model_requests.get(body.get("model"), 0) + 1
+                    failed = fake._rng.random() < fake.error_rate
+                    fake.errors += failed
+                    weak = fake._rng.random() < weak_rate
+                if failed:
+                    self._reply(503, {"error": "server overloaded"})
+                else:
+                    response = fake.respond(body["prompt"], weak)
+                    self._reply(200, {"response": response, "done": True, **fake.timings(body, response, latency)})
+
+            def _reply(self, status: int, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def timings(self, body: dict, response: str, latency: float) -> dict:
+        """Ollama's timing fields for a request, at 4 characters per token.
+
+        Like Ollama, the fake keeps the KV cache of each model's last prompt:
+        the part of a prompt shared with it is not evaluated again. The first
+        request for a model also pays a load.
+        """
+        model, prompt = body.get("model"), body["prompt"]
+        with self._lock:
+            previous = self._last_prompt.get(model)
+            self._last_prompt[model] = prompt
+        shared = len(os.path.commonprefix([previous, prompt])) if previous is not None else 0
+        evaluated = (len(prompt) - shared) // 4
+        generated = len(response) // 4
+        # Prompt tokens are evaluated ~20x faster than tokens are generated
+        per_token = latency * 1e9 / max(1, evaluated / 20 + generated)
+        return {
+            "load_duration": int(latency * 1e9) if previous is None else 0,
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(per_token * evaluated / 20),
+            "eval_count": generated,
+            "eval_duration": int(per_token * generated),
+        }
+
+    def respond(self, prompt: str, weak: bool = False) -> str:
+        # The few-shot examples come first; the chunk follows the last "Q:"
+        examples, _, chunk = prompt.rpartition("Q:")
+        found = [c for c in CAST if c[0] in chunk]
+        extractions = []
+        if '"character"' in examples and not weak:
+            for name, faction, role in found:
+                extractions.append({
+                    "character": name,
+                    "character_attributes": {"faction": faction, "role": role, "description": f"{role} of the {faction}"},
+                })
+        if '"relationship"' in examples:
+            for (source, *_), (target, *_) in zip(found, found[1:]):
+                extractions.append({
+                    "relationship": f"{source} and {target}",
+                    "relationship_attributes": {
+                        "source_character": "someone" if weak else source,
+                        "target_character": "a stranger" if weak else target,
+                        "type": "ally",
+                        "description": f"{source} fights beside {target}",
+                    },
+                })
+        return "```json\n" + json.dumps({"extractions": extractions}) + "\n```"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def synthetic_pdf(path: str, pages: int, seed: int = 0) -> None:
+    """Write a PDF of `pages` pages of filler prose that mentions the CAST."""
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    for _ in range(pages):
+        paragraphs = []
+        for _ in range(4):
+            sentences = []
+            for _ in range(rng.randint(4, 7)):
+                if rng.random() < 0.4:
+                    a, b = rng.sample(CAST, 2)
+                    sentences.append(f"{a[0]} spoke with {b[0]} about the campaign.")
+                else:
+                    sentences.append(rng.choice(FILLER))
+            paragraphs.append(" ".join(sentences))
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (50, 50, -50, -50), "\n\n".join(paragraphs), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def synthetic_book(pages: int, seed: int = 0, scenery: float = 0.6) -> str:
+    """Book text that opens with a dramatis personae of the CAST. A `scenery`
+    fraction of its 10-page chapters are action or description naming at most
+    one of them; the rest are dialogue between pairs, as in synthetic_pdf()."""
+    rng = random.Random(seed)
+    parts = ["DRAMATIS PERSONAE", *(f"{name}, {role}, {faction}" for name, faction, role in CAST), "", "PART ONE"]
+    solo = None
+    for page in range(pages):
+        if page % 10 == 0:
+            solo = rng.choice(CAST)[0] if rng.random() < scenery else None
+        sentences = []
+        for _ in range(rng.randint(16, 28)):
+            if solo is not None:
+                sentences.append(f"{solo} watched in silence." if rng.random() < 0.1 else rng.choice(FILLER))
+            elif rng.random() < 0.4:
+                a, b = rng.sample(CAST, 2)
+                sentences.append(f"{a[0]} spoke with {b[0]} about the campaign.")
+            else:
+                sentences.append(rng.choice(FILLER))
+        parts.append(" ".join(sentences))
+    return "\n\n".join(parts)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux; PDF worker processes count as children
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(self_kb, children_kb) / 1024
+
+
+def bench_pipeline(args) -> dict:
+    """Run the main.py pipeline stages end to end against FakeOllama and
+    return wall time, chunks/sec, peak RSS and per-stage timings."""
+    passes = SINGLE_PASS if args.single_pass else TWO_PASS
+    stages: dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def stage(name):
+        start = time.perf_counter()
+        yield
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+    METRICS.reset()
+    with tempfile.TemporaryDirectory() as tmp, FakeOllama(args.latency, args.error_rate, args.seed) as server:
+        pdf_paths = []
+        for i in range(args.books):
+            path = os.path.join(tmp, f"book{i:03d}.pdf")
+            synthetic_pdf(path, args.pages, seed=args.seed + i)
+            pdf_paths.append(path)
+
+        config = build_provider_config("ollama", "llama3.1:latest")
+        config["model_url"] = server.url
+
+        wall_start = time.perf_counter()
+        with stage("pdf_text"):
+            loaded = load_pdf_texts(pdf_paths, workers=args.pdf_workers)
+        books = [(os.path.basename(path), text) for path, (text, _) in zip(pdf_paths, loaded)]
+
+        with stage("chunk"):
+            chunks = 0
+            for pass_name in passes:
+                prompt, examples, _ = EXTRACTION_PASSES[pass_name]
+                budget = chunk_token_budget(prompt, examples, config, DEFAULT_CONTEXT_FILL)
+                chunks += sum(len(_chunk_text(text, budget)) for _, text in books)
+
+        scheduler = ChunkScheduler(concurrency=args.concurrency)
+        try:
+            with stage("extract"), contextlib.redirect_stdout(None if args.verbose else io.StringIO()):
+                results = run_extraction(books, config, passes=passes, scheduler=scheduler)
+        finally:
+            scheduler.shutdown()
+
+        characters = [c for r in results for c in r["characters"]]
+        relationships = [rel for r in results for rel in r["relationships"]]
+        with stage("dedup"):
+            characters = deduplicate_characters(characters)
+        with stage("graph"):
+            graph = build_graph_data(characters, relationships)
+        with stage("write"), contextlib.redirect_stdout(io.StringIO()):
+            write_graph_json(graph, os.path.join(tmp, "data.json"))
+        wall = time.perf_counter() - wall_start
+
+    return {
+        "books": args.books,
+        "pages_per_book": args.pages,
+        "passes": list(passes),
+        "chunks": chunks,
+        "requests": server.requests,
+        "errors": server.errors,
+        "nodes": len(graph["nodes"]),
+        "edges": len(graph["edges"]),
+        "wall_seconds": round(wall, 3),
+        "chunks_per_second": round(chunks / stages["extract"], 2) if stages["extract"] else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "prompt_tokens": int(METRICS.total("ollama_prompt_tokens")),
+        "prompt_tokens_evaluated": int(METRICS.total("ollama_prompt_eval_tokens")),
+        "stages": {name: round(seconds, 4) for name, seconds in stages.items()},
+    }
+
+
+def _print_pipeline_report(report: dict) -> None:
+    print(f"{report['books']} book(s) x {report['pages_per_book']} pages, passes: {', '.join(report['passes'])}")
+    print(f"  {report['chunks']} chunks, {report['requests']} requests ({report['errors']} failed)")
+    print(f"  {report['nodes']} characters, {report['edges']} relationships")
+    print(f"  Wall time:  {report['wall_seconds']:.2f}s")
+    print(f"  Throughput: {report['chunks_per_second']} chunks/s")
+    print(f"  Peak RSS:   {report['peak_rss_mb']:.0f} MB")
+    if report["prompt_tokens"]:
+        reused = 1 - report["prompt_tokens_evaluated"] / report["prompt_tokens"]
+        print(
+            f"  Prompt eval: {report['prompt_tokens_evaluated']} of ~{report['prompt_tokens']} prompt tokens "
+            f"(~{max(0.0, reused):.0%} reused from the prefix cache)"
+        )
+    for name, seconds in report["stages"].items():
+        print(f"    {name:<9} {seconds:>8.3f}s")
+
+
+def bench_prefilter(args) -> list[dict]:
+    """Run the two-pass extraction of one synthetic book with and without the
+    prefilter and dramatis personae trimming, counting model requests and
+    comparing the resulting graph against the unfiltered one."""
+    books = [("synthetic", synthetic_book(args.pages, args.seed, args.scenery))]
+    modes = (
+        ("baseline", {}),
+        ("prefilter", {"prefilter": True}),
+        ("prefilter + dramatis personae", {"prefilter": True, "dramatis_personae": True}),
+    )
+    rows = []
+    reference = None
+    for name, options in modes:
+        METRICS.reset()
+        with FakeOllama(args.latency, seed=args.seed) as server:
+            config = build_provider_config("ollama", "llama3.1:latest")
+            config["model_url"] = server.url
+            # A small context window splits the book into many chunks
+            config["language_model_params"]["num_ctx"] = args.num_ctx
+            scheduler = ChunkScheduler(concurrency=args.concurrency)
+            start = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = run_extraction(books, config, passes=TWO_PASS, scheduler=scheduler, **options)[0]
+            finally:
+                scheduler.shutdown()
+            seconds = time.perf_counter() - start
+        graph = build_graph_data(deduplicate_characters(result["characters"]), result["relationships"])
+        nodes = {name_key(n["name"]) for n in graph["nodes"]}
+        edges = {(e["source"], e["target"], e["type"]) for e in graph["edges"]}
+        if reference is None:
+            reference = (nodes, edges)
+        rows.append({
+            "mode": name,
+            "requests": server.requests,
+            "prefiltered": int(METRICS.total("chunks_prefiltered")),
+            "seconds": round(seconds, 3),
+            "character_recall": len(nodes & reference[0]) / len(reference[0]) if reference[0] else 1.0,
+            "relationship_recall": len(edges & reference[1]) / len(reference[1]) if reference[1] else 1.0,
+        })
+    return rows
+
+
+# Model names of the cascade benchmark; both resolve to the Ollama provider
+CASCADE_SMALL = "llama3.2:3b"
+CASCADE_LARGE = "llama3.1:70b"
+
+
+def bench_cascade(args) -> list[dict]:
+    """Run the two-pass extraction of one synthetic book with the large model
+    alone, the small model alone and the small -> large cascade, counting
+    requests per model and comparing each graph against the large model's."""
+    books = [("synthetic", synthetic_book(args.pages, args.seed, scenery=0.0))]
+    fake_models = {
+        CASCADE_SMALL: (args.latency, args.weak_rate),
+        CASCADE_LARGE: (args.latency * args.slowdown, 0.0),
+    }
+    modes = (("large only", [CASCADE_LARGE]), ("small only", [CASCADE_SMALL]), ("cascade", [CASCADE_SMALL, CASCADE_LARGE]))
+    rows = []
+    reference = None
+    for name, models in modes:
+        METRICS.reset()
+        with FakeOllama(seed=args.seed, models=fake_models) as server:
+            configs = []
+            for model in models:
+                config = build_provider_config("ollama", model)
+                config["model_url"] = server.url
+                config["language_model_params"]["num_ctx"] = args.num_ctx
+                configs.append(config)
+            cascade = ModelCascade(configs) if len(configs) > 1 else None
+            scheduler = ChunkScheduler(concurrency=args.concurrency)
+            start = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = run_extraction(
+                        books, configs[0], passes=TWO_PASS, scheduler=scheduler, cascade=cascade
+                    )[0]
+            finally:
+                scheduler.shutdown()
+            seconds = time.perf_counter() - start
+        graph = build_graph_data(deduplicate_characters(result["characters"]), result["relationships"])
+        nodes = {name_key(n["name"]) for n in graph["nodes"]}
+        edges = {(e["source"], e["target"], e["type"]) for e in graph["edges"]}
+        if reference is None:
+            reference = (nodes, edges)
+        rows.append({
+            "mode": name,
+            "small_requests": server.model_requests.get(CASCADE_SMALL, 0),
+            "large_requests": server.model_requests.get(CASCADE_LARGE, 0),
+            "seconds": round(seconds, 3),
+            "character_recall": len(nodes & reference[0]) / len(reference[0]) if reference[0] else 1.0,
+            "relationship_recall": len(edges & reference[1]) / len(reference[1]) if reference[1] else 1.0,
+        })
+    return rows
+
+
+def bench_passes(args) -> dict:
+    """compare_pass_modes() on one synthetic book against a fake Ollama server."""
+    books = [("synthetic", synthetic_book(args.pages, args.seed, scenery=0.0))]
+    METRICS.reset()
+    with FakeOllama(args.latency, seed=args.seed) as server:
+        config = build_provider_config("ollama", "llama3.1:latest")
+        config["model_url"] = server.url
+        config["language_model_params"]["num_ctx"] = args.num_ctx
+        scheduler = ChunkScheduler(concurrency=args.concurrency)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                report = compare_pass_modes(books, config, scheduler=scheduler)
+        finally:
+            scheduler.shutdown()
+    report["requests"] = server.requests
+    return report
+
+
+def bench_dedup(sizes: list[int], legacy_max: int, seed: int) -> None:
+    print(f"{'mentions':>10} {'groups':>8} {'seconds':>9} {'µs/mention':>11} {'legacy s':>9}")
+    for n in sizes:
+        mentions = synthetic_mentions(n, seed)
+        start = time.perf_counter()
+        groups = deduplicate_characters(mentions)
+        elapsed = time.perf_counter() - start
+
+        legacy = "-"
+        if n <= legacy_max:
+            start = time.perf_counter()
+            legacy_deduplicate_characters(mentions)
+            legacy = f"{time.perf_counter() - start:.2f}"
+
+        print(f"{n:>10} {len(groups):>8} {elapsed:>9.2f} {1e6 * elapsed / n:>11.2f} {legacy:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lore-graph pipeline stages")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    dedup = sub.add_parser("dedup", help="Character deduplication on synthetic mentions")
+    dedup.add_argument(
+        "--sizes", default="10000,100000,1000000",
+        help="Comma-separated mention counts (default: 10000,100000,1000000)",
+    )
+    dedup.add_argument(
+        "--legacy-max", type=int, default=10000,
+        help="Also time the old pairwise grouping up to this size (default: 10000)",
+    )
+    dedup.add_argument("--seed", type=int, default=0)
+
+    pipeline = sub.add_parser("pipeline", help="End-to-end run on synthetic PDFs against a fake Ollama server")
+    pipeline.add_argument("--books", type=int, default=4, help="Number of synthetic PDFs (default: 4)")
+    pipeline.add_argument("--pages", type=int, default=50, help="Pages per PDF (default: 50)")
+    pipeline.add_argument(
+        "--latency", type=float, default=0.05, help="Seconds the fake model takes per request (default: 0.05)"
+    )
+    pipeline.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 503 (default: 0)"
+    )
+    pipeline.add_argument(
+        "--concurrency", "-j", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Chunk requests in flight (default: {DEFAULT_CONCURRENCY})",
+    )
+    pipeline.add_argument("--single-pass", action="store_true", help="Use the fused single-pass mode")
+    pipeline.add_argument("--pdf-workers", type=int, default=None, help="PDF parsing processes (default: CPU count)")
+    pipeline.add_argument("--seed", type=int, default=0)
+    pipeline.add_argument("--json", default=None, help="Also write the report as JSON to this path")
+    pipeline.add_argument("--verbose", action="store_true", help="Show per-chunk progress output")
+
+    prefilter = sub.add_parser("prefilter", help="Model calls saved by --prefilter and --dramatis-personae")
+    prefilter.add_argument("--pages", type=int, default=60, help="Pages in the synthetic book (default: 60)")
+    prefilter.add_argument(
+        "--scenery", type=float, default=0.6,
+        help="Fraction of chapters naming at most one character (default: 0.6)",
+    )
+    prefilter.add_argument(
+        "--num-ctx", type=int, default=4096, help="Model context size, which sets the chunk size (default: 4096)"
+    )
+    prefilter.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds the fake model takes per request (default: 0)"
+    )
+    prefilter.add_argument(
+        "--concurrency", "-j", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Chunk requests in flight (default: {DEFAULT_CONCURRENCY})",
+    )
+    prefilter.add_argument("--seed", type=int, default=0)
+
+    cascade = sub.add_parser("cascade", help="Model calls and time of --model-cascade against the large model alone")
+    cascade.add_argument("--pages", type=int, default=60, help="Pages in the synthetic book (default: 60)")
+    cascade.add_argument(
+        "--num-ctx", type=int, default=4096, help="Model context size, which sets the chunk size (default: 4096)"
+    )
+    cascade.add_argument(
+        "--latency", type=float, default=0.05, help="Seconds the small fake model takes per request (default: 0.05)"
+    )
+    cascade.add_argument(
+        "--slowdown", type=float, default=6.0, help="How many times slower the large model is (default: 6)"
+    )
+    cascade.add_argument(
+        "--weak-rate", type=float, default=0.2,
+        help="Fraction of chunks the small model answers badly (default: 0.2)",
+    )
+    cascade.add_argument(
+        "--concurrency", "-j", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Chunk requests in flight (default: {DEFAULT_CONCURRENCY})",
+    )
+    cascade.add_argument("--seed", type=int, default=0)
+
+    passes = sub.add_parser("passes", help="Model calls and recall of --single-pass against two-pass")
+    passes.add_argument("--pages", type=int, default=30, help="Pages in the synthetic book (default: 30)")
+    passes.add_argument(
+        "--num-ctx", type=int, default=4096, help="Model context size, which sets the chunk size (default: 4096)"
+    )
+    passes.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds the fake model takes per request (default: 0)"
+    )
+    passes.add_argument(
+        "--min-recall", type=float, default=0.9,
+        help="Exit with status 1 if single-pass character or relationship recall is below this (default: 0.9)",
+    )
+    passes.add_argument(
+        "--concurrency", "-j", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Chunk requests in flight (default: {DEFAULT_CONCURRENCY})",
+    )
+    passes.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.bench == "passes":
+        report = bench_passes(args)
+        calls = report["llm_calls"]
+        print(f"Model calls: two-pass {calls['two_pass']}, single-pass {calls['single_pass']} ({report['requests']} served)")
+        failed = False
+        for kind in ("characters", "relationships"):
+            r = report[kind]
+            print(
+                f"{kind.capitalize()}: two-pass {r['reference']}, single-pass {r['candidate']}, "
+                f"recall {r['recall']:.0%}, precision {r['precision']:.0%}"
+            )
+            failed = failed or r["recall"] < args.min_recall
+        if failed:
+            print(f"Single-pass recall is below {args.min_recall:.0%}", file=sys.stderr)
+            sys.exit(1)
+    elif args.bench == "prefilter":
+        print(f"{'mode':<30} {'requests':>8} {'skipped':>8} {'seconds':>8} {'char recall':>12} {'rel recall':>11}")
+        for row in bench_prefilter(args):
+            print(
+                f"{row['mode']:<30} {row['requests']:>8} {row['prefiltered']:>8} {row['seconds']:>8.2f} "
+                f"{row['character_recall']:>12.0%} {row['relationship_recall']:>11.0%}"
+            )
+    elif args.bench == "cascade":
+        print(f"{'mode':<12} {'small req':>9} {'large req':>9} {'seconds':>8} {'char recall':>12} {'rel recall':>11}")
+        for row in bench_cascade(args):
+            print(
+                f"{row['mode']:<12} {row['small_requests']:>9} {row['large_requests']:>9} {row['seconds']:>8.2f} "
+                f"{row['character_recall']:>12.0%} {row['relationship_recall']:>11.0%}"
+            )
+    elif args.bench == "dedup":
+        bench_dedup([int(s) for s in args.sizes.split(",")], args.legacy_max, args.seed)
+    elif args.bench == "pipeline":
+        report = bench_pipeline(args)
+        _print_pipeline_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
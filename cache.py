@@ -0,0 +1,122 @@
+"""Content-addressed on-disk cache for per-chunk extraction results."""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = "data/cache"
+DEFAULT_CACHE_MAX_MB = 1024
+
+# Bump when the cached payload format changes so stale entries are never read
+CACHE_VERSION = 1
+
+
+def make_key(*parts) -> str:
+    """Hash arbitrary JSON-serializable parts into a stable hex cache key."""
+    payload = json.dumps([CACHE_VERSION, *parts], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """Stores one JSON file per key under cache_dir, evicting least-recently-used
+    entries once the total size exceeds max_bytes.
+
+    Recency is tracked in memory, seeded once from file mtimes when the cache
+    is opened; mtimes are still refreshed on every hit so the order survives
+    restarts.
+    """
+
+    def __init__(
+        self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024, name: str = "Cache"
+    ):
+        self.cache_dir = cache_dir
+        self.name = name
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._sizes = self._scan()
+        self._total = sum(self._sizes.values())
+
+    def _scan(self) -> OrderedDict[str, int]:
+        """Sizes of every entry, least recently used first."""
+        entries = []
+        # Only the two-character shard directories belong to this cache; other
+        # subdirectories (e.g. the PDF text cache) are separate caches
+        for shard in os.scandir(self.cache_dir):
+            if not (shard.is_dir() and len(shard.name) == 2):
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        entries.sort()
+        return OrderedDict((path, size) for _, path, size in entries)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached value for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            # Refresh mtime so eviction treats this entry as recently used
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            if path in self._sizes:
+                self._sizes.move_to_end(path)
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: dict) -> None:
+        """Store value under key, then evict old entries if over the size limit."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f, ensure_ascii=False)
+        size = os.path.getsize(tmp_path)
+
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._total += size - self._sizes.get(path, 0)
+            self._sizes[path] = size
+            self._sizes.move_to_end(path)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least-recently-used entries until the cache fits in max_bytes.
+
+        The entry just written is the most recently used, so it is never evicted.
+        """
+        while self._total > self.max_bytes and len(self._sizes) > 1:
+            path, size = self._sizes.popitem(last=False)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total -= size
+            self.evictions += 1
+
+    def summary(self) -> str:
+        """Human-readable hit/miss line for the end-of-run report."""
+        lookups = self.hits + self.misses
+        rate = (100 * self.hits / lookups) if lookups else 0.0
+        line = f"{self.name}: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
+        if self.evictions:
+            line += f", {self.evictions} evicted"
+        return line
@@ -0,0 +1,122 @@
+"""Per-book extraction artifacts for incremental corpus runs."""
+
+import hashlib
+import json
+import os
+
+DEFAULT_CORPUS_DIR = "data/books"
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path: str) -> str:
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CorpusStore:
+    """Keeps one JSON artifact of extracted characters and relationships per book,
+    keyed by the PDF's content hash, plus a manifest of the books in the library.
+
+    Each artifact also records the extraction fingerprint (model, prompts,
+    examples, passes) it was produced with, so a config change counts as a
+    changed book rather than silently reusing stale results. A book saved
+    with chunks missing is marked incomplete and counts as changed until a
+    later run extracts all of it.
+    """
+
+    def __init__(self, corpus_dir: str = DEFAULT_CORPUS_DIR):
+        self.corpus_dir = corpus_dir
+        os.makedirs(corpus_dir, exist_ok=True)
+        self._manifest_path = os.path.join(corpus_dir, MANIFEST_NAME)
+        try:
+            with open(self._manifest_path) as f:
+                self.manifest: dict[str, dict] = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def _artifact_path(self, sha256: str) -> str:
+        return os.path.join(self.corpus_dir, f"{sha256}.json")
+
+    def plan(self, books: dict[str, str], fingerprint: str, prune: bool = True) -> dict[str, list[str]]:
+        """Diff {book_name: sha256} against the manifest.
+
+        Returns book names grouped into `added`, `changed`, `unchanged` and
+        `removed`. Removal is only detected when prune is True, i.e. when the
+        caller passed the whole library rather than a single PDF.
+        """
+        plan = {"added": [], "changed": [], "unchanged": [], "removed": []}
+        for book, sha256 in books.items():
+            entry = self.manifest.get(book)
+            if entry is None:
+                plan["added"].append(book)
+            elif (
+                entry["sha256"] != sha256
+                or entry["fingerprint"] != fingerprint
+                or not entry.get("complete", True)
+                or not os.path.exists(self._artifact_path(sha256))
+            ):
+                plan["changed"].append(book)
+            else:
+                plan["unchanged"].append(book)
+        if prune:
+            plan["removed"] = sorted(set(self.manifest) - set(books))
+        return plan
+
+    def save_book(
+        self, book: str, sha256: str, fingerprint: str, characters: list[dict], relationships: list[dict],
+        complete: bool = True,
+    ) -> None:
+        """Write a book's artifact and point the manifest at it.
+
+        complete is False when some of the book's chunks failed and are
+        missing from characters and relationships.
+        """
+        previous = self.manifest.get(book)
+        artifact = {
+            "book": book,
+            "sha256": sha256,
+            "fingerprint": fingerprint,
+            "characters": characters,
+            "relationships": relationships,
+        }
+        with open(self._artifact_path(sha256), "w") as f:
+            json.dump(artifact, f, ensure_ascii=False)
+        self.manifest[book] = {"sha256": sha256, "fingerprint": fingerprint}
+        if not complete:
+            self.manifest[book]["complete"] = False
+        if previous and previous["sha256"] != sha256:
+            self._drop_artifact(previous["sha256"])
+        self._write_manifest()
+
+    def remove_book(self, book: str) -> None:
+        entry = self.manifest.pop(book, None)
+        if entry:
+            self._drop_artifact(entry["sha256"])
+        self._write_manifest()
+
+    def _drop_artifact(self, sha256: str) -> None:
+        # The same PDF may be in the library under two names
+        if any(e["sha256"] == sha256 for e in self.manifest.values()):
+            return
+        try:
+            os.remove(self._artifact_path(sha256))
+        except FileNotFoundError:
+            pass
+
+    def _write_manifest(self) -> None:
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path)
+
+    def load_books(self) -> list[dict]:
+        """Return every stored book artifact, sorted by book name."""
+        artifacts = []
+        for book in sorted(self.manifest):
+            with open(self._artifact_path(self.manifest[book]["sha256"])) as f:
+                artifacts.append(json.load(f))
+        return artifacts
@@ -0,0 +1,272 @@
+"""Pool of model server endpoints with load-aware routing and health checks."""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from metrics import METRICS
+from scheduler import TRANSIENT_ERRORS, classify_error
+
+HEALTH_CHECK_SECONDS = 30
+HEALTH_CHECK_TIMEOUT = 5
+# Weight of the newest request in an endpoint's moving-average latency
+LATENCY_SMOOTHING = 0.3
+# Consecutive failed requests after which an endpoint is ejected even though
+# it still answers health checks (e.g. it accepts connections but errors out)
+EJECT_AFTER_FAILURES = 3
+
+
+# Fields of an Ollama generate response that say where its time went, in
+# nanoseconds (durations) and tokens (counts)
+_OLLAMA_TIMING_FIELDS = (
+    "total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration",
+)
+
+
+def _ollama_timings(response) -> dict | None:
+    if response.status_code != 200:
+        return None
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    timings = {k: data[k] for k in _OLLAMA_TIMING_FIELDS if isinstance(data, dict) and k in data}
+    return timings or None
+
+
+def _with_keep_alive(payload: dict) -> dict:
+    """An Ollama request payload with keep_alive at its top level, where Ollama
+    reads it; langextract releases before 1.7 only put it in options."""
+    keep_alive = (payload.get("options") or {}).get("keep_alive")
+    if keep_alive is None or "keep_alive" in payload:
+        return payload
+    return {**payload, "keep_alive": keep_alive}
+
+
+class _SessionHTTP:
+    """Drop-in for the `requests` module inside a langextract provider: the
+    same post() and exceptions, but over a keep-alive session per thread, so
+    chunk requests reuse their connection instead of opening a new one.
+
+    The timing fields of each thread's last Ollama response, which langextract
+    discards, are kept for take_timings(). keep_alive is copied from a
+    request's options to its top level, the only place Ollama honours it.
+    """
+
+    exceptions = requests.exceptions
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def post(self, *args, **kwargs):
+        if isinstance(kwargs.get("json"), dict):
+            kwargs["json"] = _with_keep_alive(kwargs["json"])
+        response = self._session().post(*args, **kwargs)
+        self._local.timings = _ollama_timings(response)
+        return response
+
+    def take_timings(self) -> dict | None:
+        """Timing fields of this thread's last response, once; None if it had none."""
+        timings = getattr(self._local, "timings", None)
+        self._local.timings = None
+        return timings
+
+    def get(self, *args, **kwargs):
+        return self._session().get(*args, **kwargs)
+
+
+# Keep-alive transport shared by every Ollama model the pipeline builds
+HTTP = _SessionHTTP()
+
+
+class Endpoint:
+    """One model server: its language model instances plus routing statistics."""
+
+    def __init__(self, url: str, make_model):
+        self.url = url
+        self._make_model = make_model
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self.healthy = True
+        self.in_flight = 0
+        self.latency: float | None = None
+        self.requests = 0
+        self.failures = 0
+        self.failure_streak = 0
+        self.ejections = 0
+
+    def model(self, model_id: str):
+        """This server's language model instance for model_id, built on first use."""
+        with self._models_lock:
+            if model_id not in self._models:
+                self._models[model_id] = self._make_model(self.url, model_id)
+            return self._models[model_id]
+
+
+class EndpointPool:
+    """Routes model requests across several servers of the same model.
+
+    Each request goes to the healthy endpoint with the lowest expected wait,
+    (requests in flight + 1) x moving-average latency, so a slow server gets
+    proportionally less work. Endpoints are health-checked (GET /api/tags) at
+    start, every HEALTH_CHECK_SECONDS and after every transport error; one that
+    fails its check, or EJECT_AFTER_FAILURES requests in a row, is ejected
+    until a later periodic check passes. When every endpoint is ejected,
+    requests are still routed so chunks fail through the normal retry path
+    instead of hanging.
+
+    make_model(url, model_id, http) builds the language model for one endpoint
+    and model; http is a shared keep-alive transport it may use for its
+    requests. Models are built when first requested from an endpoint.
+    """
+
+    def __init__(self, urls: list[str], make_model, headers: dict | None = None,
+                 health_interval: float = HEALTH_CHECK_SECONDS):
+        self._http = HTTP
+        self._headers = headers or {}
+        self._lock = threading.Lock()
+        build = lambda url, model_id: make_model(url, model_id, self._http)
+        self.endpoints = [Endpoint(url.rstrip("/"), build) for url in urls]
+        self.started = time.monotonic()
+        for endpoint in self.endpoints:
+            self.check(endpoint)
+        self._stop = threading.Event()
+        self._checker = threading.Thread(target=self._check_loop, args=(health_interval,), daemon=True)
+        self._checker.start()
+
+    def check(self, endpoint: Endpoint) -> bool:
+        """Health-check one endpoint, ejecting or readmitting it."""
+        try:
+            ok = self._http.get(
+                f"{endpoint.url}/api/tags", headers=self._headers, timeout=HEALTH_CHECK_TIMEOUT
+            ).status_code == 200
+        except requests.RequestException:
+            ok = False
+        self._set_health(endpoint, ok, "failed its health check")
+        return ok
+
+    def _set_health(self, endpoint: Endpoint, ok: bool, reason: str) -> None:
+        with self._lock:
+            changed = ok != endpoint.healthy
+            endpoint.healthy = ok
+            if changed:
+                endpoint.failure_streak = 0
+                endpoint.ejections += not ok
+        if changed and not ok:
+            METRICS.incr("endpoint_ejections", endpoint=endpoint.url)
+            print(f"  Warning: {endpoint.url} {reason}; routing around it", file=sys.stderr)
+        elif changed:
+            print(f"  {endpoint.url} is healthy again", file=sys.stderr)
+
+    def _check_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            for endpoint in self.endpoints:
+                self.check(endpoint)
+
+    def _pick(self, exclude) -> Endpoint:
+        with self._lock:
+            candidates = (
+                [e for e in self.endpoints if e.healthy and e.url not in exclude]
+                or [e for e in self.endpoints if e.url not in exclude]
+                or self.endpoints
+            )
+            # Endpoints without a measurement yet count as fast as the fastest known one
+            known = [e.latency for e in candidates if e.latency is not None]
+            default = min(known) if known else 1.0
+            endpoint = min(
+                candidates,
+                key=lambda e: ((e.in_flight + 1) * (default if e.latency is None else e.latency), e.requests),
+            )
+            endpoint.in_flight += 1
+        return endpoint
+
+    @contextmanager
+    def acquire(self, exclude=()):
+        """Route one request: yields the Endpoint to send it to.
+
+        exclude holds URLs to avoid, such as endpoints this chunk already
+        failed on. An exception raised in the block counts against the
+        endpoint's health only when it is a transport error (timeout,
+        unavailable, rate limit); a context overflow or unparseable answer
+        says nothing about the server and leaves its health and latency alone.
+        """
+        endpoint = self._pick(exclude)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            yield endpoint
+            outcome = "ok"
+        except Exception as e:
+            if classify_error(e) not in TRANSIENT_ERRORS:
+                outcome = "model_error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            failed = outcome == "error"
+            with self._lock:
+                endpoint.in_flight -= 1
+                endpoint.requests += 1
+                endpoint.failures += failed
+                if outcome == "ok":
+                    endpoint.failure_streak = 0
+                elif failed:
+                    endpoint.failure_streak += 1
+                streak = endpoint.failure_streak
+                # A quick error must not make an endpoint look fast; a timeout should make it look slow
+                if outcome != "model_error" and (endpoint.latency is None or not failed or elapsed > endpoint.latency):
+                    endpoint.latency = elapsed if endpoint.latency is None else (
+                        LATENCY_SMOOTHING * elapsed + (1 - LATENCY_SMOOTHING) * endpoint.latency
+                    )
+            METRICS.incr("endpoint_requests", endpoint=endpoint.url, outcome=outcome)
+            METRICS.observe("endpoint_latency_seconds", elapsed, endpoint=endpoint.url)
+            if failed and streak >= EJECT_AFTER_FAILURES:
+                self._set_health(endpoint, False, f"failed {streak} requests in a row")
+            elif failed and endpoint.healthy:
+                self.check(endpoint)
+
+    def stats(self) -> list[dict]:
+        """Per-endpoint request counts, throughput and latency, for the run report."""
+        minutes = max(time.monotonic() - self.started, 1e-9) / 60
+        with self._lock:
+            return [
+                {
+                    "url": e.url,
+                    "requests": e.requests,
+                    "failures": e.failures,
+                    "per_minute": (e.requests - e.failures) / minutes,
+                    "latency_seconds": e.latency,
+                    "ejections": e.ejections,
+                    "healthy": e.healthy,
+                }
+                for e in self.endpoints
+            ]
+
+    def summary(self) -> str:
+        """Human-readable per-endpoint lines for the end-of-run report."""
+        lines = []
+        for s in self.stats():
+            line = (
+                f"Endpoint {s['url']}: {s['requests'] - s['failures']} ok, {s['failures']} failed, "
+                f"{s['per_minute']:.1f} requests/min"
+            )
+            if s["latency_seconds"] is not None:
+                line += f", {s['latency_seconds']:.1f}s avg latency"
+            if s["ejections"]:
+                line += f", ejected {s['ejections']} time(s)"
+            if not s["healthy"]:
+                line += " (down at end of run)"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._checker.join()
@@ -1,51 +1,168 @@
 """Character and relationship extraction from PDF files using LangExtract."""
 
+import bisect
+import dataclasses
+import hashlib
+import html
 import json
 import logging
 import os
+import re
+import sqlite3
 import sys
 import textwrap
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import accumulate
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
 
-import pymupdf
-import langextract as lx
-from langextract import providers
-from langextract.core import format_handler as fh
-from langextract.data import FormatType
-from langextract.factory import ModelConfig
+from cache import ExtractionCache, make_key
+from corpus import file_sha256
+from journal import DeadLetters, RunJournal
+from layout import DEFAULT_LAYOUT_SEED
+from metrics import METRICS
+from names import name_key
+from prefilter import RelationshipPrefilter, find_dramatis_personae
+from scheduler import TRANSIENT_ERRORS, ChunkScheduler, backoff_delay, classify_error
+from shards import AnnotationShards
+from workqueue import DEFAULT_LEASE_SECONDS, WorkQueue
+
+if TYPE_CHECKING:
+    from endpoints import EndpointPool
 
 # Suppress noisy tracebacks from expected parse failures on non-JSON model responses
 logging.getLogger("langextract.resolver").setLevel(logging.CRITICAL)
 logging.getLogger("absl").setLevel(logging.CRITICAL)
 
-# Lenient format handler for non-Gemini models that may return extractions
-# as a bare list instead of wrapped in {"extractions": [...]}
-_LENIENT_HANDLER = fh.FormatHandler(
-    format_type=FormatType.JSON,
-    use_wrapper=False,
-    wrapper_key=None,
-    use_fences=True,
-    strict_fences=False,
-)
 
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract all text from a PDF file."""
+class PDFReadError(Exception):
+    """Raised when a PDF is missing or cannot be parsed."""
+
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[tuple[int, str]]:
+    """Yield (page_number, text) for every page of a PDF, one page at a time.
+
+    Raises PDFReadError if the file is missing or unreadable, so a batch run can
+    record the book as failed and move on.
+    """
+    import pymupdf
+
     try:
         doc = pymupdf.open(pdf_path)
     except FileNotFoundError:
-        print(f"Error: File not found: {pdf_path}", file=sys.stderr)
-        sys.exit(1)
+        raise PDFReadError(f"File not found: {pdf_path}")
     except Exception as e:
-        print(f"Error: Could not read PDF: {e}", file=sys.stderr)
-        sys.exit(1)
+        raise PDFReadError(f"Could not read PDF: {e}") from e
 
-    text = ""
-    for page in doc:
-        page_text = page.get_text()
+    try:
+        for number, page in enumerate(doc, 1):
+            yield number, page.get_text()
+    except Exception as e:
+        raise PDFReadError(f"Could not read PDF: {e}") from e
+    finally:
+        doc.close()
+
+
+def extract_pdf_pages(pdf_path: str) -> tuple[str, list[int]]:
+    """Extract all text from a PDF file along with the page offsets.
+
+    Returns (text, page_starts) where page_starts[i] is the offset in text at
+    which page i + 1 begins. Blank pages contribute no text.
+    """
+    parts = []
+    page_starts = []
+    offset = 0
+    for _, page_text in iter_pdf_pages(pdf_path):
+        page_starts.append(offset)
         if page_text.strip():
-            text += page_text
-    doc.close()
-    return text
+            parts.append(page_text)
+            offset += len(page_text)
+    return "".join(parts), page_starts
+
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """Extract all text from a PDF file."""
+    return extract_pdf_pages(pdf_path)[0]
+
+
+def _timed_extract_pdf_pages(pdf_path: str) -> tuple[tuple[str, list[int]], float]:
+    # Runs in a worker process, whose metrics never reach the parent: hand the
+    # parse time back with the result instead
+    start = time.perf_counter()
+    return extract_pdf_pages(pdf_path), time.perf_counter() - start
+
+
+def page_for_offset(page_starts: list[int], offset: int) -> int:
+    """Map a character offset in extracted text to its 1-based page number."""
+    return max(1, bisect.bisect_right(page_starts, offset))
+
+
+def load_pdf_texts(
+    pdf_paths: list[str], text_cache: ExtractionCache | None = None, workers: int | None = None
+) -> list[tuple[str, list[int]] | PDFReadError]:
+    """Extract (text, page_starts) for many PDFs, parsing uncached ones in a process pool.
+
+    Results are cached by PDF content hash, so unchanged books are never
+    re-parsed. Unreadable PDFs yield a PDFReadError in their slot instead of
+    raising, keeping results aligned with pdf_paths.
+    """
+    results: list = [None] * len(pdf_paths)
+    keys = {}
+    for i, path in enumerate(pdf_paths):
+        if text_cache is None or not os.path.exists(path):
+            continue
+        keys[i] = make_key("pdf-text", file_sha256(path))
+        cached = text_cache.get(keys[i])
+        if cached is not None:
+            results[i] = (cached["text"], cached["page_starts"])
+            METRICS.incr("pdf_books", source="cache")
+
+    pending = [i for i, r in enumerate(results) if r is None]
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(pending))) as pool:
+            futures = {i: pool.submit(_timed_extract_pdf_pages, pdf_paths[i]) for i in pending}
+            for i, future in futures.items():
+                try:
+                    results[i], elapsed = future.result()
+                except PDFReadError as e:
+                    results[i] = e
+                    METRICS.incr("pdf_books", source="failed")
+                    continue
+                METRICS.incr("pdf_books", source="parsed")
+                METRICS.incr("pdf_pages", len(results[i][1]))
+                METRICS.observe("pdf_parse_seconds", elapsed)
+                if i in keys:
+                    text, page_starts = results[i]
+                    text_cache.put(keys[i], {"text": text, "page_starts": page_starts})
+    return results
+
+
+class _LazyExamples(Sequence):
+    """Few-shot examples, built by build() on first use.
+
+    Building them needs langextract, which takes about a second to import, so
+    commands that never call a model (--help, rebuild) do not load it.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._examples = None
+
+    def _items(self) -> list:
+        if self._examples is None:
+            self._examples = self._build()
+        return self._examples
+
+    def __getitem__(self, index):
+        return self._items()[index]
+
+    def __len__(self) -> int:
+        return len(self._items())
 
 
 CHARACTER_PROMPT = textwrap.dedent("""\
@@ -58,45 +175,52 @@ CHARACTER_PROMPT = textwrap.dedent("""\
     Return ONLY a valid JSON object. All values must be strings, numbers, or booleans. Never return null.
 """)
 
-CHARACTER_EXAMPLES = [
-    lx.data.ExampleData(
-        text=(
-            "The fleet broke from the warp above Ullanor. Garviel Loken stood "
-            "at the embarkation deck as Captain of the Luna Wolves Tenth Company. "
-            "Beside him, First Captain Ezekyle Abaddon growled his impatience. "
-            "Far below, the greenskin hordes of Urlakk Urg waited."
-        ),
-        extractions=[
-            lx.data.Extraction(
-                extraction_class="character",
-                extraction_text="Garviel Loken",
-                attributes={
-                    "faction": "Luna Wolves",
-                    "role": "Captain, Tenth Company",
-                    "description": "A thoughtful Space Marine captain",
-                },
-            ),
-            lx.data.Extraction(
-                extraction_class="character",
-                extraction_text="Ezekyle Abaddon",
-                attributes={
-                    "faction": "Luna Wolves",
-                    "role": "First Captain",
-                    "description": "An aggressive and ambitious warrior",
-                },
-            ),
-            lx.data.Extraction(
-                extraction_class="character",
-                extraction_text="Urlakk Urg",
-                attributes={
-                    "faction": "Orks",
-                    "role": "Warlord",
-                    "description": "Greenskin warlord on Ullanor",
-                },
+
+def _character_examples() -> list:
+    import langextract as lx
+
+    return [
+        lx.data.ExampleData(
+            text=(
+                "The fleet broke from the warp above Ullanor. Garviel Loken stood "
+                "at the embarkation deck as Captain of the Luna Wolves Tenth Company. "
+                "Beside him, First Captain Ezekyle Abaddon growled his impatience. "
+                "Far below, the greenskin hordes of Urlakk Urg waited."
             ),
-        ],
-    )
-]
+            extractions=[
+                lx.data.Extraction(
+                    extraction_class="character",
+                    extraction_text="Garviel Loken",
+                    attributes={
+                        "faction": "Luna Wolves",
+                        "role": "Captain, Tenth Company",
+                        "description": "A thoughtful Space Marine captain",
+                    },
+                ),
+                lx.data.Extraction(
+                    extraction_class="character",
+                    extraction_text="Ezekyle Abaddon",
+                    attributes={
+                        "faction": "Luna Wolves",
+                        "role": "First Captain",
+                        "description": "An aggressive and ambitious warrior",
+                    },
+                ),
+                lx.data.Extraction(
+                    extraction_class="character",
+                    extraction_text="Urlakk Urg",
+                    attributes={
+                        "faction": "Orks",
+                        "role": "Warlord",
+                        "description": "Greenskin warlord on Ullanor",
+                    },
+                ),
+            ],
+        )
+    ]
+
+
+CHARACTER_EXAMPLES = _LazyExamples(_character_examples)
 
 RELATIONSHIP_PROMPT = textwrap.dedent("""\
     Extract significant relationships between named characters in this
@@ -107,41 +231,152 @@ RELATIONSHIP_PROMPT = textwrap.dedent("""\
     Return ONLY a valid JSON object. All values must be strings, numbers, or booleans. Never return null.
 """)
 
-RELATIONSHIP_EXAMPLES = [
-    lx.data.ExampleData(
-        text=(
-            "Loken served under Abaddon in the speartip assaults, though they "
-            "often clashed on matters of honour. The Warmaster Horus valued "
-            "Loken's counsel, seeing in him a voice of reason among the Mournival."
-        ),
-        extractions=[
-            lx.data.Extraction(
-                extraction_class="relationship",
-                extraction_text="Loken served under Abaddon",
-                attributes={
-                    "source_character": "Loken",
-                    "target_character": "Abaddon",
-                    "type": "subordinate",
-                    "description": "Serves under Abaddon but they clash on matters of honour",
-                },
+
+def _relationship_examples() -> list:
+    import langextract as lx
+
+    return [
+        lx.data.ExampleData(
+            text=(
+                "Loken served under Abaddon in the speartip assaults, though they "
+                "often clashed on matters of honour. The Warmaster Horus valued "
+                "Loken's counsel, seeing in him a voice of reason among the Mournival."
             ),
-            lx.data.Extraction(
-                extraction_class="relationship",
-                extraction_text="Horus valued Loken's counsel",
-                attributes={
-                    "source_character": "Horus",
-                    "target_character": "Loken",
-                    "type": "mentorship",
-                    "description": "Horus values Loken as a voice of reason in the Mournival",
-                },
+            extractions=[
+                lx.data.Extraction(
+                    extraction_class="relationship",
+                    extraction_text="Loken served under Abaddon",
+                    attributes={
+                        "source_character": "Loken",
+                        "target_character": "Abaddon",
+                        "type": "subordinate",
+                        "description": "Serves under Abaddon but they clash on matters of honour",
+                    },
+                ),
+                lx.data.Extraction(
+                    extraction_class="relationship",
+                    extraction_text="Horus valued Loken's counsel",
+                    attributes={
+                        "source_character": "Horus",
+                        "target_character": "Loken",
+                        "type": "mentorship",
+                        "description": "Horus values Loken as a voice of reason in the Mournival",
+                    },
+                ),
+            ],
+        )
+    ]
+
+
+RELATIONSHIP_EXAMPLES = _LazyExamples(_relationship_examples)
+
+COMBINED_PROMPT = textwrap.dedent("""\
+    Extract named characters and the significant relationships between them from
+    this Warhammer 40,000 novel text.
+    For each named character, emit a "character" extraction using the exact name text
+    as it first appears, in order of appearance, with faction, role and description.
+    Do NOT extract planets, locations, ships, weapons, or unnamed groups.
+    For example, Terra, Cadia, Macragge, Ullanor are planets/places, not characters.
+    Use canonical faction names consistently (e.g. "Luna Wolves" not "the Wolves",
+    "Ultramarines" not "the XIII Legion").
+    For each relationship between two named individuals, emit a "relationship" extraction
+    with exact character names for source and target. Do not extract duplicate
+    relationships; if two characters have one relationship, extract it once with the
+    most specific type.
+    Return ONLY a valid JSON object. All values must be strings, numbers, or booleans. Never return null.
+""")
+
+
+def _combined_examples() -> list:
+    import langextract as lx
+
+    return [
+        lx.data.ExampleData(
+            text=(
+                "The fleet broke from the warp above Ullanor. Garviel Loken stood "
+                "at the embarkation deck as Captain of the Luna Wolves Tenth Company. "
+                "Loken served under Ezekyle Abaddon in the speartip assaults, though they "
+                "often clashed on matters of honour. The Warmaster Horus valued "
+                "Loken's counsel, seeing in him a voice of reason among the Mournival."
             ),
-        ],
-    )
-]
+            extractions=[
+                lx.data.Extraction(
+                    extraction_class="character",
+                    extraction_text="Garviel Loken",
+                    attributes={
+                        "faction": "Luna Wolves",
+                        "role": "Captain, Tenth Company",
+                        "description": "A thoughtful Space Marine captain",
+                    },
+                ),
+                lx.data.Extraction(
+                    extraction_class="relationship",
+                    extraction_text="Loken served under Ezekyle Abaddon",
+                    attributes={
+                        "source_character": "Loken",
+                        "target_character": "Ezekyle Abaddon",
+                        "type": "subordinate",
+                        "description": "Serves under Abaddon but they clash on matters of honour",
+                    },
+                ),
+                lx.data.Extraction(
+                    extraction_class="character",
+                    extraction_text="Ezekyle Abaddon",
+                    attributes={
+                        "faction": "Luna Wolves",
+                        "role": "First Captain",
+                        "description": "An aggressive and ambitious warrior",
+                    },
+                ),
+                lx.data.Extraction(
+                    extraction_class="character",
+                    extraction_text="Horus",
+                    attributes={
+                        "faction": "Luna Wolves",
+                        "role": "Warmaster",
+                        "description": "Primarch and Warmaster who values Loken's counsel",
+                    },
+                ),
+                lx.data.Extraction(
+                    extraction_class="relationship",
+                    extraction_text="Horus valued Loken's counsel",
+                    attributes={
+                        "source_character": "Horus",
+                        "target_character": "Loken",
+                        "type": "mentorship",
+                        "description": "Horus values Loken as a voice of reason in the Mournival",
+                    },
+                ),
+            ],
+        )
+    ]
+
+
+COMBINED_EXAMPLES = _LazyExamples(_combined_examples)
 
-MAX_CHAR_BUFFER = 10000
 MAX_RETRIES = 2
+# Seconds Ollama keeps the model loaded after a request (its default is 5
+# minutes), so pauses between passes or books do not cost a reload and the
+# KV cache of the shared prompt prefix survives
+OLLAMA_KEEP_ALIVE = 3600
+# Provider and language model params that do not change the model's output:
+# credentials, where the model is served, how long to wait for it and how
+# long it stays loaded
+_UNHASHED_PARAMS = ("api_key", "model_url")
+_UNHASHED_LM_PARAMS = ("api_key", "keep_alive", "timeout")
+# Retries for timeouts, rate limits and unavailable servers, each after a backoff
+MAX_TRANSIENT_RETRIES = 5
+# Overflowing chunks shorter than twice this are not split any further
+MIN_SPLIT_CHARS = 500
+# Share of a chunk's relationship character names that may resolve to no known
+# character before a model cascade re-runs the chunk on its next model
+DEFAULT_MAX_UNRESOLVED = 0.5
+ESCALATION_REASONS = ("failed", "empty", "unresolved")
 CONTEXT_SIZE = 36768
+# Fraction of num_ctx that prompt + examples + chunk may fill; the rest is left
+# for the model's JSON answer
+DEFAULT_CONTEXT_FILL = 0.75
+MIN_CHUNK_TOKENS = 256
 
 def build_provider_config(provider: str, model_id: str, provider_url: str | None = None) -> dict:
     """Build kwargs for lx.extract() based on the selected provider."""
@@ -158,10 +393,10 @@ def build_provider_config(provider: str, model_id: str, provider_url: str | None
     match provider:
         case "ollama":
             base["model_url"] = "http://localhost:11434"
-            base["language_model_params"] = {"timeout": 600, "num_ctx": CONTEXT_SIZE}
+            base["language_model_params"] = {"timeout": 600, "num_ctx": CONTEXT_SIZE, "keep_alive": OLLAMA_KEEP_ALIVE}
         case "ollama-cloud":
             base["model_url"] = provider_url or os.getenv("OLLAMA_CLOUD_URL", "http://localhost:11434")
-            lm_params = {"timeout": 600, "num_ctx": CONTEXT_SIZE}
+            lm_params = {"timeout": 600, "num_ctx": CONTEXT_SIZE, "keep_alive": OLLAMA_KEEP_ALIVE}
             api_key = os.getenv("OLLAMA_API_KEY")
             if api_key:
                 lm_params["api_key"] = api_key
@@ -172,230 +407,1375 @@ def build_provider_config(provider: str, model_id: str, provider_url: str | None
 
     return base
 
-def _chunk_text(text: str, chunk_size: int = MAX_CHAR_BUFFER) -> list[str]:
-    """Split text into chunks, breaking at whitespace boundaries."""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        if end < len(text):
-            break_at = text.rfind(" ", start, end)
-            if break_at > start:
-                end = break_at
-        chunks.append(text[start:end])
-        start = end
-    return chunks
-
-def _extract_chunk(chunk, prompt, examples, config, debug=False):
-    """Extract from a single chunk with retries, trimming on context overflow."""
-    for attempt in range(MAX_RETRIES + 1):
+def _ollama_model(config: dict, url: str, model_id: str, http=None):
+    """Language model for model_id at url, built from a build_provider_config()
+    config as lx.extract() would, with its requests going through http
+    (default: the shared keep-alive transport)."""
+    from langextract.factory import ModelConfig, create_model
+
+    if http is None:
+        from endpoints import HTTP as http
+
+    lm_params = config.get("language_model_params", {})
+    model = create_model(
+        ModelConfig(model_id=model_id, provider_kwargs={**lm_params, "model_url": url, "base_url": url}),
+        fence_output=config.get("fence_output"),
+    )
+    # Ollama providers send requests through this module reference
+    if hasattr(model, "_requests"):
+        model._requests = http
+    elif type(model) not in _untransported_models:
+        _untransported_models.add(type(model))
+        print(
+            f"  Warning: {type(model).__name__} has no _requests to route through the keep-alive transport; "
+            "Ollama requests will not reuse connections, keep_alive may be ignored and "
+            "prompt-eval timings are not reported",
+            file=sys.stderr,
+        )
+    return model
+
+
+# Provider classes already warned about by _ollama_model()
+_untransported_models: set[type] = set()
+
+
+_shared_models: dict[str, object] = {}
+_shared_models_lock = threading.Lock()
+
+
+def _shared_model(config: dict):
+    """One reusable language model per Ollama config, or None for other providers.
+
+    lx.extract() would build a new model, and open a new connection, for
+    every chunk; this one keeps its connection alive and lets the pipeline
+    read Ollama's prompt-eval and generation timings.
+    """
+    if "model_url" not in config:
+        return None
+    key = json.dumps(config, sort_keys=True, default=str)
+    with _shared_models_lock:
+        if key not in _shared_models:
+            _shared_models[key] = _ollama_model(config, config["model_url"], config["model_id"])
+        return _shared_models[key]
+
+
+def build_endpoint_pool(urls: list[str], config: dict) -> "EndpointPool":
+    """Pool the given Ollama endpoints for a build_provider_config() config.
+
+    Every endpoint gets its own language model per model ID (the config's, or
+    another tier's of a ModelCascade), built as lx.extract() would from the
+    config, with its HTTP requests going over keep-alive sessions.
+    """
+    from endpoints import EndpointPool
+
+    lm_params = config.get("language_model_params", {})
+    make_model = lambda url, model_id, http: _ollama_model(config, url, model_id, http)
+    headers = {"Authorization": f"Bearer {lm_params['api_key']}"} if lm_params.get("api_key") else None
+    return EndpointPool(urls, make_model, headers=headers)
+
+# Rough BPE approximation: words split into pieces of up to 4 characters, plus
+# each punctuation mark. Slightly overestimates real tokenizers, which keeps
+# chunks on the safe side of the context window.
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+# A segment is a sentence or paragraph, including its trailing whitespace
+_SEGMENT_RE = re.compile(r".*?(?:[.!?][\"'\u2019\u201d)\]]*\s+|\n\s*\n\s*|\Z)", re.S)
+_PARAGRAPH_END_RE = re.compile(r"\n\s*\n\s*$")
+# Break at a paragraph end rather than mid-paragraph if the chunk is still this full
+PARAGRAPH_MIN_FILL = 0.6
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate how many model tokens text occupies."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def _prompt_tokens(prompt: str, examples: list) -> int:
+    """Estimate the tokens used by the prompt description and few-shot examples."""
+    tokens = estimate_tokens(prompt) + 64  # Q:/A: scaffolding and JSON fences
+    for example in examples:
+        tokens += estimate_tokens(example.text)
+        for e in example.extractions:
+            tokens += estimate_tokens(json.dumps({e.extraction_class: e.extraction_text, "attributes": e.attributes}))
+    return tokens
+
+
+def chunk_token_budget(prompt: str, examples: list, config: dict, fill: float = DEFAULT_CONTEXT_FILL) -> int:
+    """Tokens of source text per chunk so prompt + examples + chunk fill `fill` of num_ctx."""
+    num_ctx = (config.get("language_model_params") or {}).get("num_ctx", CONTEXT_SIZE)
+    return max(MIN_CHUNK_TOKENS, int(num_ctx * fill) - _prompt_tokens(prompt, examples))
+
+
+def _segments(text: str, budget: int) -> list[tuple[int, int, int, bool]]:
+    """Split text into (start, end, tokens, ends_paragraph) sentence segments.
+
+    Sentences longer than budget are split further at whitespace.
+    """
+    segments = []
+    for match in _SEGMENT_RE.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        segment = match.group()
+        tokens = estimate_tokens(segment)
+        ends_paragraph = bool(_PARAGRAPH_END_RE.search(segment))
+        if tokens <= budget:
+            segments.append((start, end, tokens, ends_paragraph))
+            continue
+        piece_start = start
+        piece_tokens = 0
+        for word in re.finditer(r"\S+\s*", segment):
+            word_tokens = estimate_tokens(word.group())
+            if piece_tokens and piece_tokens + word_tokens > budget:
+                segments.append((piece_start, start + word.start(), piece_tokens, False))
+                piece_start, piece_tokens = start + word.start(), 0
+            piece_tokens += word_tokens
+        segments.append((piece_start, end, piece_tokens, ends_paragraph))
+    return segments
+
+
+def _chunk_spans(text: str, budget: int, overlap: int = 0) -> list[tuple[int, int]]:
+    """Greedily pack sentence segments into (start, end) spans of at most budget tokens.
+
+    A chunk that would end mid-paragraph is cut back to the last paragraph end
+    if that keeps it at least PARAGRAPH_MIN_FILL full. With overlap > 0, each
+    chunk after the first starts with up to that many tokens of trailing
+    sentences from the previous one.
+    """
+    segments = _segments(text, budget)
+    if not segments:
+        return []
+    cumulative = list(accumulate((s[2] for s in segments), initial=0))
+    spans = []
+    i = 0
+    while i < len(segments):
+        j = i
+        last_paragraph = None
+        while j < len(segments) and (j == i or cumulative[j + 1] - cumulative[i] <= budget):
+            if segments[j][3]:
+                last_paragraph = j
+            j += 1
+        if (
+            j < len(segments)
+            and last_paragraph is not None
+            and last_paragraph + 1 < j
+            and cumulative[last_paragraph + 1] - cumulative[i] >= budget * PARAGRAPH_MIN_FILL
+        ):
+            j = last_paragraph + 1
+        spans.append((segments[i][0], segments[j - 1][1]))
+        if j >= len(segments):
+            break
+        k = j
+        while k - 1 > i and cumulative[j] - cumulative[k - 1] <= overlap:
+            k -= 1
+        i = k
+    return spans
+
+
+def _chunk_text(text: str, budget: int, overlap: int = 0) -> list[str]:
+    """Split text into chunks of at most budget tokens, breaking at sentence and
+    paragraph boundaries."""
+    return [text[start:end] for start, end in _chunk_spans(text, budget, overlap)]
+
+def _config_params(config: dict) -> dict:
+    """Provider config without the params that do not change the output
+    (_UNHASHED_PARAMS, _UNHASHED_LM_PARAMS), for hashing."""
+    params = {k: v for k, v in config.items() if k not in _UNHASHED_PARAMS}
+    lm_params = params.get("language_model_params")
+    if lm_params:
+        params["language_model_params"] = {k: v for k, v in lm_params.items() if k not in _UNHASHED_LM_PARAMS}
+    return params
+
+def _record_ollama_timings(timings: dict, prompt_tokens: int, debug: bool = False) -> None:
+    """Record where an Ollama call's time went: loading the model, evaluating
+    the prompt tokens not already in its KV cache, and generating.
+
+    prompt_tokens is the estimated size of the whole prompt; Ollama leaves
+    out of prompt_eval_count the prefix it reused.
+    """
+    evaluated = timings.get("prompt_eval_count", 0)
+    prompt_eval = timings.get("prompt_eval_duration", 0) / 1e9
+    generated = timings.get("eval_count", 0)
+    generation = timings.get("eval_duration", 0) / 1e9
+    METRICS.observe("ollama_load_seconds", timings.get("load_duration", 0) / 1e9)
+    METRICS.observe("ollama_prompt_tokens", prompt_tokens)
+    METRICS.observe("ollama_prompt_eval_tokens", evaluated)
+    METRICS.observe("ollama_prompt_eval_seconds", prompt_eval)
+    METRICS.observe("ollama_generated_tokens", generated)
+    METRICS.observe("ollama_generation_seconds", generation)
+    if debug:
+        print(
+            f"    [debug] Prompt eval {evaluated} of ~{prompt_tokens} tokens in {prompt_eval:.2f}s, "
+            f"generated {generated} tokens in {generation:.2f}s"
+        )
+
+def _cache_key(chunk: str, prompt: str, examples: list, config: dict) -> str:
+    """Content-address a chunk request by everything that affects the model output."""
+    return make_key(chunk, prompt, [dataclasses.asdict(e) for e in examples], _config_params(config))
+
+class ChunkExtractionError(Exception):
+    """A chunk could not be extracted; kind is the class of its last error
+    (see scheduler.classify_error) and attempts the model calls spent on it."""
+
+    def __init__(self, kind: str, message: str, attempts: int):
+        super().__init__(message)
+        self.kind = kind
+        self.attempts = attempts
+
+
+def _split_point(chunk: str) -> int:
+    """Offset that bisects a chunk: the sentence or paragraph break nearest its
+    middle, else the nearest whitespace, else the middle itself."""
+    middle = len(chunk) // 2
+    breaks = [m.end() for m in _SEGMENT_RE.finditer(chunk) if 0 < m.end() < len(chunk)]
+    if not breaks:
+        breaks = [m.end() for m in re.finditer(r"\s+", chunk) if 0 < m.end() < len(chunk)]
+    return min(breaks, key=lambda pos: abs(pos - middle), default=middle)
+
+
+def _merge_documents(chunk: str, parts: list[tuple[int, object]]):
+    """One annotated document for chunk from (offset, document) of its pieces,
+    with every extraction's char_interval shifted back onto chunk."""
+    from langextract import data_lib
+
+    extractions = []
+    for offset, document in parts:
+        for extraction in data_lib.annotated_document_to_dict(document)["extractions"]:
+            interval = extraction.get("char_interval")
+            if interval is not None:
+                for key in ("start_pos", "end_pos"):
+                    if interval.get(key) is not None:
+                        interval[key] += offset
+            extractions.append(extraction)
+    return data_lib.dict_to_annotated_document({"text": chunk, "extractions": extractions})
+
+
+def _extract_chunk(
+    chunk, prompt, examples, config, debug=False, cache: ExtractionCache | None = None, limiter=None,
+    endpoints: "EndpointPool | None" = None,
+):
+    """Extract from a single chunk, retrying by error class.
+
+    Timeouts, rate limits and unavailable servers are retried up to
+    MAX_TRANSIENT_RETRIES times after a jittered exponential backoff; parse
+    and other errors up to MAX_RETRIES times straight away. A chunk that
+    overflows the model's context is bisected at the sentence break nearest
+    its middle and each half extracted on its own, so no text is dropped.
+    Raises ChunkExtractionError once a chunk (or one of its halves) is out of
+    retries.
+
+    When a cache is given, results are looked up and stored by the content hash
+    of the chunk, prompt, examples and provider config. When a limiter is given,
+    each model call holds one of its slots and timeouts/rate limits shrink it.
+    When endpoints is given, each call is routed through the pool and a retry
+    goes to an endpoint this chunk has not failed on yet.
+    Latency, attempts, errors, backoff, splits and prompt/extraction sizes are
+    recorded in METRICS.
+    """
+    import langextract as lx
+    from langextract import data_lib
+
+    from endpoints import HTTP
+
+    if cache is not None:
+        key = _cache_key(chunk, prompt, examples, config)
+        cached = cache.get(key)
+        if cached is not None:
+            METRICS.incr("chunk_cache_hits")
+            return data_lib.dict_to_annotated_document(cached)
+
+    failed_on = set()
+    attempts = 0
+    while True:
+        METRICS.incr("chunk_attempts")
+        if attempts:
+            METRICS.incr("chunk_retries")
+        attempts += 1
+        start = time.perf_counter()
+        endpoint = None
         try:
-            result = lx.extract(
-                text_or_documents=chunk,
-                prompt_description=prompt,
-                examples=examples,
-                extraction_passes=1,
-                max_char_buffer=len(chunk) + 1,
-                max_workers=2,
-                batch_length=2,
-                **config,
-            )
+            with (
+                limiter.slot() if limiter is not None else nullcontext(),
+                endpoints.acquire(exclude=failed_on) if endpoints is not None else nullcontext() as endpoint,
+            ):
+                model = endpoint.model(config["model_id"]) if endpoint is not None else _shared_model(config)
+                # Drop timings a failed request may have left on this thread
+                HTTP.take_timings()
+                # Time the model call only, not the wait for a slot
+                start = time.perf_counter()
+                # Nothing chunk-specific (such as context_window_chars) may come
+                # before the chunk: the prompt and examples then form the same
+                # prefix in every request of a pass, whose KV cache Ollama reuses
+                result = lx.extract(
+                    text_or_documents=chunk,
+                    prompt_description=prompt,
+                    examples=examples,
+                    extraction_passes=1,
+                    max_char_buffer=len(chunk) + 1,
+                    max_workers=2,
+                    batch_length=2,
+                    show_progress=False,
+                    **config,
+                    **({"model": model} if model is not None else {}),
+                )
+                timings = HTTP.take_timings()
+            elapsed = time.perf_counter() - start
+            METRICS.observe("llm_latency_seconds", elapsed, outcome="ok")
+            METRICS.observe("model_call_seconds", elapsed, model=config["model_id"])
+            METRICS.observe("chunk_prompt_chars", len(prompt) + len(chunk))
+            METRICS.observe("chunk_extractions", len(result.extractions))
+            if timings is not None:
+                _record_ollama_timings(timings, _prompt_tokens(prompt, examples) + estimate_tokens(chunk), debug)
+            if limiter is not None:
+                limiter.on_success()
             if debug and result.extractions:
                 print(f"    [debug] Got {len(result.extractions)} extractions, classes: {set(e.extraction_class for e in result.extractions)}")
             elif debug:
                 print(f"    [debug] Got 0 extractions from result")
-            return result
+            break
         except Exception as e:
+            elapsed = time.perf_counter() - start
+            METRICS.observe("llm_latency_seconds", elapsed, outcome="error")
+            METRICS.observe("model_call_seconds", elapsed, model=config["model_id"])
+            kind = classify_error(e)
+            transient = kind in TRANSIENT_ERRORS
+            METRICS.incr("chunk_errors", kind=kind)
+            if endpoint is not None and transient:
+                failed_on.add(endpoint.url)
             if debug:
-                print(f"    [debug] Attempt {attempt+1} failed: {e}")
-            if "exceeded max context length" in str(e) or "prompt too long" in str(e):
-                # Trim 10% of the chunk to fit within context window
-                trim = max(100, len(chunk) // 10)
-                chunk = chunk[:-trim].rstrip()
+                print(f"    [debug] Attempt {attempts} failed ({kind}){f' on {endpoint.url}' if endpoint is not None else ''}: {e}")
+            if limiter is not None and transient:
+                limiter.on_backpressure()
+                METRICS.incr("chunk_backpressure")
+            if kind == "overflow" and len(chunk) >= 2 * MIN_SPLIT_CHARS:
+                split = _split_point(chunk)
+                METRICS.incr("chunk_splits")
                 if debug:
-                    print(f"    [debug] Trimmed chunk to {len(chunk)} chars")
-            if attempt == MAX_RETRIES:
-                return None
-    return None
+                    print(f"    [debug] Splitting {len(chunk)}-char chunk at {split}")
+                halves = [(0, chunk[:split]), (split, chunk[split:])]
+                result = _merge_documents(chunk, [
+                    (offset, _extract_chunk(half, prompt, examples, config, debug, cache, limiter, endpoints))
+                    for offset, half in halves
+                ])
+                break
+            if kind == "overflow" or attempts > (MAX_TRANSIENT_RETRIES if transient else MAX_RETRIES):
+                METRICS.incr("chunk_failures")
+                raise ChunkExtractionError(kind, str(e), attempts) from e
+            if transient:
+                # The slot is released; one of the scheduler's spare threads
+                # (THREADS_PER_SLOT) takes it while this one sleeps
+                delay = backoff_delay(attempts)
+                METRICS.observe("backoff_seconds", delay)
+                time.sleep(delay)
 
-def extract_characters(text: str, config: dict) -> tuple[list[dict], list]:
-    """Extract characters from text using LangExtract.
+    if cache is not None:
+        cache.put(key, data_lib.annotated_document_to_dict(result))
+    return result
 
-    Returns a tuple of (characters, annotated_documents).
+class ModelCascade:
+    """Models of one provider to try in turn, cheapest first.
+
+    Every chunk is extracted with the first model. It is re-run with the next
+    one when extraction fails, returns no extractions, or more than
+    max_unresolved of its relationships' character names resolve to no known
+    character, the way build_graph_data() resolves them. The last model's
+    result is kept whatever it looks like.
+    """
+
+    def __init__(self, configs: list[dict], max_unresolved: float = DEFAULT_MAX_UNRESOLVED):
+        self.configs = configs
+        self.max_unresolved = max_unresolved
+
+    @property
+    def models(self) -> list[str]:
+        return [config["model_id"] for config in self.configs]
+
+    def escalation_reason(self, result, aliases: dict[str, str]) -> str | None:
+        """Why result should go to the next model ("empty" or "unresolved"), or None.
+
+        aliases is build_alias_index() over the characters known so far; the
+        chunk's own characters are added to it.
+        """
+        if not result.extractions:
+            return "empty"
+        relationships = _parse_relationships(result)
+        if relationships:
+            aliases = {**aliases, **build_alias_index(_parse_characters(result))}
+            names = [rel[key] for rel in relationships for key in ("source_character", "target_character")]
+            unresolved = sum(_resolve_name(name, aliases) is None for name in names)
+            # With no characters known at all, every name would count as unresolved
+            if aliases and unresolved > self.max_unresolved * len(names):
+                return "unresolved"
+        return None
+
+    def stats(self) -> list[dict]:
+        """Per-model chunks, escalations, model calls and call time, for the run report."""
+        return [
+            {
+                "model": model,
+                "chunks": int(METRICS.total("cascade_chunks", model=model)),
+                "escalated": {
+                    reason: int(METRICS.total("cascade_escalations", model=model, reason=reason))
+                    for reason in ESCALATION_REASONS
+                },
+                "calls": METRICS.count("model_call_seconds", model=model),
+                "seconds": METRICS.total("model_call_seconds", model=model),
+            }
+            for model in self.models
+        ]
+
+    def summary(self) -> str:
+        """Human-readable per-model lines for the end-of-run report."""
+        lines = []
+        for s in self.stats():
+            line = f"Cascade {s['model']}: {s['chunks']} chunk(s), {s['calls']} call(s), {s['seconds']:.1f}s"
+            escalated = {reason: n for reason, n in s["escalated"].items() if n}
+            if escalated:
+                line += f", escalated {sum(escalated.values())} (" + ", ".join(
+                    f"{n} {reason}" for reason, n in escalated.items()
+                ) + ")"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def _extract_cascade(chunk, prompt, examples, cascade: ModelCascade, aliases: dict[str, str], **kwargs):
+    """Extract a chunk with the first model of cascade that gives a usable result.
+
+    kwargs are passed on to _extract_chunk(). Raises ChunkExtractionError
+    only when the last model fails too.
+    """
+    debug = kwargs.get("debug", False)
+    for tier, config in enumerate(cascade.configs):
+        model = config["model_id"]
+        last = tier == len(cascade.configs) - 1
+        METRICS.incr("cascade_chunks", model=model)
+        try:
+            result = _extract_chunk(chunk, prompt, examples, config, **kwargs)
+        except ChunkExtractionError:
+            if last:
+                raise
+            reason = "failed"
+        else:
+            reason = None if last else cascade.escalation_reason(result, aliases)
+            if reason is None:
+                return result
+        METRICS.incr("cascade_escalations", model=model, reason=reason)
+        if debug:
+            print(f"    [debug] Escalating chunk from {model} ({reason})")
+
+def _add_page(item: dict, extraction, page_of) -> dict:
+    """Tag an extracted item with the page its source text came from, when known."""
+    interval = extraction.char_interval
+    if page_of is not None and interval is not None and interval.start_pos is not None:
+        item["page"] = page_of(interval.start_pos)
+    return item
+
+def _parse_characters(result, page_of=None) -> list[dict]:
+    """Convert `character` extractions from an annotated document into character dicts.
+
+    page_of maps a chunk-relative character offset to a page number.
     """
-    chunks = _chunk_text(text)
     characters = []
-    annotated_docs = []
-    skipped = 0
+    for extraction in result.extractions:
+        if extraction.extraction_class == "character" and extraction.extraction_text.strip():
+            attrs = extraction.attributes or {}
+            characters.append(_add_page({
+                "name": extraction.extraction_text.strip(),
+                "faction": attrs.get("faction", "Unknown") or "Unknown",
+                "role": attrs.get("role", "Unknown") or "Unknown",
+                "description": attrs.get("description", "") or "",
+            }, extraction, page_of))
+    return characters
+
+def _parse_relationships(result, page_of=None) -> list[dict]:
+    """Convert `relationship` extractions from an annotated document into relationship dicts."""
+    relationships = []
+    for extraction in result.extractions:
+        if extraction.extraction_class == "relationship":
+            attrs = extraction.attributes or {}
+            source = (attrs.get("source_character") or "").strip()
+            target = (attrs.get("target_character") or "").strip()
+            if source and target:
+                relationships.append(_add_page({
+                    "source_character": source,
+                    "target_character": target,
+                    "type": attrs.get("type", "unknown") or "unknown",
+                    "description": attrs.get("description", "") or "",
+                }, extraction, page_of))
+    return relationships
+
+# Pass name -> (prompt, examples, {result key: parser})
+EXTRACTION_PASSES = {
+    "characters": (CHARACTER_PROMPT, CHARACTER_EXAMPLES, {"characters": _parse_characters}),
+    "relationships": (RELATIONSHIP_PROMPT, RELATIONSHIP_EXAMPLES, {"relationships": _parse_relationships}),
+    # Single-pass mode: one call per chunk returns both extraction classes
+    "combined": (
+        COMBINED_PROMPT,
+        COMBINED_EXAMPLES,
+        {"characters": _parse_characters, "relationships": _parse_relationships},
+    ),
+}
+
+TWO_PASS = ("characters", "relationships")
+SINGLE_PASS = ("combined",)
 
-    for i, chunk in enumerate(chunks):
-        result = _extract_chunk(chunk, CHARACTER_PROMPT, CHARACTER_EXAMPLES, config, debug=True)
-        if result is None:
-            skipped += 1
+def _parse_chunk(result, parsers: dict, page_starts: list[int] | None, start: int) -> dict:
+    """Run a pass's parsers over one chunk's annotated document.
+
+    start is the chunk's offset in the book text; with page_starts, every item
+    is tagged with the page it was found on.
+    """
+    page_of = None
+    if page_starts is not None:
+        page_of = lambda pos: page_for_offset(page_starts, start + pos)
+    return {key: parse(result, page_of) for key, parse in parsers.items()}
+
+def _pass_spans(
+    books: list[tuple[str, str]], pass_name: str, config: dict, context_fill: float, overlap_tokens: int,
+    sections: list[tuple[int, int] | None] | None = None,
+):
+    """Chunk spans of every book for one pass, sized to that pass's prompt and examples.
+
+    sections, one (start, end) or None per book, limits a book's chunks to that
+    part of its text.
+    """
+    prompt, examples, _ = EXTRACTION_PASSES[pass_name]
+    budget = chunk_token_budget(prompt, examples, config, context_fill)
+    spans = []
+    for b, (_, text) in enumerate(books):
+        section = sections[b] if sections is not None else None
+        if section is None:
+            spans.append(_chunk_spans(text, budget, overlap_tokens))
         else:
-            annotated_docs.append(result)
-            for extraction in result.extractions:
-                if extraction.extraction_class == "character" and extraction.extraction_text.strip():
-                    attrs = extraction.attributes or {}
-                    characters.append({
-                        "name": extraction.extraction_text.strip(),
-                        "faction": attrs.get("faction", "Unknown") or "Unknown",
-                        "role": attrs.get("role", "Unknown") or "Unknown",
-                        "description": attrs.get("description", "") or "",
-                    })
-        print(f"  Chunk {i+1}/{len(chunks)}: {len(characters)} characters ({skipped} skipped)")
-
-    if not characters:
+            start, end = section
+            spans.append([(start + s, start + e) for s, e in _chunk_spans(text[start:end], budget, overlap_tokens)])
+    return spans
+
+def _dramatis_sections(books: list[tuple[str, str]]) -> list[tuple[int, int] | None]:
+    """Dramatis personae section of each book, for limiting the character pass to it."""
+    sections = [find_dramatis_personae(text) for _, text in books]
+    for (book_name, _), section in zip(books, sections):
+        if section is not None:
+            print(f"  {book_name}: character pass limited to its dramatis personae ({section[1] - section[0]} chars)")
+    return sections
+
+def run_extraction(
+    books: list[tuple[str, str]],
+    config: dict,
+    passes: tuple[str, ...] = TWO_PASS,
+    cache: ExtractionCache | None = None,
+    scheduler: ChunkScheduler | None = None,
+    journal: RunJournal | None = None,
+    page_starts: list[list[int]] | None = None,
+    context_fill: float = DEFAULT_CONTEXT_FILL,
+    overlap_tokens: int = 0,
+    debug: bool = False,
+    shards: AnnotationShards | None = None,
+    prefilter: bool = False,
+    known_characters: list[dict] | None = None,
+    dramatis_personae: bool = False,
+    dead_letters: DeadLetters | None = None,
+    cascade: ModelCascade | None = None,
+) -> list[dict]:
+    """Run extraction passes over (book_name, text) pairs.
+
+    Each pass chunks the text so that its own prompt, examples and chunk fill
+    context_fill of the model's num_ctx, with overlap_tokens of overlap between
+    consecutive chunks, then sends the chunks of every book through the
+    scheduler at once, so up to N chunk requests stay in flight across chunk
+    and book boundaries.
+    When a journal is given, chunks it already records are replayed instead of
+    re-extracted and every newly completed chunk is recorded as it finishes.
+    When page_starts (one list per book, from extract_pdf_pages) is given, each
+    character and relationship is tagged with the page it was found on.
+    debug prints every model response and failed attempt.
+    Returns one dict per book, in input order, with `characters`,
+    `relationships` and `annotated_docs` lists in chunk order and the number
+    of `failed_chunks` left out of them. When shards
+    is given, each chunk's annotated document is appended to its book's
+    shard as soon as the chunk completes and `annotated_docs` stays empty, so
+    memory does not grow with the size of the corpus.
+    With prefilter, relationship chunks that name fewer than two characters
+    (from the character pass so far plus known_characters, e.g. other books
+    of an incremental library) are not sent to the model. With
+    dramatis_personae, the character pass of a book that has a dramatis
+    personae only reads that section.
+    Chunks that fail permanently are left out of the results and, when
+    dead_letters is given, recorded there with their text; a chunk that
+    succeeds is removed from it.
+    With cascade, chunks go through its models instead of config's, and
+    relationship names are checked against the characters known so far
+    (this run's plus known_characters). config then only sizes the chunks.
+    """
+    from langextract import data_lib
+
+    own_scheduler = scheduler is None
+    if own_scheduler:
+        scheduler = ChunkScheduler(concurrency=1)
+
+    results = [{"characters": [], "relationships": [], "annotated_docs": [], "failed_chunks": 0} for _ in books]
+
+    try:
+        for pass_name in passes:
+            prompt, examples, parsers = EXTRACTION_PASSES[pass_name]
+            sections = _dramatis_sections(books) if dramatis_personae and pass_name == "characters" else None
+            book_spans = _pass_spans(books, pass_name, config, context_fill, overlap_tokens, sections)
+            book_chunks = [[text[start:end] for start, end in spans] for (_, text), spans in zip(books, book_spans)]
+            # Passes run one after the other, so every request in flight shares
+            # this pass's prompt prefix and Ollama can reuse its KV cache
+            tasks = [(b, c, chunk) for b, chunks in enumerate(book_chunks) for c, chunk in enumerate(chunks)]
+            METRICS.incr("chunks", len(tasks), extraction_pass=pass_name)
+            if prefilter and pass_name == "relationships":
+                tasks = _prefilter_tasks(tasks, books, results, known_characters or [])
+            aliases = {}
+            if cascade is not None and pass_name != "characters":
+                aliases = build_alias_index(
+                    (known_characters or []) + [c for result in results for c in result["characters"]]
+                )
+            totals = [0] * len(books)
+            for b, _, _ in tasks:
+                totals[b] += 1
+            done = [0] * len(books)
+            failed = [0] * len(books)
+
+            def report(i, result):
+                b = tasks[i][0]
+                done[b] += 1
+                if result is None:
+                    failed[b] += 1
+                print(f"  {books[b][0]} {pass_name}: chunk {done[b]}/{totals[b]} ({failed[b]} failed)")
+
+            def extract_task(
+                task, pass_name=pass_name, prompt=prompt, examples=examples, parsers=parsers, book_spans=book_spans,
+                aliases=aliases,
+            ):
+                b, c, chunk = task
+                result = None
+                if journal is not None:
+                    recorded = journal.get_chunk(books[b][0], pass_name, c, chunk)
+                    if recorded is not None:
+                        result = data_lib.dict_to_annotated_document(recorded)
+                start = book_spans[b][c][0]
+                if result is None:
+                    options = {"debug": debug, "cache": cache, "limiter": scheduler.limiter, "endpoints": scheduler.endpoints}
+                    try:
+                        if cascade is not None:
+                            result = _extract_cascade(chunk, prompt, examples, cascade, aliases, **options)
+                        else:
+                            result = _extract_chunk(chunk, prompt, examples, config, **options)
+                    except ChunkExtractionError as e:
+                        print(f"  Warning: {books[b][0]} {pass_name} chunk {c + 1} failed ({e.kind}): {e}", file=sys.stderr)
+                        if dead_letters is not None:
+                            dead_letters.record(books[b][0], pass_name, c, start, chunk, e.kind, str(e), e.attempts)
+                        return None
+                    if journal is not None:
+                        journal.record_chunk(books[b][0], pass_name, c, chunk, data_lib.annotated_document_to_dict(result))
+                    if dead_letters is not None:
+                        dead_letters.resolve(books[b][0], pass_name, c, chunk)
+                # Parse here, on the worker, so only the small parsed dicts wait
+                # for the rest of the pass rather than whole annotated documents
+                parsed = _parse_chunk(result, parsers, page_starts[b] if page_starts is not None else None, start)
+                if shards is not None:
+                    shards.write(books[b][0], pass_name, c, start, data_lib.annotated_document_to_dict(result))
+                else:
+                    parsed["annotated_docs"] = [result]
+                return parsed
+
+            with METRICS.timer("pass_seconds", extraction_pass=pass_name):
+                chunk_results = scheduler.map(extract_task, tasks, on_done=report)
+            for (b, _, _), parsed in zip(tasks, chunk_results):
+                if parsed is None:
+                    results[b]["failed_chunks"] += 1
+                    continue
+                for key, items in parsed.items():
+                    results[b][key].extend(items)
+    finally:
+        if own_scheduler:
+            scheduler.shutdown()
+
+    return results
+
+def _prefilter_tasks(tasks: list, books: list[tuple[str, str]], results: list[dict], known_characters: list[dict]) -> list:
+    """Drop relationship tasks whose chunk names fewer than two candidate characters."""
+    characters = known_characters + [c for result in results for c in result["characters"]]
+    relevant = RelationshipPrefilter(build_alias_index(characters))
+    with METRICS.timer("prefilter_seconds"):
+        kept = [task for task in tasks if relevant.worth_extracting(task[2])]
+    dropped = [0] * len(books)
+    for b, _, _ in tasks:
+        dropped[b] += 1
+    for b, _, _ in kept:
+        dropped[b] -= 1
+    for (book_name, _), count in zip(books, dropped):
+        if count:
+            print(f"  {book_name} relationships: prefilter skipped {count} chunk(s) naming fewer than two characters")
+    METRICS.incr("chunks_prefiltered", len(tasks) - len(kept))
+    return kept
+
+def retry_dead_letters(
+    dead_letters: DeadLetters,
+    config: dict,
+    cache: ExtractionCache | None = None,
+    scheduler: ChunkScheduler | None = None,
+    journal: RunJournal | None = None,
+    debug: bool = False,
+) -> int:
+    """Extract the chunks recorded in dead_letters again, from their stored text.
+
+    Recovered chunks are recorded in journal and removed from dead_letters;
+    chunks that fail again stay there with their new error. A run of the
+    original command with --resume then picks the recovered chunks up from
+    the journal. Returns the number of chunks recovered.
+    """
+    from langextract import data_lib
+
+    own_scheduler = scheduler is None
+    if own_scheduler:
+        scheduler = ChunkScheduler(concurrency=1)
+    # Grouped by pass, so consecutive requests share a prompt prefix
+    entries = sorted(dead_letters.entries(), key=lambda e: (e["pass"], e["book"], e["chunk"]))
+
+    def retry(entry):
+        prompt, examples, _ = EXTRACTION_PASSES[entry["pass"]]
+        try:
+            result = _extract_chunk(
+                entry["text"], prompt, examples, config, debug=debug, cache=cache,
+                limiter=scheduler.limiter, endpoints=scheduler.endpoints,
+            )
+        except ChunkExtractionError as e:
+            dead_letters.record(
+                entry["book"], entry["pass"], entry["chunk"], entry["offset"], entry["text"],
+                e.kind, str(e), entry["attempts"] + e.attempts,
+            )
+            return False
+        if journal is not None:
+            journal.record_chunk(
+                entry["book"], entry["pass"], entry["chunk"], entry["text"], data_lib.annotated_document_to_dict(result)
+            )
+        dead_letters.resolve(entry["book"], entry["pass"], entry["chunk"], entry["text"])
+        return True
+
+    def report(i, ok):
+        entry = entries[i]
+        print(f"  {entry['book']} {entry['pass']}: chunk {entry['chunk'] + 1} {'recovered' if ok else 'failed again'}")
+
+    try:
+        recovered = scheduler.map(retry, entries, on_done=report)
+    finally:
+        if own_scheduler:
+            scheduler.shutdown()
+    return sum(recovered)
+
+def enqueue_extraction(
+    queue: WorkQueue,
+    books: list[tuple[str, str]],
+    config: dict,
+    passes: tuple[str, ...] = TWO_PASS,
+    context_fill: float = DEFAULT_CONTEXT_FILL,
+    overlap_tokens: int = 0,
+    dramatis_personae: bool = False,
+) -> list[tuple[int, int, str, int, int]]:
+    """Add every (book, pass, chunk) of a run to a work queue, chunked as run_extraction() would.
+
+    Returns (task ID, book index, pass, chunk index, offset) per task, in the
+    order collect_queue_results() expects.
+    """
+    queued = []
+    tasks = []
+    for pass_name in passes:
+        sections = _dramatis_sections(books) if dramatis_personae and pass_name == "characters" else None
+        book_spans = _pass_spans(books, pass_name, config, context_fill, overlap_tokens, sections)
+        METRICS.incr("chunks", sum(len(spans) for spans in book_spans), extraction_pass=pass_name)
+        for b, ((book_name, text), spans) in enumerate(zip(books, book_spans)):
+            for c, (start, end) in enumerate(spans):
+                queued.append((b, pass_name, c, start))
+                tasks.append((book_name, pass_name, c, start, text[start:end]))
+    ids = queue.enqueue(tasks)
+    return [(task_id, *task) for task_id, task in zip(ids, queued)]
+
+def work_queue(
+    queue: WorkQueue,
+    config: dict,
+    worker: str,
+    cache: ExtractionCache | None = None,
+    scheduler: ChunkScheduler | None = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    poll_seconds: float = 5.0,
+    debug: bool = False,
+) -> None:
+    """Claim and extract chunk tasks from a work queue until none are pending or leased.
+
+    Every scheduler thread claims one task at a time, so up to N requests stay
+    in flight without waiting for a whole batch. A background thread renews the
+    leases of the tasks in flight; when every remaining task is leased by
+    another worker, this one polls until they finish or their leases expire.
+    """
+    from langextract import data_lib
+
+    own_scheduler = scheduler is None
+    if own_scheduler:
+        scheduler = ChunkScheduler(concurrency=1)
+    held: set[int] = set()
+    held_lock = threading.Lock()
+    stop = threading.Event()
+
+    def renew_leases():
+        while not stop.wait(lease_seconds / 3):
+            with held_lock:
+                task_ids = list(held)
+            if task_ids:
+                try:
+                    queue.heartbeat(worker, task_ids, lease_seconds)
+                except sqlite3.OperationalError as e:
+                    # A busy queue only delays this beat; the lease has slack for the next
+                    print(f"  Warning: lease heartbeat failed: {e}", file=sys.stderr)
+
+    def run(_):
+        while True:
+            claimed = queue.claim(worker, 1, lease_seconds)
+            if not claimed:
+                counts = queue.counts()
+                if not counts["pending"] and not counts["leased"]:
+                    return
+                time.sleep(poll_seconds)
+                continue
+            task = claimed[0]
+            if task["requeued"]:
+                METRICS.incr("queue_requeued")
+            with held_lock:
+                held.add(task["id"])
+            try:
+                prompt, examples, _ = EXTRACTION_PASSES[task["pass"]]
+                result = _extract_chunk(
+                    task["text"], prompt, examples, config, debug=debug, cache=cache,
+                    limiter=scheduler.limiter, endpoints=scheduler.endpoints,
+                )
+                queue.complete(task["id"], data_lib.annotated_document_to_dict(result))
+            except ChunkExtractionError as e:
+                result = None
+                queue.fail(task["id"], worker, f"{e.kind}: {e}")
+            except Exception as e:
+                result = None
+                queue.fail(task["id"], worker, str(e))
+            finally:
+                with held_lock:
+                    held.discard(task["id"])
+            METRICS.incr("queue_tasks", outcome="done" if result is not None else "failed")
+            counts = queue.counts()
+            print(
+                f"  {task['book']} {task['pass']}: chunk {task['chunk'] + 1} {'done' if result is not None else 'failed'} "
+                f"({counts['done']}/{sum(counts.values())} tasks done)"
+            )
+
+    heartbeat = threading.Thread(target=renew_leases, daemon=True)
+    heartbeat.start()
+    try:
+        scheduler.map(run, range(scheduler.threads))
+    finally:
+        stop.set()
+        heartbeat.join()
+        if own_scheduler:
+            scheduler.shutdown()
+
+def collect_queue_results(
+    queue: WorkQueue,
+    books: list[tuple[str, str]],
+    queued: list[tuple[int, int, str, int, int]],
+    page_starts: list[list[int]] | None = None,
+    shards: AnnotationShards | None = None,
+) -> list[dict]:
+    """Gather the results of enqueue_extraction() tasks into run_extraction()'s per-book dicts.
+
+    Tasks that failed or never finished are left out and counted in the
+    book's `failed_chunks`. With shards, annotated
+    documents are appended to each book's shard as they are read instead of
+    being kept in `annotated_docs`.
+    """
+    from langextract import data_lib
+
+    results = [{"characters": [], "relationships": [], "annotated_docs": [], "failed_chunks": 0} for _ in books]
+    documents = queue.results([task_id for task_id, *_ in queued])
+    for (_, b, pass_name, c, start), document in zip(queued, documents):
+        if document is None:
+            results[b]["failed_chunks"] += 1
+            continue
+        # Before dict_to_annotated_document(), which converts the dict in place
+        if shards is not None:
+            shards.write(books[b][0], pass_name, c, start, document)
+        result = data_lib.dict_to_annotated_document(document)
+        parsed = _parse_chunk(
+            result, EXTRACTION_PASSES[pass_name][2], page_starts[b] if page_starts is not None else None, start
+        )
+        for key, items in parsed.items():
+            results[b][key].extend(items)
+        if shards is None:
+            results[b]["annotated_docs"].append(result)
+    return results
+
+def _stored_document(document: dict) -> SimpleNamespace:
+    """Stand-in for the AnnotatedDocument that annotated_document_to_dict() saved as document.
+
+    It carries just what the parsers read, so stored extractions can be parsed
+    again without importing langextract.
+    """
+    extractions = []
+    for extraction in document.get("extractions") or []:
+        interval = extraction.get("char_interval")
+        extractions.append(SimpleNamespace(
+            extraction_class=extraction.get("extraction_class"),
+            extraction_text=extraction.get("extraction_text") or "",
+            attributes=extraction.get("attributes"),
+            char_interval=SimpleNamespace(start_pos=interval.get("start_pos")) if interval else None,
+        ))
+    return SimpleNamespace(extractions=extractions)
+
+def load_stored_extractions(shards: AnnotationShards, books: list[str]) -> list[dict]:
+    """Parse the characters and relationships of each book back out of its annotation shard.
+
+    Returns one {"characters", "relationships"} dict per book with items in
+    the order run_extraction() built them, tagged with pages when the book's
+    page offsets were saved with its shard.
+    """
+    results = []
+    for book in books:
+        page_starts = shards.page_starts(book)
+        result = {"characters": [], "relationships": []}
+        for record in shards.records(book):
+            parsed = _parse_chunk(
+                _stored_document(record["document"]), EXTRACTION_PASSES[record["pass"]][2], page_starts,
+                record["offset"],
+            )
+            for key, items in parsed.items():
+                result[key].extend(items)
+        results.append(result)
+    return results
+
+def load_legacy_extractions(path: str) -> dict:
+    """Parse an extraction_results.jsonl, one annotated document per line, as
+    written before per-book shards. Its items carry no page numbers."""
+    parsers = EXTRACTION_PASSES["combined"][2]
+    result = {"characters": [], "relationships": []}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for key, items in _parse_chunk(_stored_document(json.loads(line)), parsers, None, 0).items():
+                result[key].extend(items)
+    return result
+
+def extraction_fingerprint(config: dict, passes: tuple[str, ...], *extra) -> str:
+    """Hash the model config, passes, prompts and examples that produced a result."""
+    specs = [
+        (name, EXTRACTION_PASSES[name][0], [dataclasses.asdict(e) for e in EXTRACTION_PASSES[name][1]])
+        for name in passes
+    ]
+    return make_key(specs, _config_params(config), *extra)
+
+def extract_characters(
+    text: str, config: dict, cache: ExtractionCache | None = None, scheduler: ChunkScheduler | None = None
+) -> tuple[list[dict], list]:
+    """Extract characters from text using LangExtract.
+
+    Returns a tuple of (characters, annotated_documents).
+    """
+    result = run_extraction([("text", text)], config, passes=("characters",), cache=cache, scheduler=scheduler)[0]
+    if not result["characters"]:
         print("Warning: No characters found in text.", file=sys.stderr)
-    return characters, annotated_docs
+    return result["characters"], result["annotated_docs"]
 
-def extract_relationships(text: str, config: dict) -> tuple[list[dict], list]:
+def extract_relationships(
+    text: str, config: dict, cache: ExtractionCache | None = None, scheduler: ChunkScheduler | None = None
+) -> tuple[list[dict], list]:
     """Extract relationships between characters from text using LangExtract.
 
     Returns a tuple of (relationships, annotated_documents).
     """
-    chunks = _chunk_text(text)
-    relationships = []
-    annotated_docs = []
-    skipped = 0
+    result = run_extraction([("text", text)], config, passes=("relationships",), cache=cache, scheduler=scheduler)[0]
+    return result["relationships"], result["annotated_docs"]
+
+def _overlap(reference: set, candidate: set) -> dict:
+    """Precision/recall of candidate against reference."""
+    common = len(reference & candidate)
+    return {
+        "reference": len(reference),
+        "candidate": len(candidate),
+        "common": common,
+        "recall": common / len(reference) if reference else 1.0,
+        "precision": common / len(candidate) if candidate else 1.0,
+    }
+
+def compare_pass_modes(
+    books: list[tuple[str, str]],
+    config: dict,
+    cache: ExtractionCache | None = None,
+    scheduler: ChunkScheduler | None = None,
+    context_fill: float = DEFAULT_CONTEXT_FILL,
+) -> dict:
+    """Measure single-pass extraction quality against two-pass on the same text.
+
+    Two-pass output is the reference. Characters are compared by case-folded
+    name and relationships by unordered (source, target) name pair. Model calls
+    (every attempt, retries included) and cache hits are counted from METRICS
+    while each mode runs.
+    """
+    def measured(passes):
+        calls, hits = METRICS.total("chunk_attempts"), METRICS.total("chunk_cache_hits")
+        results = run_extraction(
+            books, config, passes=passes, cache=cache, scheduler=scheduler, context_fill=context_fill
+        )
+        return results, METRICS.total("chunk_attempts") - calls, METRICS.total("chunk_cache_hits") - hits
+
+    two, two_calls, two_hits = measured(TWO_PASS)
+    one, one_calls, one_hits = measured(SINGLE_PASS)
+
+    def names(results):
+        return {name_key(c["name"]) for r in results for c in r["characters"]}
+
+    def pairs(results):
+        return {
+            frozenset((name_key(rel["source_character"]), name_key(rel["target_character"])))
+            for r in results for rel in r["relationships"]
+        }
+
+    return {
+        "characters": _overlap(names(two), names(one)),
+        "relationships": _overlap(pairs(two), pairs(one)),
+        "llm_calls": {"two_pass": int(two_calls), "single_pass": int(one_calls)},
+        "cache_hits": {"two_pass": int(two_hits), "single_pass": int(one_hits)},
+    }
+
+# Titles and filler words that say nothing about who a name refers to: two
+# characters who are both "Captain" are not the same person
+NAME_STOP_TOKENS = frozenset({
+    "the", "of", "and", "a", "an",
+    "captain", "lord", "lady", "first", "brother", "sister", "warmaster",
+    "primarch", "commander", "master", "chaplain", "librarian", "sergeant",
+    "apothecary", "techmarine", "emperor", "king", "queen", "prince", "princess",
+    "sir", "dame", "general", "admiral", "colonel", "major", "lieutenant",
+    "high", "grand", "chief", "father", "mother", "saint", "doctor", "dr",
+    "mr", "mrs", "ms", "magos", "inquisitor",
+})
+
+_NAME_TOKEN_RE = re.compile(r"[^\W_]+(?:['’-][^\W_]+)*")
+
+
+def _name_tokens(name: str) -> set[str]:
+    """Casefolded identifying tokens of a name, without titles and filler."""
+    return {t for t in _NAME_TOKEN_RE.findall(name.casefold()) if t not in NAME_STOP_TOKENS}
+
+
+class _DisjointSet:
+    """Union-find over 0..n-1 with path halving and union by size."""
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
 
-    for i, chunk in enumerate(chunks):
-        result = _extract_chunk(chunk, RELATIONSHIP_PROMPT, RELATIONSHIP_EXAMPLES, config, debug=True)
-        if result is None:
-            skipped += 1
-        else:
-            annotated_docs.append(result)
-            for extraction in result.extractions:
-                if extraction.extraction_class == "relationship":
-                    attrs = extraction.attributes or {}
-                    source = (attrs.get("source_character") or "").strip()
-                    target = (attrs.get("target_character") or "").strip()
-                    if source and target:
-                        relationships.append({
-                            "source_character": source,
-                            "target_character": target,
-                            "type": attrs.get("type", "unknown") or "unknown",
-                            "description": attrs.get("description", "") or "",
-                        })
-        print(f"  Chunk {i+1}/{len(chunks)}: {len(relationships)} relationships ({skipped} skipped)")
-
-    return relationships, annotated_docs
 
 def deduplicate_characters(characters: list[dict]) -> list[dict]:
     """Merge characters that refer to the same person under different name variants.
 
-    Groups characters by matching on surname/last-name overlap, then picks
-    the longest (most complete) name as canonical.
+    Two mentions are merged when their names share an identifying token (titles
+    such as "Captain" or "Lord" don't count), and merging is transitive. Each
+    token is looked up in an inverted index instead of being compared against
+    every group, so this runs in near-linear time. The result does not depend
+    on the order of the input beyond which description is kept.
     """
-    groups: dict[str, list[dict]] = {}
+    sets = _DisjointSet(len(characters))
+    first_with: dict[str, int] = {}
 
-    for char in characters:
-        name = char["name"]
-        name_parts = name.lower().split()
-
-        merged = False
-        for key in list(groups.keys()):
-            key_parts = key.lower().split()
-            # Match if one name is a subset of the other's parts
-            if set(name_parts) & set(key_parts):
-                groups[key].append(char)
-                merged = True
-                break
+    for i, char in enumerate(characters):
+        # The full name is a key too, so names made only of titles
+        # ("The Emperor") still merge with their exact repeats
+        keys = _name_tokens(char["name"])
+        keys.add(name_key(char["name"]))
+        for key in keys:
+            j = first_with.setdefault(key, i)
+            if j != i:
+                sets.union(i, j)
 
-        if not merged:
-            groups[name] = [char]
+    groups: dict[int, list[dict]] = {}
+    for i, char in enumerate(characters):
+        groups.setdefault(sets.find(i), []).append(char)
 
     deduped = []
-    for key, group in groups.items():
-        # Use the longest name as canonical
-        canonical = max(group, key=lambda c: len(c["name"]))
-        # Merge descriptions from all variants
+    # Groups come out in order of their first mention
+    for group in groups.values():
+        # Use the longest name as canonical, alphabetically last on a tie
+        canonical = dict(max(group, key=lambda c: (len(c["name"]), c["name"])))
+        # Keep the canonical mention's description, else the first one given
         descriptions = [c["description"] for c in group if c["description"]]
-        canonical["description"] = descriptions[0] if descriptions else ""
+        if not canonical["description"] and descriptions:
+            canonical["description"] = descriptions[0]
         # Use most specific faction/role (longest non-Unknown)
         factions = [c["faction"] for c in group if c["faction"] and c["faction"] != "Unknown"]
         if factions:
-            canonical["faction"] = max(factions, key=len)
+            canonical["faction"] = max(factions, key=lambda f: (len(f), f))
         roles = [c["role"] for c in group if c["role"] and c["role"] != "Unknown"]
         if roles:
-            canonical["role"] = max(roles, key=len)
+            canonical["role"] = max(roles, key=lambda r: (len(r), r))
         deduped.append(canonical)
 
     return deduped
 
-def build_graph_data(characters: list[dict], relationships: list[dict]) -> dict:
-    """Assemble characters and relationships into D3-compatible graph JSON."""
-    # Build nodes with stable IDs
-    nodes = []
-    name_to_id: dict[str, str] = {}
+# Sample descriptions kept per aggregated edge, for the tooltip
+MAX_EDGE_SAMPLES = 3
+
+
+def _node_id(name: str) -> str:
+    return name.lower().replace(" ", "-")
+
+
+def _strip_titles(name: str) -> str:
+    return " ".join(t for t in _NAME_TOKEN_RE.findall(name.casefold()) if t not in NAME_STOP_TOKENS)
+
+
+def build_alias_index(characters: list[dict]) -> dict[str, str]:
+    """Map every casefolded way of referring to a character onto its node ID.
+
+    Full names always resolve. Names with titles stripped ("Captain Loken" ->
+    "loken") and single name tokens (surnames, first names) resolve only when
+    they belong to exactly one character.
+    """
+    index = {name_key(char["name"]): _node_id(char["name"]) for char in characters}
 
+    partial: dict[str, set[str]] = {}
     for char in characters:
-        node_id = char["name"].lower().replace(" ", "-")
-        name_to_id[char["name"]] = node_id
-        # Also map partial names to this ID
-        for part in char["name"].split():
-            if len(part) > 2:  # skip very short parts like "of", "the"
-                name_to_id.setdefault(part, node_id)
-        nodes.append({
-            "id": node_id,
+        node_id = _node_id(char["name"])
+        aliases = _name_tokens(char["name"])
+        aliases.add(_strip_titles(char["name"]))
+        aliases.discard("")
+        for alias in aliases:
+            partial.setdefault(alias, set()).add(node_id)
+
+    for alias, node_ids in partial.items():
+        if len(node_ids) == 1:
+            index.setdefault(alias, next(iter(node_ids)))
+    return index
+
+
+def build_graph_data(
+    characters: list[dict], relationships: list[dict], layout_iterations: int = 0, layout_seed: int = DEFAULT_LAYOUT_SEED
+) -> dict:
+    """Assemble characters and relationships into D3-compatible graph JSON.
+
+    Relationships are aggregated into one edge per (source, target, type), with
+    the number of mentions as its weight and up to MAX_EDGE_SAMPLES distinct
+    descriptions. With layout_iterations > 0, every node also gets precomputed
+    `x`/`y` coordinates from a seeded force-directed layout.
+    """
+    nodes = [
+        {
+            "id": _node_id(char["name"]),
             "name": char["name"],
             "faction": char["faction"],
             "role": char["role"],
             "description": char["description"],
+        }
+        for char in characters
+    ]
+    alias_index = build_alias_index(characters)
+
+    edges: dict[tuple[str, str, str], dict] = {}
+    for rel in relationships:
+        source_id = _resolve_name(rel["source_character"], alias_index)
+        target_id = _resolve_name(rel["target_character"], alias_index)
+        if source_id is None or target_id is None or source_id == target_id:
+            continue
+        edge = edges.setdefault((source_id, target_id, rel["type"]), {
+            "source": source_id,
+            "target": target_id,
+            "type": rel["type"],
+            "weight": 0,
+            "descriptions": [],
         })
+        edge["weight"] += 1
+        description = rel["description"]
+        if description and len(edge["descriptions"]) < MAX_EDGE_SAMPLES and description not in edge["descriptions"]:
+            edge["descriptions"].append(description)
 
-    node_ids = {n["id"] for n in nodes}
+    graph = {"nodes": nodes, "edges": list(edges.values())}
+    if layout_iterations:
+        from layout import apply_layout
 
-    # Build edges, resolving character names to node IDs
-    edges = []
-    for rel in relationships:
-        source_id = _resolve_name(rel["source_character"], name_to_id)
-        target_id = _resolve_name(rel["target_character"], name_to_id)
-        if source_id in node_ids and target_id in node_ids and source_id != target_id:
-            edges.append({
-                "source": source_id,
-                "target": target_id,
-                "type": rel["type"],
-                "description": rel["description"],
-            })
-
-    return {"nodes": nodes, "edges": edges}
-
-
-def _resolve_name(name: str, name_to_id: dict[str, str]) -> str:
-    """Resolve a character name to its node ID using exact or partial matching."""
-    if name in name_to_id:
-        return name_to_id[name]
-    # Try matching individual parts
-    for part in name.split():
-        if part in name_to_id:
-            return name_to_id[part]
-    # Fallback: generate an ID
-    return name.lower().replace(" ", "-")
+        apply_layout(graph, iterations=layout_iterations, seed=layout_seed)
+    return graph
+
+
+def _resolve_name(name: str, alias_index: dict[str, str]) -> str | None:
+    """Resolve a character name to its node ID, or None if it matches no single character."""
+    for key in (name_key(name), _strip_titles(name)):
+        if key in alias_index:
+            return alias_index[key]
+    matches = {alias_index[t] for t in _name_tokens(name) if t in alias_index}
+    return matches.pop() if len(matches) == 1 else None
+
+
+def book_provenance(books: list[tuple[str, list[dict], list[dict]]], characters: list[dict]) -> dict:
+    """Count, per book, the mentions behind each graph node and edge.
+
+    books holds (book_name, characters, relationships) as extracted from that
+    book; characters is the deduplicated list the graph was built from. Names
+    resolve through the same alias index as build_graph_data. Returns
+    {"nodes": [(node_id, book, mentions, first_page)], "edges": [(source, target, type, book, mentions, first_page)]},
+    where first_page is the earliest page a mention was found on, or None when
+    no mention carries a page.
+    """
+    alias_index = build_alias_index(characters)
+    node_rows = []
+    edge_rows = []
+
+    def count(counts: dict, key, page: int | None) -> None:
+        mentions, first_page = counts.get(key, (0, None))
+        if first_page is None or (page is not None and page < first_page):
+            first_page = page
+        counts[key] = (mentions + 1, first_page)
+
+    for book, book_characters, book_relationships in books:
+        node_counts: dict[str, tuple[int, int | None]] = {}
+        for char in book_characters:
+            node_id = _resolve_name(char["name"], alias_index)
+            if node_id is not None:
+                count(node_counts, node_id, char.get("page"))
+        edge_counts: dict[tuple[str, str, str], tuple[int, int | None]] = {}
+        for rel in book_relationships:
+            source_id = _resolve_name(rel["source_character"], alias_index)
+            target_id = _resolve_name(rel["target_character"], alias_index)
+            if source_id is None or target_id is None or source_id == target_id:
+                continue
+            count(edge_counts, (source_id, target_id, rel["type"]), rel.get("page"))
+            # A character named only in relationships still appears in the book
+            for node_id in (source_id, target_id):
+                node_counts.setdefault(node_id, (0, None))
+        node_rows.extend((node_id, book, *counted) for node_id, counted in node_counts.items())
+        edge_rows.extend((*key, book, *counted) for key, counted in edge_counts.items())
+    return {"nodes": node_rows, "edges": edge_rows}
 
 
 def write_graph_json(data: dict, output_path: str) -> None:
-    """Write graph data to a JSON file."""
+    """Write graph data to a compact JSON file."""
     with open(output_path, "w") as f:
-        json.dump(data, f, indent=2)
+        json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
     print(f"Wrote {len(data['nodes'])} characters and {len(data['edges'])} relationships to {output_path}")
 
 
-def save_visualization(annotated_docs: list, output_dir: str = "data") -> None:
-    """Save annotated documents as JSONL and generate an HTML visualization."""
-    jsonl_name = "extraction_results.jsonl"
-    viz_path = os.path.join(output_dir, "visualization.html")
+# Chunks shown per visualization page; each is a separate lazily loaded frame
+VIZ_CHUNKS_PER_PAGE = 25
+VIZ_DIR_NAME = "visualization"
+
+_VIZ_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>{title}</title>
+<style>
+  body {{ font-family: 'Segoe UI', system-ui, sans-serif; margin: 24px; background: #fafafa; color: #222; }}
+  nav {{ margin: 12px 0; }}
+  nav a {{ margin-right: 12px; }}
+  h2 {{ font-size: 15px; margin: 24px 0 6px; color: #555; }}
+  iframe {{ width: 100%; height: 480px; border: 1px solid #ddd; background: #fff; }}
+  li {{ margin: 4px 0; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+
+def _viz_frame(document: dict) -> str:
+    """One chunk's LangExtract visualization, isolated in its own frame."""
+    import langextract as lx
+    from langextract import data_lib
 
-    lx.io.save_annotated_documents(
-        annotated_docs,
-        output_name=jsonl_name,
-        output_dir=output_dir,
+    content = lx.visualize(data_lib.dict_to_annotated_document(document))
+    if hasattr(content, "data"):
+        content = content.data
+    return (
+        f'<iframe loading="lazy" srcdoc="{html.escape(content, quote=True)}" '
+        'onload="this.style.height = this.contentDocument.body.scrollHeight + 40 + \'px\'"></iframe>'
     )
 
-    jsonl_path = os.path.join(output_dir, jsonl_name)
-    html_content = lx.visualize(jsonl_path)
-    if hasattr(html_content, "data"):
-        html_content = html_content.data
+
+def _viz_slugs(books: list[str]) -> dict[str, str]:
+    """File-name slug of every book, unique even on case-insensitive filesystems.
+
+    A book whose slug is already taken gets a short hash of its name appended,
+    so one book's pages never overwrite another's.
+    """
+    slugs = {}
+    taken = set()
+    for book in books:
+        slug = re.sub(r"[^\w.-]+", "-", book).strip("-") or "book"
+        if slug.casefold() in taken:
+            slug = f"{slug}-{hashlib.sha256(book.encode('utf-8')).hexdigest()[:8]}"
+        taken.add(slug.casefold())
+        slugs[book] = slug
+    return slugs
+
+
+def _viz_page_name(slug: str, page: int) -> str:
+    return f"{slug}-{page}.html"
+
+
+def save_visualization(shards: AnnotationShards, books: list[str], output_dir: str = "data") -> None:
+    """Generate a paginated HTML visualization from per-book annotated document shards.
+
+    Writes an index page (visualization.html) linking to per-book pages of
+    VIZ_CHUNKS_PER_PAGE chunks each under visualization/. Pages are built one
+    at a time from the shards, so memory use does not depend on the corpus size.
+    """
+    viz_path = os.path.join(output_dir, "visualization.html")
+    page_dir = os.path.join(output_dir, VIZ_DIR_NAME)
+    os.makedirs(page_dir, exist_ok=True)
+
+    items = []
+    pages_written = 0
+    slugs = _viz_slugs(books)
+    for book in books:
+        slug = slugs[book]
+        index = shards.index(book)
+        pages = [index[i:i + VIZ_CHUNKS_PER_PAGE] for i in range(0, len(index), VIZ_CHUNKS_PER_PAGE)]
+        if not pages:
+            items.append(f"<li>{html.escape(book)}: no extractions</li>")
+            continue
+        for number, entries in enumerate(pages, 1):
+            nav = ['<a href="../visualization.html">All books</a>']
+            if number > 1:
+                nav.append(f'<a href="{_viz_page_name(slug, number - 1)}">&larr; Previous</a>')
+            if number < len(pages):
+                nav.append(f'<a href="{_viz_page_name(slug, number + 1)}">Next &rarr;</a>')
+            nav.append(f"Page {number} of {len(pages)}")
+            sections = [f"<nav>{' '.join(nav)}</nav>"]
+            for record in shards.read_at(book, [position for _, _, position in entries]):
+                sections.append(f"<h2>{html.escape(record['pass'])} pass, chunk {record['chunk'] + 1}</h2>")
+                sections.append(_viz_frame(record["document"]))
+            sections.append(f"<nav>{' '.join(nav)}</nav>")
+            with open(os.path.join(page_dir, _viz_page_name(slug, number)), "w") as f:
+                f.write(_VIZ_PAGE.format(title=html.escape(book), body="\n".join(sections)))
+            pages_written += 1
+        links = " ".join(
+            f'<a href="{VIZ_DIR_NAME}/{_viz_page_name(slug, number)}">{number}</a>' for number in range(1, len(pages) + 1)
+        )
+        items.append(f"<li>{html.escape(book)} ({len(index)} chunks): pages {links}</li>")
+
     with open(viz_path, "w") as f:
-        f.write(html_content)
-    print(f"Wrote visualization to {viz_path}")
+        f.write(_VIZ_PAGE.format(title="Extraction details", body=f"<ul>{''.join(items)}</ul>"))
+    print(f"Wrote visualization index to {viz_path} and {pages_written} page(s) to {page_dir}")
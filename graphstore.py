@@ -0,0 +1,267 @@
+"""Indexed SQLite store of the character graph, for loading subgraphs on demand."""
+
+import json
+import os
+import sqlite3
+import threading
+
+from names import name_key
+
+DEFAULT_STORE_NAME = "graph.db"
+# Cap on the nodes any one query returns, so a hub character cannot pull in the whole graph
+DEFAULT_QUERY_LIMIT = 500
+MAX_HOPS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    faction TEXT NOT NULL,
+    role TEXT NOT NULL,
+    description TEXT NOT NULL,
+    x REAL,
+    y REAL,
+    degree INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS nodes_faction ON nodes (faction, degree DESC);
+CREATE INDEX IF NOT EXISTS nodes_degree ON nodes (degree DESC);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    PRIMARY KEY (alias, node_id)
+);
+CREATE TABLE IF NOT EXISTS edges (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    type TEXT NOT NULL,
+    weight INTEGER NOT NULL,
+    descriptions TEXT NOT NULL,
+    PRIMARY KEY (source, target, type)
+);
+CREATE INDEX IF NOT EXISTS edges_target ON edges (target);
+CREATE TABLE IF NOT EXISTS node_books (
+    node_id TEXT NOT NULL,
+    book TEXT NOT NULL,
+    mentions INTEGER NOT NULL,
+    first_page INTEGER,
+    PRIMARY KEY (book, node_id)
+);
+CREATE INDEX IF NOT EXISTS node_books_node ON node_books (node_id);
+CREATE TABLE IF NOT EXISTS edge_books (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    type TEXT NOT NULL,
+    book TEXT NOT NULL,
+    mentions INTEGER NOT NULL,
+    first_page INTEGER,
+    PRIMARY KEY (book, source, target, type)
+);
+CREATE INDEX IF NOT EXISTS edge_books_edge ON edge_books (source, target);
+"""
+# Bumped when a table changes shape; older provenance tables are dropped and
+# refilled by the next replace()
+_SCHEMA_VERSION = 1
+
+_NODE_COLUMNS = "id, name, faction, role, description, x, y"
+
+
+def _like_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class GraphStore:
+    """Nodes, aliases, weighted edges and per-book provenance of one graph.
+
+    Queries return the same {"nodes": [...], "edges": [...]} shape as
+    data.json, restricted to a subgraph: an edge is included only when both of
+    its endpoints are. Safe to share between threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            if self._db.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+                self._db.executescript("DROP TABLE IF EXISTS node_books; DROP TABLE IF EXISTS edge_books;")
+            self._db.executescript(_SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def replace(self, graph: dict, aliases: dict[str, str], provenance: dict | None = None) -> None:
+        """Replace the stored graph with a build_graph_data() graph in one transaction.
+
+        aliases maps alias keys to node IDs (build_alias_index). provenance, from
+        book_provenance(), lists per-book mention counts and first pages for
+        nodes and edges.
+        """
+        degree: dict[str, int] = {}
+        for e in graph["edges"]:
+            degree[e["source"]] = degree.get(e["source"], 0) + e["weight"]
+            degree[e["target"]] = degree.get(e["target"], 0) + e["weight"]
+        node_ids = {n["id"] for n in graph["nodes"]}
+        edge_keys = {(e["source"], e["target"], e["type"]) for e in graph["edges"]}
+        provenance = provenance or {"nodes": [], "edges": []}
+
+        with self._lock, self._db:
+            for table in ("nodes", "aliases", "edges", "node_books", "edge_books"):
+                self._db.execute(f"DELETE FROM {table}")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (n["id"], n["name"], name_key(n["name"]), n["faction"], n["role"], n["description"],
+                     n.get("x"), n.get("y"), degree.get(n["id"], 0))
+                    for n in graph["nodes"]
+                ),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO aliases VALUES (?, ?)",
+                ((alias, node_id) for alias, node_id in aliases.items() if node_id in node_ids),
+            )
+            self._db.executemany(
+                "INSERT INTO edges VALUES (?, ?, ?, ?, ?)",
+                (
+                    (e["source"], e["target"], e["type"], e["weight"], json.dumps(e["descriptions"], ensure_ascii=False))
+                    for e in graph["edges"]
+                ),
+            )
+            self._db.executemany(
+                "INSERT INTO node_books VALUES (?, ?, ?, ?)",
+                (row for row in provenance["nodes"] if row[0] in node_ids),
+            )
+            self._db.executemany(
+                "INSERT INTO edge_books VALUES (?, ?, ?, ?, ?, ?)",
+                (row for row in provenance["edges"] if row[:3] in edge_keys),
+            )
+        with self._lock:
+            self._db.execute("ANALYZE")
+
+    def _rows(self, sql: str, params=()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def summary(self) -> dict:
+        """Graph size plus every faction and book with its character count."""
+        return {
+            "nodes": self._rows("SELECT COUNT(*) FROM nodes")[0][0],
+            "edges": self._rows("SELECT COUNT(*) FROM edges")[0][0],
+            "factions": [
+                {"name": r[0], "nodes": r[1]}
+                for r in self._rows("SELECT faction, COUNT(*) AS n FROM nodes GROUP BY faction ORDER BY n DESC, faction")
+            ],
+            "books": [
+                {"name": r[0], "nodes": r[1]}
+                for r in self._rows("SELECT book, COUNT(*) FROM node_books GROUP BY book ORDER BY book")
+            ],
+        }
+
+    def subgraph(self, node_ids: list[str]) -> dict:
+        """The given nodes and every edge between two of them.
+
+        Every node and edge lists the books it was mentioned in, with the
+        mention count and the first page it was found on (null when unknown).
+        """
+        ids = json.dumps(list(node_ids))
+        nodes = self._rows(
+            f"SELECT {_NODE_COLUMNS} FROM nodes WHERE id IN (SELECT value FROM json_each(?)) ORDER BY degree DESC, id",
+            (ids,),
+        )
+        edges = self._rows(
+            "SELECT source, target, type, weight, descriptions FROM edges "
+            "WHERE source IN (SELECT value FROM json_each(?1)) AND target IN (SELECT value FROM json_each(?1))",
+            (ids,),
+        )
+        node_books: dict[str, list[dict]] = {}
+        for row in self._rows(
+            "SELECT node_id, book, mentions, first_page FROM node_books "
+            "WHERE node_id IN (SELECT value FROM json_each(?)) ORDER BY book",
+            (ids,),
+        ):
+            node_books.setdefault(row[0], []).append({"book": row[1], "mentions": row[2], "first_page": row[3]})
+        edge_books: dict[tuple, list[dict]] = {}
+        for row in self._rows(
+            "SELECT source, target, type, book, mentions, first_page FROM edge_books "
+            "WHERE source IN (SELECT value FROM json_each(?1)) AND target IN (SELECT value FROM json_each(?1)) "
+            "ORDER BY book",
+            (ids,),
+        ):
+            edge_books.setdefault(tuple(row[:3]), []).append({"book": row[3], "mentions": row[4], "first_page": row[5]})
+        return {
+            "nodes": [
+                {
+                    **{k: row[k] for k in row.keys() if not (k in ("x", "y") and row[k] is None)},
+                    "books": node_books.get(row["id"], []),
+                }
+                for row in nodes
+            ],
+            "edges": [
+                {
+                    **dict(row),
+                    "descriptions": json.loads(row["descriptions"]),
+                    "books": edge_books.get((row["source"], row["target"], row["type"]), []),
+                }
+                for row in edges
+            ],
+        }
+
+    def top(self, limit: int = DEFAULT_QUERY_LIMIT) -> dict:
+        """The most connected characters, as an overview to start from."""
+        rows = self._rows("SELECT id FROM nodes ORDER BY degree DESC, id LIMIT ?", (limit,))
+        return self.subgraph([r[0] for r in rows])
+
+    def neighborhood(self, node_id: str, hops: int = 1, limit: int = DEFAULT_QUERY_LIMIT) -> dict:
+        """Every character within `hops` relationships of node_id, closest first.
+
+        When a ring of neighbours would exceed limit, its most connected members
+        are kept.
+        """
+        hops = max(0, min(hops, MAX_HOPS))
+        if not self._rows("SELECT 1 FROM nodes WHERE id = ?", (node_id,)):
+            return {"nodes": [], "edges": []}
+        seen = [node_id]
+        frontier = [node_id]
+        for _ in range(hops):
+            if not frontier or len(seen) >= limit:
+                break
+            rows = self._rows(
+                "SELECT n.id FROM nodes n JOIN ("
+                "  SELECT target AS id FROM edges WHERE source IN (SELECT value FROM json_each(?1))"
+                "  UNION SELECT source FROM edges WHERE target IN (SELECT value FROM json_each(?1))"
+                ") USING (id) WHERE n.id NOT IN (SELECT value FROM json_each(?2)) "
+                "ORDER BY n.degree DESC, n.id LIMIT ?3",
+                (json.dumps(frontier), json.dumps(seen), limit - len(seen)),
+            )
+            frontier = [r[0] for r in rows]
+            seen.extend(frontier)
+        return self.subgraph(seen)
+
+    def faction(self, name: str, limit: int = DEFAULT_QUERY_LIMIT) -> dict:
+        """The most connected characters of one faction."""
+        rows = self._rows("SELECT id FROM nodes WHERE faction = ? ORDER BY degree DESC, id LIMIT ?", (name, limit))
+        return self.subgraph([r[0] for r in rows])
+
+    def book(self, name: str, limit: int = DEFAULT_QUERY_LIMIT) -> dict:
+        """The characters mentioned most often in one book."""
+        rows = self._rows(
+            "SELECT node_id FROM node_books WHERE book = ? ORDER BY mentions DESC, node_id LIMIT ?", (name, limit)
+        )
+        return self.subgraph([r[0] for r in rows])
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        """Characters whose name or an alias contains query, most connected first."""
+        key = name_key(query)
+        if not key:
+            return []
+        pattern = f"%{_like_escape(key)}%"
+        rows = self._rows(
+            "SELECT id, name, faction, role FROM nodes WHERE name_key LIKE ?1 ESCAPE '\\' "
+            "OR id IN (SELECT node_id FROM aliases WHERE alias LIKE ?1 ESCAPE '\\') "
+            "ORDER BY name_key = ?2 DESC, degree DESC, id LIMIT ?3",
+            (pattern, key, limit),
+        )
+        return [dict(row) for row in rows]
@@ -0,0 +1,167 @@
+"""Append-only run journal and dead-letter file, so interrupted or partly failed runs can resume."""
+
+import hashlib
+import json
+import os
+import threading
+
+DEFAULT_JOURNAL_NAME = "run_journal.jsonl"
+DEFAULT_DEAD_LETTER_NAME = "dead_letters.jsonl"
+
+
+def _chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """Records every completed (book, pass, chunk) result and every failed book
+    as one JSON line, flushed as soon as it is written.
+
+    Chunks are identified by their index and a hash of their text, so a journal
+    written with different chunking is never replayed against the wrong text.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.resumed_chunks = 0
+        self._done: dict[tuple, dict] = {}
+        self._failed: dict[str, str] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if resume:
+            self._load()
+        self._file = open(path, "a" if resume else "w")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write leaves a truncated last line
+                    continue
+                # Failed books are not replayed: a resumed run tries them again
+                if entry.get("kind") == "chunk":
+                    key = (entry["book"], entry["pass"], entry["chunk"], entry["hash"])
+                    self._done[key] = entry["result"]
+
+    def _append(self, entry: dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def get_chunk(self, book: str, pass_name: str, index: int, chunk: str) -> dict | None:
+        """Return the recorded result for a chunk, or None if it has not completed."""
+        result = self._done.get((book, pass_name, index, _chunk_hash(chunk)))
+        if result is not None:
+            with self._lock:
+                self.resumed_chunks += 1
+        return result
+
+    def record_chunk(self, book: str, pass_name: str, index: int, chunk: str, result: dict) -> None:
+        self._append({
+            "kind": "chunk",
+            "book": book,
+            "pass": pass_name,
+            "chunk": index,
+            "hash": _chunk_hash(chunk),
+            "result": result,
+        })
+
+    def record_failed_book(self, book: str, error: str) -> None:
+        self._failed[book] = error
+        self._append({"kind": "book_failed", "book": book, "error": error})
+
+    @property
+    def failed_books(self) -> dict[str, str]:
+        """Books that failed during this run, mapped to their error message."""
+        return dict(self._failed)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class DeadLetters:
+    """Chunks that failed permanently, kept with their text so a later run can
+    retry just those chunks.
+
+    Failures and later recoveries are appended as JSON lines as they happen,
+    so the file survives a crash; close() rewrites it with only the chunks
+    that are still failing. Chunks are keyed like the run journal's.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    key = (entry["book"], entry["pass"], entry["chunk"], entry["hash"])
+                    if entry.get("resolved"):
+                        self._entries.pop(key, None)
+                    else:
+                        self._entries[key] = entry
+        self._file = open(path, "a")
+
+    def _append(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def record(
+        self, book: str, pass_name: str, index: int, offset: int, chunk: str, kind: str, error: str, attempts: int
+    ) -> None:
+        """Record a chunk that could not be extracted; kind is its error class."""
+        entry = {
+            "book": book,
+            "pass": pass_name,
+            "chunk": index,
+            "hash": _chunk_hash(chunk),
+            "offset": offset,
+            "text": chunk,
+            "error_kind": kind,
+            "error": error,
+            "attempts": attempts,
+        }
+        with self._lock:
+            self._entries[(book, pass_name, index, entry["hash"])] = entry
+            self._append(entry)
+
+    def resolve(self, book: str, pass_name: str, index: int, chunk: str) -> None:
+        """Drop a chunk that has now been extracted, if it was dead-lettered."""
+        key = (book, pass_name, index, _chunk_hash(chunk))
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._append({"book": book, "pass": pass_name, "chunk": index, "hash": key[3], "resolved": True})
+
+    def discard_books(self, books: list[str]) -> None:
+        """Forget the entries of books that are about to be extracted again."""
+        books = set(books)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in books]:
+                del self._entries[key]
+                self._append({"book": key[0], "pass": key[1], "chunk": key[2], "hash": key[3], "resolved": True})
+
+    def entries(self) -> list[dict]:
+        """Chunks still failing, in the order they were first recorded."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
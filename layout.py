@@ -0,0 +1,204 @@
+"""Offline, deterministic force-directed layout for the character graph.
+
+numpy is imported when a layout is computed, not with this module, so the
+CLI can read the defaults below without loading it.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_LAYOUT_SEED = 42
+DEFAULT_LAYOUT_ITERATIONS = 300
+# Steps that settle a layout warm-started from an earlier one
+WARM_LAYOUT_ITERATIONS = 30
+# Ideal distance between connected nodes, in viewer pixels
+NODE_SPACING = 80.0
+# Above this many nodes, far-away nodes repel as grid-cell aggregates
+EXACT_LAYOUT_MAX_NODES = 500
+# Average nodes per grid cell in the approximate mode
+NODES_PER_CELL = 6
+# The grid spans this percentile range of positions; outliers go in border cells
+GRID_PERCENTILES = (1, 99)
+GRAVITY = 1.0
+# Rows of the pairwise matrices computed at once, bounding memory at ~BLOCK * n
+BLOCK = 512
+
+
+def _repulsion_exact(pos: np.ndarray, k2: float) -> np.ndarray:
+    """Fruchterman-Reingold repulsion (k^2 / d) between every pair of nodes."""
+    import numpy as np
+
+    disp = np.zeros_like(pos)
+    x, y = pos[:, 0], pos[:, 1]
+    for start in range(0, len(pos), BLOCK):
+        rows = slice(start, start + BLOCK)
+        dx = x[rows, None] - x[None, :]
+        dy = y[rows, None] - y[None, :]
+        weight = k2 / np.maximum(dx * dx + dy * dy, 1e-2)
+        disp[rows, 0] = (dx * weight).sum(axis=1)
+        disp[rows, 1] = (dy * weight).sum(axis=1)
+    return disp
+
+
+def _repulsion_grid(pos: np.ndarray, k2: float) -> np.ndarray:
+    """Approximate repulsion in the spirit of Barnes-Hut, with a single level.
+
+    Nodes are binned into a grid. Pairs in the same or adjacent cells repel
+    exactly; every other cell acts as one body of its node count placed at its
+    centroid, and that far-field push is computed once per cell and shared by
+    the cell's nodes. Cost is about cells^2 + 9 * n * nodes per cell per
+    iteration. The grid covers the bulk of the nodes rather than their full
+    extent, so a few far-flung isolated nodes cannot squeeze everyone else into
+    one cell.
+    """
+    import numpy as np
+
+    n = len(pos)
+    g = max(2, int(math.sqrt(n / NODES_PER_CELL)))
+    lo, hi = np.percentile(pos, GRID_PERCENTILES, axis=0)
+    cell_size = max(float((hi - lo).max()), 1e-9) / g * (1 + 1e-9)
+    cx, cy = np.clip(((pos - lo) / cell_size).astype(np.int64), 0, g - 1).T
+    cell = cx * g + cy
+
+    counts = np.bincount(cell, minlength=g * g)
+    occupied = np.flatnonzero(counts)
+    mass = counts[occupied].astype(pos.dtype)
+    centroids = np.stack([
+        np.bincount(cell, pos[:, 0], g * g)[occupied],
+        np.bincount(cell, pos[:, 1], g * g)[occupied],
+    ], axis=1) / mass[:, None]
+
+    # Far field: every non-adjacent cell as a single body, acting on each
+    # occupied cell's centroid
+    far = np.zeros((g * g, 2), dtype=pos.dtype)
+    for start in range(0, len(occupied), BLOCK):
+        rows = slice(start, start + BLOCK)
+        delta = centroids[rows, None, :] - centroids[None, :, :]
+        force = mass * k2 / np.maximum((delta ** 2).sum(axis=-1), 1e-2)
+        adjacent = (
+            (np.abs(occupied[rows, None] // g - occupied[None, :] // g) <= 1)
+            & (np.abs(occupied[rows, None] % g - occupied[None, :] % g) <= 1)
+        )
+        force[adjacent] = 0.0
+        far[occupied[rows]] = (delta * force[:, :, None]).sum(axis=1)
+    disp = far[cell]
+
+    # Near field: exact pairs with every node of the 3x3 neighbourhood
+    order = np.argsort(cell, kind="stable")
+    starts = np.searchsorted(cell[order], np.arange(g * g))
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            nx, ny = cx + dx, cy + dy
+            nodes = np.flatnonzero((nx >= 0) & (nx < g) & (ny >= 0) & (ny < g))
+            neighbour = nx[nodes] * g + ny[nodes]
+            per_node = counts[neighbour]
+            if not per_node.sum():
+                continue
+            i = np.repeat(nodes, per_node)
+            offsets = np.arange(per_node.sum()) - np.repeat(np.cumsum(per_node) - per_node, per_node)
+            j = order[np.repeat(starts[neighbour], per_node) + offsets]
+            delta = pos[i] - pos[j]
+            d2 = np.maximum((delta ** 2).sum(axis=-1), 1e-2)
+            push = delta * (k2 / d2)[:, None]
+            disp[:, 0] += np.bincount(i, push[:, 0], n)
+            disp[:, 1] += np.bincount(i, push[:, 1], n)
+    return disp
+
+
+def force_layout(
+    n: int,
+    edges: list[tuple[int, int, float]],
+    iterations: int = DEFAULT_LAYOUT_ITERATIONS,
+    seed: int = DEFAULT_LAYOUT_SEED,
+    initial: np.ndarray | None = None,
+) -> np.ndarray:
+    """Lay out n nodes with a vectorized Fruchterman-Reingold simulation.
+
+    edges are (source index, target index, weight); heavier edges pull harder.
+    initial, an (n, 2) array with NaN rows for nodes it does not place, warm
+    starts the simulation: placed nodes start there instead of at random, and
+    the temperature starts at one node spacing so they only settle. The same
+    inputs and seed always give the same positions. Returns an (n, 2) array
+    centred on the origin, in viewer pixels.
+    """
+    import numpy as np
+
+    if n == 0:
+        return np.zeros((0, 2))
+    rng = np.random.default_rng(seed)
+    k = NODE_SPACING
+    side = k * math.sqrt(n)
+    pos = rng.uniform(-side / 2, side / 2, size=(n, 2))
+    start_temp = side / 10
+
+    src = np.array([e[0] for e in edges], dtype=np.int64)
+    dst = np.array([e[1] for e in edges], dtype=np.int64)
+    if initial is not None:
+        placed = ~np.isnan(initial).any(axis=1)
+        pos[placed] = initial[placed]
+        # New nodes start next to the placed nodes they connect to, if any
+        ends = np.concatenate([src, dst])
+        others = np.concatenate([dst, src])
+        linked = placed[others] & ~placed[ends]
+        counts = np.bincount(ends[linked], minlength=n)
+        near = counts > 0
+        for axis in (0, 1):
+            total = np.bincount(ends[linked], pos[others[linked], axis], n)
+            pos[near, axis] = total[near] / counts[near] + rng.uniform(-k, k, near.sum())
+        start_temp = k
+
+    strength = 1 + np.log([max(e[2], 1) for e in edges]) if edges else np.zeros(0)
+    repulsion = _repulsion_exact if n <= EXACT_LAYOUT_MAX_NODES else _repulsion_grid
+
+    for step in range(iterations):
+        disp = repulsion(pos, k * k)
+        if len(src):
+            delta = pos[src] - pos[dst]
+            dist = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-2)
+            pull = delta * (dist * strength / k)[:, None]
+            for axis in (0, 1):
+                disp[:, axis] -= np.bincount(src, pull[:, axis], n)
+                disp[:, axis] += np.bincount(dst, pull[:, axis], n)
+        # Keep disconnected components from drifting apart
+        disp -= GRAVITY * pos
+
+        # Move each node along its displacement, capped by a cooling temperature
+        temp = start_temp * (1 - step / iterations) + 1
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-9)
+        pos += disp * (np.minimum(length, temp) / length)[:, None]
+
+    return pos - pos.mean(axis=0)
+
+
+def apply_layout(
+    graph: dict,
+    iterations: int = DEFAULT_LAYOUT_ITERATIONS,
+    seed: int = DEFAULT_LAYOUT_SEED,
+    initial: dict[str, tuple[float, float]] | None = None,
+) -> dict:
+    """Add precomputed `x`/`y` coordinates to every node of a build_graph_data() graph.
+
+    initial maps node IDs to the coordinates of an earlier layout to warm start
+    from (see force_layout()); nodes missing from it start at random.
+    """
+    import numpy as np
+
+    index = {node["id"]: i for i, node in enumerate(graph["nodes"])}
+    edges = [
+        (index[e["source"]], index[e["target"]], e.get("weight", 1))
+        for e in graph["edges"]
+        if e["source"] in index and e["target"] in index
+    ]
+    start = None
+    if initial:
+        start = np.array([initial.get(node_id, (np.nan, np.nan)) for node_id in index], dtype=float)
+    pos = force_layout(len(index), edges, iterations=iterations, seed=seed, initial=start)
+    for node, (x, y) in zip(graph["nodes"], pos):
+        node["x"] = round(float(x), 1)
+        node["y"] = round(float(y), 1)
+    return graph
@@ -1,19 +1,50 @@
 """CLI entry point for Warhammer 40k character relationship extraction."""
 
 import argparse
+import cProfile
 import glob
+import json
 import os
+import pstats
+import socket
 import sys
+import time
+from datetime import datetime, timezone
 
 from dotenv import load_dotenv
 
+from cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB, ExtractionCache
+from corpus import DEFAULT_CORPUS_DIR, CorpusStore, file_sha256
+from graphstore import DEFAULT_STORE_NAME, GraphStore
+from journal import DEFAULT_DEAD_LETTER_NAME, DEFAULT_JOURNAL_NAME, DeadLetters, RunJournal
+from layout import DEFAULT_LAYOUT_ITERATIONS, DEFAULT_LAYOUT_SEED, WARM_LAYOUT_ITERATIONS
+from metrics import METRICS
+from scheduler import DEFAULT_CONCURRENCY, ERROR_KINDS, ChunkScheduler
+from shards import DEFAULT_SHARD_DIR_NAME, AnnotationShards
+from workqueue import DEFAULT_LEASE_SECONDS, QueueConfigError, WorkQueue
 from extract import (
-    extract_text_from_pdf,
-    extract_characters,
-    extract_relationships,
+    DEFAULT_CONTEXT_FILL,
+    DEFAULT_MAX_UNRESOLVED,
+    SINGLE_PASS,
+    TWO_PASS,
+    ModelCascade,
+    PDFReadError,
+    load_pdf_texts,
+    load_legacy_extractions,
+    load_stored_extractions,
+    run_extraction,
+    enqueue_extraction,
+    work_queue,
+    collect_queue_results,
+    compare_pass_modes,
+    extraction_fingerprint,
     deduplicate_characters,
+    build_alias_index,
     build_graph_data,
+    book_provenance,
     build_provider_config,
+    build_endpoint_pool,
+    retry_dead_letters,
     write_graph_json,
     save_visualization,
 )
@@ -30,9 +61,365 @@ def _resolve_pdfs(path: str) -> list[str]:
     return [path]
 
 
+def _print_pass_comparison(report: dict) -> None:
+    """Print single-pass vs. two-pass quality deltas from compare_pass_modes()."""
+    calls, hits = report["llm_calls"], report["cache_hits"]
+    print(f"\nLLM calls: two-pass {calls['two_pass']}, single-pass {calls['single_pass']}")
+    if hits["two_pass"] or hits["single_pass"]:
+        print(
+            f"Served from cache (not counted above): two-pass {hits['two_pass']}, single-pass {hits['single_pass']} "
+            "chunk(s); use --no-cache to measure every call"
+        )
+    for kind in ("characters", "relationships"):
+        r = report[kind]
+        print(
+            f"{kind.capitalize()}: two-pass {r['reference']}, single-pass {r['candidate']}, "
+            f"shared {r['common']} (recall {r['recall']:.0%}, precision {r['precision']:.0%})"
+        )
+
+
+def _print_stage_times() -> None:
+    """Print where the run's time went, from the metrics registry."""
+    stages = ("pdf_text", "extract", "dedup", "graph", "write", "store", "visualize")
+    parts = [f"{stage} {METRICS.total('stage_seconds', stage=stage):.1f}s" for stage in stages]
+    print(f"Stage times: {', '.join(parts)}")
+    latency = METRICS.total("llm_latency_seconds", outcome="ok") + METRICS.total("llm_latency_seconds", outcome="error")
+    print(
+        f"Model calls: {METRICS.total('chunk_attempts'):.0f} attempts, {METRICS.total('chunk_retries'):.0f} retries, "
+        f"{METRICS.total('chunk_splits'):.0f} splits, {METRICS.total('backoff_seconds'):.1f}s backoff, "
+        f"{latency:.1f}s total latency"
+    )
+    calls = METRICS.count("ollama_prompt_eval_seconds")
+    if calls:
+        evaluated = METRICS.total("ollama_prompt_eval_tokens")
+        prompt_tokens = METRICS.total("ollama_prompt_tokens")
+        print(
+            f"Ollama per call: prompt eval {METRICS.total('ollama_prompt_eval_seconds') / calls:.2f}s "
+            f"({evaluated / calls:.0f} of ~{prompt_tokens / calls:.0f} prompt tokens evaluated, "
+            f"~{max(0.0, 1 - evaluated / prompt_tokens):.0%} reused from the KV cache), "
+            f"generation {METRICS.total('ollama_generation_seconds') / calls:.2f}s "
+            f"({METRICS.total('ollama_generated_tokens') / calls:.0f} tokens); "
+            f"{METRICS.total('ollama_load_seconds'):.1f}s spent loading the model"
+        )
+    errors = {kind: METRICS.total("chunk_errors", kind=kind) for kind in ERROR_KINDS}
+    if any(errors.values()):
+        print("Model errors: " + ", ".join(f"{count:.0f} {kind}" for kind, count in errors.items() if count))
+
+
+def _check_api_key(provider: str) -> None:
+    """Exit with an error when the provider's API key env var is missing."""
+    if provider == "ollama-cloud" and not os.getenv("OLLAMA_API_KEY"):
+        print("Error: OLLAMA_API_KEY env var is required for ollama-cloud provider", file=sys.stderr)
+        sys.exit(1)
+    if provider == "gemini" and not os.getenv("GEMINI_API_KEY"):
+        print("Error: GEMINI_API_KEY env var is required for gemini provider", file=sys.stderr)
+        sys.exit(1)
+
+
+def _model_id(provider: str, model: str | None) -> str:
+    """--model, else OLLAMA_MODEL, else the provider's default model."""
+    default_models = {
+        "ollama": "llama3.1:latest",
+        "ollama-cloud": "llama3.1:latest",
+        "gemini": "gemini-2.0-flash",
+    }
+    return model or os.getenv("OLLAMA_MODEL", default_models[provider])
+
+
+def _endpoint_pool(spec: str | None, provider: str, config: dict):
+    """EndpointPool for a comma-separated --endpoints value, or None when not given."""
+    if not spec:
+        return None
+    if provider == "gemini":
+        print("Error: --endpoints only applies to the ollama and ollama-cloud providers", file=sys.stderr)
+        sys.exit(1)
+    urls = [url.strip() for url in spec.split(",") if url.strip()]
+    pool = build_endpoint_pool(urls, config)
+    healthy = sum(e.healthy for e in pool.endpoints)
+    print(f"Endpoint pool: {healthy}/{len(urls)} endpoint(s) healthy")
+    return pool
+
+
+def _add_provider_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--model", "-m", default=None, help="Model ID (default depends on provider)"
+    )
+    parser.add_argument(
+        "--provider", default="ollama", choices=["ollama", "ollama-cloud", "gemini"],
+        help="Model provider (default: ollama)"
+    )
+    parser.add_argument(
+        "--provider-url", default=None, help="Override provider endpoint URL (only for ollama-cloud)"
+    )
+
+
+def _add_endpoint_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--endpoints", default=None, metavar="URL[,URL...]",
+        help="Comma-separated Ollama servers to balance chunk requests across (default: the provider's single URL)"
+    )
+
+
+def _add_cache_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Disable the per-chunk extraction result cache"
+    )
+    parser.add_argument(
+        "--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Extraction cache directory (default: {DEFAULT_CACHE_DIR})"
+    )
+    parser.add_argument(
+        "--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_MB,
+        help=f"Evict least-recently-used cache entries above this size (default: {DEFAULT_CACHE_MAX_MB})"
+    )
+
+
+def worker_main(argv: list[str]) -> None:
+    """`main.py worker`: extract chunk tasks from a coordinator's work queue until it is drained."""
+    parser = argparse.ArgumentParser(
+        prog="main.py worker",
+        description="Extract chunks from a work queue filled by `main.py PDF --queue PATH`"
+    )
+    parser.add_argument("--queue", "-q", required=True, help="Work queue file shared with the coordinator")
+    _add_endpoint_arg(parser)
+    parser.add_argument(
+        "--concurrency", "-j", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Maximum chunk requests this worker keeps in flight (default: {DEFAULT_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+        help=f"Seconds without a heartbeat before this worker's tasks are handed to others (default: {DEFAULT_LEASE_SECONDS})"
+    )
+    _add_cache_args(parser)
+    parser.add_argument(
+        "--debug", action="store_true", help="Print every model response and failed attempt"
+    )
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.queue):
+        print(f"Error: {args.queue} not found; start the coordinator with --queue first", file=sys.stderr)
+        sys.exit(1)
+    queue = WorkQueue(args.queue)
+    meta = queue.get_meta()
+    if "provider" not in meta:
+        print(f"Error: {args.queue} has no run configuration; start the coordinator with --queue first", file=sys.stderr)
+        sys.exit(1)
+    _check_api_key(meta["provider"])
+    config = build_provider_config(meta["provider"], meta["model"], provider_url=meta["provider_url"])
+    cache = None if args.no_cache else ExtractionCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    print(f"Worker {worker} extracting from {args.queue} with {meta['provider']}/{meta['model']} "
+          f"at {args.endpoints or config.get('model_url', 'the provider API')} "
+          f"(up to {args.concurrency} requests in flight)...")
+    scheduler = ChunkScheduler(
+        concurrency=args.concurrency, endpoints=_endpoint_pool(args.endpoints, meta["provider"], config)
+    )
+    try:
+        work_queue(
+            queue, config, worker, cache=cache, scheduler=scheduler,
+            lease_seconds=args.lease_seconds, debug=args.debug,
+        )
+    finally:
+        scheduler.shutdown()
+        queue.close()
+    print(
+        f"Queue drained: {METRICS.total('queue_tasks', outcome='done'):.0f} task(s) done and "
+        f"{METRICS.total('queue_tasks', outcome='failed'):.0f} failed by this worker, "
+        f"{METRICS.total('queue_requeued'):.0f} taken over from expired leases"
+    )
+    print(scheduler.summary())
+    if cache is not None:
+        print(cache.summary())
+
+
+def retry_main(argv: list[str]) -> None:
+    """`main.py retry-dead-letters`: extract only the chunks an earlier run failed on."""
+    parser = argparse.ArgumentParser(
+        prog="main.py retry-dead-letters",
+        description="Retry the chunks in a dead-letter file, recording recovered ones in the run journal"
+    )
+    parser.add_argument(
+        "--dead-letters", default=os.path.join("data", DEFAULT_DEAD_LETTER_NAME),
+        help=f"Dead-letter file written by the failed run (default: data/{DEFAULT_DEAD_LETTER_NAME})"
+    )
+    parser.add_argument(
+        "--journal", default=None,
+        help=f"Run journal of that run (default: {DEFAULT_JOURNAL_NAME} next to the dead-letter file)"
+    )
+    _add_provider_args(parser)
+    _add_endpoint_arg(parser)
+    parser.add_argument(
+        "--concurrency", "-j", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Maximum chunk requests in flight (default: {DEFAULT_CONCURRENCY})"
+    )
+    _add_cache_args(parser)
+    parser.add_argument(
+        "--debug", action="store_true", help="Print every model response and failed attempt"
+    )
+    args = parser.parse_args(argv)
+
+    dead_letters = DeadLetters(args.dead_letters)
+    if not len(dead_letters):
+        dead_letters.close()
+        print(f"No failed chunks in {args.dead_letters}")
+        return
+    model_id = _model_id(args.provider, args.model)
+    _check_api_key(args.provider)
+    config = build_provider_config(args.provider, model_id, provider_url=args.provider_url)
+    cache = None if args.no_cache else ExtractionCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+    journal_path = args.journal or os.path.join(os.path.dirname(args.dead_letters), DEFAULT_JOURNAL_NAME)
+    journal = RunJournal(journal_path, resume=True)
+    scheduler = ChunkScheduler(
+        concurrency=args.concurrency, endpoints=_endpoint_pool(args.endpoints, args.provider, config)
+    )
+
+    total = len(dead_letters)
+    print(f"Retrying {total} failed chunk(s) from {args.dead_letters} using {args.provider}/{model_id}...")
+    try:
+        recovered = retry_dead_letters(
+            dead_letters, config, cache=cache, scheduler=scheduler, journal=journal, debug=args.debug
+        )
+    finally:
+        scheduler.shutdown()
+        journal.close()
+        dead_letters.close()
+    print(f"Recovered {recovered} of {total} chunk(s) into {journal_path}; {total - recovered} still failing")
+    if recovered:
+        print("Re-run the original command with --resume to rebuild the graph with them")
+    print(scheduler.summary())
+
+
+def _rebuild_layout(graph: dict, previous_path: str, iterations: int | None, seed: int) -> str:
+    """Lay out a rebuilt graph, reusing the layout of the data.json at previous_path.
+
+    With iterations None, an unchanged graph keeps the previous coordinates (or
+    their absence) as they are, and a changed one runs WARM_LAYOUT_ITERATIONS
+    steps warm-started from them. Given iterations, the layout is computed from
+    scratch, exactly as an extraction run with the same options computes it.
+    Returns how the layout was made, for the log.
+    """
+    positions = {}
+    if iterations is None:
+        try:
+            with open(previous_path) as f:
+                previous = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            previous = {"nodes": [], "edges": []}
+        positions = {n["id"]: (n["x"], n["y"]) for n in previous["nodes"] if "x" in n and "y" in n}
+        stripped = [{k: v for k, v in n.items() if k not in ("x", "y")} for n in previous["nodes"]]
+        if previous["nodes"] and stripped == graph["nodes"] and previous["edges"] == graph["edges"]:
+            for node in graph["nodes"]:
+                if node["id"] in positions:
+                    node["x"], node["y"] = positions[node["id"]]
+            return "graph unchanged, kept the existing layout"
+        iterations = WARM_LAYOUT_ITERATIONS if positions else DEFAULT_LAYOUT_ITERATIONS
+    if not iterations:
+        return "left to the browser"
+    from layout import apply_layout
+
+    apply_layout(graph, iterations=iterations, seed=seed, initial=positions)
+    if positions:
+        placed = sum(node["id"] in positions for node in graph["nodes"])
+        return f"{iterations} steps warm-started from {placed} of {len(graph['nodes'])} existing position(s)"
+    return f"{iterations} steps"
+
+
+def rebuild_main(argv: list[str]) -> None:
+    """`main.py rebuild`: rebuild the graph from stored extractions without calling a model."""
+    parser = argparse.ArgumentParser(
+        prog="main.py rebuild",
+        description="Re-run deduplication, graph building and layout over the extractions of an earlier run"
+    )
+    parser.add_argument(
+        "--output", "-o", default="data/data.json", help="Output JSON path (default: data/data.json)"
+    )
+    parser.add_argument(
+        "--extractions", default=None,
+        help=f"Annotation shard directory, or a legacy extraction_results.jsonl (default: {DEFAULT_SHARD_DIR_NAME}/ next to the output)"
+    )
+    parser.add_argument(
+        "--store", default=None,
+        help=f"SQLite graph store to rewrite (default: {DEFAULT_STORE_NAME} next to the output)"
+    )
+    parser.add_argument(
+        "--layout-iterations", type=int, default=None,
+        help=(
+            "Force-directed layout steps precomputed into data.json; 0 leaves layout to the browser "
+            "(default: keep the existing layout if the graph is unchanged, else "
+            f"{WARM_LAYOUT_ITERATIONS} steps warm-started from it, or {DEFAULT_LAYOUT_ITERATIONS} without one)"
+        )
+    )
+    parser.add_argument(
+        "--layout-seed", type=int, default=DEFAULT_LAYOUT_SEED,
+        help=f"Random seed for the precomputed layout (default: {DEFAULT_LAYOUT_SEED})"
+    )
+    args = parser.parse_args(argv)
+
+    output_dir = os.path.dirname(args.output) or "data"
+    source = args.extractions or os.path.join(output_dir, DEFAULT_SHARD_DIR_NAME)
+    wall_start = time.perf_counter()
+    with METRICS.timer("stage_seconds", stage="load"):
+        if os.path.isdir(source):
+            shards = AnnotationShards(source)
+            names = shards.run_books()
+            if names is None:
+                # Shards from before runs recorded their books: take every one
+                names = sorted(name.removesuffix(".jsonl") for name in os.listdir(source) if name.endswith(".jsonl"))
+            book_results = [
+                (name, result["characters"], result["relationships"])
+                for name, result in zip(names, load_stored_extractions(shards, names))
+            ]
+        elif os.path.isfile(source):
+            result = load_legacy_extractions(source)
+            book_results = [(os.path.basename(source), result["characters"], result["relationships"])]
+        else:
+            print(f"Error: No stored extractions at {source}", file=sys.stderr)
+            sys.exit(1)
+    if not book_results:
+        print(f"Error: No stored extractions at {source}", file=sys.stderr)
+        sys.exit(1)
+    all_characters = [c for _, characters, _ in book_results for c in characters]
+    all_relationships = [r for _, _, relationships in book_results for r in relationships]
+    print(
+        f"Loaded {len(all_characters)} characters and {len(all_relationships)} relationships "
+        f"from {len(book_results)} book(s) in {source}"
+    )
+
+    with METRICS.timer("stage_seconds", stage="dedup"):
+        all_characters = deduplicate_characters(all_characters)
+    print(f"Deduplicated to {len(all_characters)} unique characters")
+    with METRICS.timer("stage_seconds", stage="graph"):
+        graph = build_graph_data(all_characters, all_relationships)
+        layout = _rebuild_layout(graph, args.output, args.layout_iterations, args.layout_seed)
+    print(f"Layout: {layout}")
+    with METRICS.timer("stage_seconds", stage="write"):
+        write_graph_json(graph, args.output)
+    store_path = args.store or os.path.join(output_dir, DEFAULT_STORE_NAME)
+    with METRICS.timer("stage_seconds", stage="store"):
+        store = GraphStore(store_path)
+        try:
+            store.replace(graph, build_alias_index(all_characters), book_provenance(book_results, all_characters))
+        finally:
+            store.close()
+    print(f"Wrote graph store to {store_path}")
+    stages = ("load", "dedup", "graph", "write", "store")
+    parts = [f"{stage} {METRICS.total('stage_seconds', stage=stage):.2f}s" for stage in stages]
+    print(f"Rebuilt in {time.perf_counter() - wall_start:.2f}s ({', '.join(parts)})")
+
+
 def main():
     load_dotenv()
 
+    if sys.argv[1:2] == ["worker"]:
+        worker_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["retry-dead-letters"]:
+        retry_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["rebuild"]:
+        rebuild_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description="Extract character relationships from Warhammer 40k PDFs"
     )
@@ -40,82 +427,405 @@ def main():
     parser.add_argument(
         "--output", "-o", default="data/data.json", help="Output JSON path (default: data/data.json)"
     )
+    _add_provider_args(parser)
     parser.add_argument(
-        "--model", "-m", default=None, help="Model ID (default depends on provider)"
-    )
-    parser.add_argument(
-        "--provider", default="ollama", choices=["ollama", "ollama-cloud", "gemini"],
-        help="Model provider (default: ollama)"
+        "--model-cascade", default=None, metavar="MODEL,MODEL[,...]",
+        help="Extract every chunk with the first model and re-run failed, empty or implausible chunks with the next"
     )
     parser.add_argument(
-        "--provider-url", default=None, help="Override provider endpoint URL (only for ollama-cloud)"
+        "--escalate-unresolved", type=float, default=DEFAULT_MAX_UNRESOLVED,
+        help=f"With --model-cascade: escalate a chunk when more than this share of its relationship names match no known character (default: {DEFAULT_MAX_UNRESOLVED})"
     )
+    _add_endpoint_arg(parser)
     parser.add_argument(
         "--demo", action="store_true", help="Demo mode: only process first ~10K chars per book"
     )
     parser.add_argument(
         "--no-viz", action="store_true", help="Skip generating extraction visualization"
     )
+    _add_cache_args(parser)
+    parser.add_argument(
+        "--concurrency", "-j", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Maximum chunk requests in flight across all books (default: {DEFAULT_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--single-pass", action="store_true",
+        help="Extract characters and relationships in one model call per chunk (halves LLM calls)"
+    )
+    parser.add_argument(
+        "--prefilter", action="store_true",
+        help="Skip the relationship model call for chunks that name fewer than two known characters (two-pass only)"
+    )
+    parser.add_argument(
+        "--dramatis-personae", action="store_true",
+        help="Run the character pass only over a book's dramatis personae when it has one"
+    )
+    parser.add_argument(
+        "--compare-passes", action="store_true",
+        help="Report single-pass quality against two-pass on the given PDF(s) instead of writing a graph"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Resume an interrupted run, skipping chunks already recorded in the run journal"
+    )
+    parser.add_argument(
+        "--journal", default=None,
+        help=f"Run journal path (default: {DEFAULT_JOURNAL_NAME} next to the output JSON)"
+    )
+    parser.add_argument(
+        "--dead-letters", default=None,
+        help=f"File of chunks that failed permanently, for `main.py retry-dead-letters` (default: {DEFAULT_DEAD_LETTER_NAME} next to the output JSON)"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Only extract added or changed PDFs and rebuild the graph from stored per-book results"
+    )
+    parser.add_argument(
+        "--corpus-dir", default=DEFAULT_CORPUS_DIR,
+        help=f"Per-book extraction artifacts for --incremental (default: {DEFAULT_CORPUS_DIR})"
+    )
+    parser.add_argument(
+        "--pdf-workers", type=int, default=None,
+        help="Processes used to parse uncached PDFs in parallel (default: CPU count)"
+    )
+    parser.add_argument(
+        "--context-fill", type=float, default=DEFAULT_CONTEXT_FILL,
+        help=f"Fraction of the model context that prompt + examples + chunk may fill (default: {DEFAULT_CONTEXT_FILL})"
+    )
+    parser.add_argument(
+        "--chunk-overlap", type=int, default=0,
+        help="Tokens of trailing sentences repeated at the start of the next chunk (default: 0)"
+    )
+    parser.add_argument(
+        "--layout-iterations", type=int, default=DEFAULT_LAYOUT_ITERATIONS,
+        help=f"Force-directed layout steps precomputed into data.json; 0 leaves layout to the browser (default: {DEFAULT_LAYOUT_ITERATIONS})"
+    )
+    parser.add_argument(
+        "--layout-seed", type=int, default=DEFAULT_LAYOUT_SEED,
+        help=f"Random seed for the precomputed layout (default: {DEFAULT_LAYOUT_SEED})"
+    )
+    parser.add_argument(
+        "--queue", "-q", default=None,
+        help="Share extraction with `main.py worker --queue PATH` processes through this SQLite work queue"
+    )
+    parser.add_argument(
+        "--enqueue-only", action="store_true",
+        help="With --queue: queue the chunk tasks and exit; re-run without it to join in and merge"
+    )
+    parser.add_argument(
+        "--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+        help=f"With --queue: seconds without a heartbeat before a worker's tasks are re-queued (default: {DEFAULT_LEASE_SECONDS})"
+    )
+    parser.add_argument(
+        "--store", default=None,
+        help=f"SQLite graph store queried by server.py (default: {DEFAULT_STORE_NAME} next to the output JSON)"
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Print every model response and failed attempt"
+    )
+    parser.add_argument(
+        "--report", default=None,
+        help="Run report JSON path; a Prometheus textfile is written next to it (default: run_report.json next to the output JSON)"
+    )
+    parser.add_argument(
+        "--profile", default=None, metavar="PATH",
+        help="Profile the run with cProfile, write the stats to PATH and print the top functions"
+    )
     args = parser.parse_args()
 
-    # Provider-specific default models
-    default_models = {
-        "ollama": "llama3.1:latest",
-        "ollama-cloud": "llama3.1:latest",
-        "gemini": "gemini-2.0-flash",
-    }
-    model_id = args.model or os.getenv("OLLAMA_MODEL", default_models[args.provider])
+    if not args.profile:
+        _run(args)
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(_run, args)
+    finally:
+        profiler.dump_stats(args.profile)
+        # Chunk requests run on scheduler threads, which cProfile does not see;
+        # their latency is in the run report instead
+        print(f"\nProfile written to {args.profile}; top functions by cumulative time:")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
 
-    # Validate required env vars per provider
-    if args.provider == "ollama-cloud" and not os.getenv("OLLAMA_API_KEY"):
-        print("Error: OLLAMA_API_KEY env var is required for ollama-cloud provider", file=sys.stderr)
-        sys.exit(1)
-    if args.provider == "gemini" and not os.getenv("GEMINI_API_KEY"):
-        print("Error: GEMINI_API_KEY env var is required for gemini provider", file=sys.stderr)
-        sys.exit(1)
+
+def _run(args) -> None:
+    """Run the extraction pipeline for parsed command-line arguments."""
+    started_at = datetime.now(timezone.utc)
+    wall_start = time.perf_counter()
+
+    model_id = _model_id(args.provider, args.model)
+    cascade = None
+    if args.model_cascade:
+        models = [m.strip() for m in args.model_cascade.split(",") if m.strip()]
+        if len(models) < 2 or args.model:
+            print("Error: --model-cascade takes two or more comma-separated models and replaces --model", file=sys.stderr)
+            sys.exit(1)
+        if args.queue or args.compare_passes:
+            print("Error: --model-cascade is not supported with --queue or --compare-passes", file=sys.stderr)
+            sys.exit(1)
+        # The first model sizes the chunks and names the run in the report
+        model_id = models[0]
+        cascade = ModelCascade(
+            [build_provider_config(args.provider, m, provider_url=args.provider_url) for m in models],
+            max_unresolved=args.escalate_unresolved,
+        )
+
+    _check_api_key(args.provider)
 
     config = build_provider_config(args.provider, model_id, provider_url=args.provider_url)
+    cache = None if args.no_cache else ExtractionCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+    text_cache = None if args.no_cache else ExtractionCache(
+        os.path.join(args.cache_dir, "text"), max_bytes=args.cache_max_mb * 1024 * 1024, name="PDF text cache"
+    )
 
     pdfs = _resolve_pdfs(args.pdf)
-    all_characters = []
-    all_relationships = []
-    all_annotated_docs = []
+    passes = SINGLE_PASS if args.single_pass else TWO_PASS
+    if args.prefilter and args.single_pass:
+        print("Error: --prefilter needs the character pass of two-pass mode", file=sys.stderr)
+        sys.exit(1)
+    if args.prefilter and args.queue:
+        print("Error: --prefilter is not supported with --queue, which queues both passes up front", file=sys.stderr)
+        sys.exit(1)
+    # Options that change what is extracted; only added when set, so existing
+    # corpora and queues keep their fingerprints
+    fingerprint_extra = [args.demo, args.context_fill, args.chunk_overlap]
+    fingerprint_extra += [flag for flag in ("prefilter", "dramatis_personae") if getattr(args, flag)]
+    if cascade is not None:
+        fingerprint_extra += [cascade.models, cascade.max_unresolved]
+    books = []
+    failed_books = {}
+
+    corpus = None
+    if args.incremental:
+        corpus = CorpusStore(args.corpus_dir)
+        fingerprint = extraction_fingerprint(config, passes, *fingerprint_extra)
+        hashes = {os.path.basename(p): file_sha256(p) for p in pdfs if os.path.exists(p)}
+        plan = corpus.plan(hashes, fingerprint, prune=os.path.isdir(args.pdf))
+        print(
+            f"Incremental: {len(plan['added'])} added, {len(plan['changed'])} changed, "
+            f"{len(plan['unchanged'])} unchanged, {len(plan['removed'])} removed"
+        )
+        for book_name in plan["removed"]:
+            corpus.remove_book(book_name)
+        pdfs = [p for p in pdfs if os.path.basename(p) not in plan["unchanged"]]
 
-    for i, pdf_path in enumerate(pdfs, 1):
+    page_starts = []
+    with METRICS.timer("stage_seconds", stage="pdf_text"):
+        texts = load_pdf_texts(pdfs, text_cache=text_cache, workers=args.pdf_workers)
+    for i, (pdf_path, loaded) in enumerate(zip(pdfs, texts), 1):
         book_name = os.path.basename(pdf_path)
         print(f"\nProcessing book {i}/{len(pdfs)}: {book_name}")
 
-        text = extract_text_from_pdf(pdf_path)
+        if isinstance(loaded, PDFReadError):
+            print(f"  Error: {loaded} (skipping)", file=sys.stderr)
+            failed_books[book_name] = str(loaded)
+            continue
+        text, starts = loaded
         if args.demo:
             text = text[:10000]
             print(f"  Demo mode: using first {len(text)} characters")
         else:
-            print(f"  Extracted {len(text)} characters of text")
-
-        print(f"  Extracting characters using {args.provider}/{model_id}...")
-        characters, char_docs = extract_characters(text, config)
-        print(f"  Found {len(characters)} characters")
-        all_characters.extend(characters)
-        all_annotated_docs.extend(char_docs)
-
-        print(f"  Extracting relationships using {args.provider}/{model_id}...")
-        relationships, rel_docs = extract_relationships(text, config)
-        print(f"  Found {len(relationships)} relationships")
-        all_relationships.extend(relationships)
-        all_annotated_docs.extend(rel_docs)
-
-    print(f"\nDeduplicating {len(all_characters)} characters across {len(pdfs)} book(s)...")
-    all_characters = deduplicate_characters(all_characters)
+            print(f"  Extracted {len(text)} characters of text from {len(starts)} pages")
+        books.append((book_name, text))
+        page_starts.append(starts)
+
+    if not books and not (corpus and corpus.manifest):
+        print("Error: No readable PDFs to process", file=sys.stderr)
+        sys.exit(1)
+
+    scheduler = ChunkScheduler(
+        concurrency=args.concurrency, endpoints=_endpoint_pool(args.endpoints, args.provider, config)
+    )
+    if args.compare_passes:
+        try:
+            report = compare_pass_modes(
+                books, config, cache=cache, scheduler=scheduler, context_fill=args.context_fill
+            )
+        finally:
+            scheduler.shutdown()
+        _print_pass_comparison(report)
+        return
+
+    output_dir = os.path.dirname(args.output) or "data"
+    queue = None
+    if args.queue and books:
+        queue = WorkQueue(args.queue)
+        try:
+            queue.set_meta({
+                "fingerprint": extraction_fingerprint(config, passes, *fingerprint_extra),
+                "provider": args.provider,
+                "model": model_id,
+                "provider_url": args.provider_url,
+            })
+        except QueueConfigError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        queued = enqueue_extraction(
+            queue, books, config, passes=passes, context_fill=args.context_fill, overlap_tokens=args.chunk_overlap,
+            dramatis_personae=args.dramatis_personae,
+        )
+        counts = queue.counts([task_id for task_id, *_ in queued])
+        print(f"\nQueued {len(queued)} chunk task(s) in {args.queue} ({counts['done']} already done)")
+        if args.enqueue_only:
+            scheduler.shutdown()
+            queue.close()
+            print(f"Start workers with `main.py worker --queue {args.queue}`, then re-run this command without --enqueue-only to merge")
+            return
+
+    journal = RunJournal(args.journal or os.path.join(output_dir, DEFAULT_JOURNAL_NAME), resume=args.resume)
+    for book_name, error in failed_books.items():
+        journal.record_failed_book(book_name, error)
+    shards = AnnotationShards(os.path.join(output_dir, DEFAULT_SHARD_DIR_NAME))
+    for (book_name, _), starts in zip(books, page_starts):
+        shards.reset(book_name)
+        shards.write_pages(book_name, starts)
+    if corpus is not None:
+        for book_name in plan["removed"]:
+            shards.remove(book_name)
+    dead_letters = DeadLetters(args.dead_letters or os.path.join(output_dir, DEFAULT_DEAD_LETTER_NAME))
+    if queue is None:
+        # Every chunk of these books is attempted again, so their old failures no longer apply
+        dead_letters.discard_books([book_name for book_name, _ in books])
+
+    known_characters = []
+    if (args.prefilter or cascade is not None) and corpus is not None:
+        # Relationships may name characters found in the unchanged books
+        extracting = {book_name for book_name, _ in books}
+        known_characters = [
+            c for artifact in corpus.load_books() if artifact["book"] not in extracting for c in artifact["characters"]
+        ]
+
+    mode = "single-pass" if args.single_pass else "two-pass"
+    if books:
+        models = " -> ".join(cascade.models) if cascade is not None else model_id
+        print(f"\nExtracting characters and relationships using {args.provider}/{models} "
+              f"({mode}, up to {args.concurrency} requests in flight{', alongside queue workers' if queue else ''})...")
+    try:
+        with METRICS.timer("stage_seconds", stage="extract"):
+            if queue is not None:
+                # The coordinator works the queue like any worker, then merges
+                # once every task is done or failed
+                work_queue(
+                    queue, config, f"{socket.gethostname()}:{os.getpid()}", cache=cache, scheduler=scheduler,
+                    lease_seconds=args.lease_seconds, debug=args.debug,
+                )
+                results = collect_queue_results(queue, books, queued, page_starts=page_starts, shards=shards)
+            else:
+                results = run_extraction(
+                    books, config, passes=passes, cache=cache, scheduler=scheduler, journal=journal,
+                    page_starts=page_starts, context_fill=args.context_fill, overlap_tokens=args.chunk_overlap,
+                    debug=args.debug, shards=shards, prefilter=args.prefilter, known_characters=known_characters,
+                    dramatis_personae=args.dramatis_personae, dead_letters=dead_letters, cascade=cascade,
+                ) if books else []
+    finally:
+        scheduler.shutdown()
+        journal.close()
+        dead_letters.close()
+
+    all_characters = []
+    all_relationships = []
+    book_results = []
+    for (book_name, _), result in zip(books, results):
+        print(f"  {book_name}: {len(result['characters'])} characters, {len(result['relationships'])} relationships")
+        book_results.append((book_name, result["characters"], result["relationships"]))
+        all_characters.extend(result["characters"])
+        all_relationships.extend(result["relationships"])
+        if corpus is not None:
+            # A book with failed chunks is extracted again by the next incremental
+            # run, which picks up chunks recovered by retry-dead-letters
+            corpus.save_book(
+                book_name, hashes[book_name], fingerprint, result["characters"], result["relationships"],
+                complete=not result["failed_chunks"],
+            )
+
+    if corpus is not None:
+        # Rebuild from every stored book, not just the ones extracted this run
+        stored = corpus.load_books()
+        book_results = [(a["book"], a["characters"], a["relationships"]) for a in stored]
+        all_characters = [c for artifact in stored for c in artifact["characters"]]
+        all_relationships = [r for artifact in stored for r in artifact["relationships"]]
+        print(f"  Loaded stored results for {len(stored)} book(s) from {args.corpus_dir}")
+
+    # Shards of books left out of this run stay on disk; rebuild reads only these
+    shards.write_run_books([name for name, _, _ in book_results])
+
+    print(f"\nDeduplicating {len(all_characters)} characters across {len(stored) if corpus else len(books)} book(s)...")
+    with METRICS.timer("stage_seconds", stage="dedup"):
+        all_characters = deduplicate_characters(all_characters)
     print(f"Deduplicated to {len(all_characters)} unique characters")
 
-    graph = build_graph_data(all_characters, all_relationships)
-    write_graph_json(graph, args.output)
+    with METRICS.timer("stage_seconds", stage="graph"):
+        graph = build_graph_data(
+            all_characters, all_relationships, layout_iterations=args.layout_iterations, layout_seed=args.layout_seed
+        )
+    with METRICS.timer("stage_seconds", stage="write"):
+        write_graph_json(graph, args.output)
+    store_path = args.store or os.path.join(output_dir, DEFAULT_STORE_NAME)
+    with METRICS.timer("stage_seconds", stage="store"):
+        store = GraphStore(store_path)
+        try:
+            store.replace(graph, build_alias_index(all_characters), book_provenance(book_results, all_characters))
+        finally:
+            store.close()
+    print(f"Wrote graph store to {store_path}")
+
+    if not args.no_viz:
+        with METRICS.timer("stage_seconds", stage="visualize"):
+            save_visualization(shards, [name for name, _, _ in book_results], output_dir=output_dir)
+
+    print(scheduler.summary())
+    if args.prefilter:
+        print(
+            f"Prefilter: skipped {METRICS.total('chunks_prefiltered'):.0f} of "
+            f"{METRICS.total('chunks', extraction_pass='relationships'):.0f} relationship chunk(s)"
+        )
+    if cascade is not None:
+        print(cascade.summary())
+    if queue is not None:
+        counts = queue.counts([task_id for task_id, *_ in queued])
+        print(
+            f"Work queue: {counts['done']} task(s) done, {counts['failed']} failed, "
+            f"{queue.requeued()} re-queued after an expired lease"
+        )
+        if counts["failed"]:
+            print("  Re-run the same command to retry the failed tasks")
+        queue.close()
+    if journal.resumed_chunks:
+        print(f"Resumed {journal.resumed_chunks} chunk(s) from {journal.path}")
+    for book_name, error in journal.failed_books.items():
+        print(f"Failed: {book_name}: {error}")
+    if len(dead_letters):
+        print(
+            f"Failed chunks: {len(dead_letters)} left out of the graph and saved to {dead_letters.path}; "
+            f"retry them with `main.py retry-dead-letters --dead-letters {dead_letters.path}`, then re-run with --resume"
+        )
+    if cache is not None:
+        print(cache.summary())
+        print(text_cache.summary())
 
-    if not args.no_viz and all_annotated_docs:
-        output_dir = os.path.dirname(args.output) or "data"
-        save_visualization(all_annotated_docs, output_dir=output_dir)
+    report_path = args.report or os.path.join(output_dir, "run_report.json")
+    prom_path = METRICS.write_report(report_path, {
+        "started_at": started_at.isoformat(),
+        "wall_seconds": time.perf_counter() - wall_start,
+        "provider": args.provider,
+        "model": model_id,
+        "passes": list(passes),
+        "books": [name for name, _ in books],
+        "failed_books": journal.failed_books,
+        "failed_chunks": len(dead_letters),
+        "characters": len(graph["nodes"]),
+        "relationships": len(graph["edges"]),
+        "cache": None if cache is None else {"hits": cache.hits, "misses": cache.misses, "evictions": cache.evictions},
+        "concurrency": {"final_limit": scheduler.limiter.limit, "backoffs": scheduler.limiter.backoffs},
+        "endpoints": None if scheduler.endpoints is None else scheduler.endpoints.stats(),
+        "cascade": None if cascade is None else cascade.stats(),
+    })
+    print(f"Wrote run report to {report_path} and {prom_path}")
+    _print_stage_times()
 
-    print("Done! Open index.html to view the graph and data/visualization.html for extraction details.")
+    done = "Done! Open index.html to view the graph (or run server.py to browse it in subgraphs)"
+    if not args.no_viz:
+        done += f" and {os.path.join(output_dir, 'visualization.html')} for extraction details"
+    print(f"{done}.")
 
 
 if __name__ == "__main__":
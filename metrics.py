@@ -0,0 +1,139 @@
+"""In-process run metrics: counters and timing/size summaries, exported as a
+JSON run report and a Prometheus textfile."""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PROMETHEUS_PREFIX = "lore_graph_"
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape_label(value) -> str:
+    """A label value escaped for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Thread-safe registry of counters and observed values.
+
+    Counters only go up. Each observed series keeps its count, sum, min and
+    max, which is enough for averages without storing every sample.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._summaries: dict[tuple, dict] = {}
+
+    def incr(self, name: str, amount: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            s = self._summaries.get(key)
+            if s is None:
+                self._summaries[key] = {"count": 1, "sum": value, "min": value, "max": value}
+            else:
+                s["count"] += 1
+                s["sum"] += value
+                s["min"] = min(s["min"], value)
+                s["max"] = max(s["max"], value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the wall time of the block, in seconds, under name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def total(self, name: str, **labels) -> float:
+        """Sum of a counter or observed series, 0 if never recorded."""
+        key = _key(name, labels)
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            return self._summaries.get(key, {}).get("sum", 0)
+
+    def count(self, name: str, **labels) -> int:
+        """Number of values observed in a series, 0 if never recorded."""
+        with self._lock:
+            return self._summaries.get(_key(name, labels), {}).get("count", 0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+    def snapshot(self) -> dict:
+        """Plain-dict copy of every series, for the JSON run report."""
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "summaries": [
+                    {"name": name, "labels": dict(labels), **s}
+                    for (name, labels), s in sorted(self._summaries.items())
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """Render every series in the Prometheus text exposition format.
+
+        Counters become `<name>_total` counters. An observed series becomes a
+        `<name>` summary (its `_sum` and `_count`, no quantiles) plus a separate
+        `<name>_max` gauge family.
+        """
+        snap = self.snapshot()
+        families: dict[str, tuple[str, list[str]]] = {}
+
+        def emit(family, kind, sample, labels, value):
+            label_str = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+            lines = families.setdefault(family, (kind, []))[1]
+            lines.append(f"{sample}{{{label_str}}} {value}" if label_str else f"{sample} {value}")
+
+        for c in snap["counters"]:
+            name = f"{PROMETHEUS_PREFIX}{c['name']}_total"
+            emit(name, "counter", name, c["labels"], c["value"])
+        for s in snap["summaries"]:
+            base = f"{PROMETHEUS_PREFIX}{s['name']}"
+            emit(base, "summary", f"{base}_sum", s["labels"], s["sum"])
+            emit(base, "summary", f"{base}_count", s["labels"], s["count"])
+            emit(f"{base}_max", "gauge", f"{base}_max", s["labels"], s["max"])
+        # Every sample of a family must follow its TYPE line without interruption
+        out = []
+        for family, (kind, lines) in families.items():
+            out.append(f"# TYPE {family} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+    def write_report(self, path: str, run_info: dict) -> str:
+        """Write the JSON run report to path and a Prometheus textfile next to it.
+
+        Returns the textfile's path.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({**run_info, "metrics": self.snapshot()}, f, indent=2)
+        prom_path = f"{os.path.splitext(path)[0]}.prom"
+        # Write then rename so a node_exporter scrape never sees a partial file
+        with open(f"{prom_path}.tmp", "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(f"{prom_path}.tmp", prom_path)
+        return prom_path
+
+
+# Process-wide registry the pipeline records into
+METRICS = Metrics()
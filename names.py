@@ -0,0 +1,6 @@
+"""Normalisation of character names, shared by extraction, the prefilter and the graph store."""
+
+
+def name_key(name: str) -> str:
+    """Case-folded, single-spaced form of a name, under which aliases are indexed and looked up."""
+    return " ".join(name.casefold().split())
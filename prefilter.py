@@ -0,0 +1,132 @@
+"""Cheap local checks that decide which chunks are worth a model call."""
+
+import re
+from collections import deque
+
+from names import name_key
+
+# A relationship needs two characters; chunks naming fewer are not sent
+MIN_RELATIONSHIP_NAMES = 2
+# Longest dramatis personae section used in place of a book for the character pass
+DRAMATIS_MAX_CHARS = 20000
+
+_DRAMATIS_RE = re.compile(r"dramatis\s+personae", re.I)
+# First heading after the dramatis personae that starts the story proper
+_STORY_START_RE = re.compile(
+    r"^[ \t]*(?:(?:prologue|part\s+\w+|chapter\s+\w+|book\s+\w+)\b[^\n]{0,60}|one|i)[ \t]*$", re.I | re.M
+)
+# Two or more capitalised words in a row, e.g. "Garviel Loken", "Lord Commander Dorn"
+_CAPITALIZED_SPAN_RE = re.compile(r"[A-Z][\w'’-]*(?:[ \t]+[A-Z][\w'’-]*)+")
+_SENTENCE_BREAKS = frozenset(".!?:\"“”\n")
+
+
+def _starts_sentence(text: str, pos: int) -> bool:
+    i = pos - 1
+    while i >= 0 and text[i] in " \t":
+        i -= 1
+    return i < 0 or text[i] in _SENTENCE_BREAKS
+
+
+class NameAutomaton:
+    """Aho-Corasick automaton over casefolded names.
+
+    labels() finds every name that occurs in a text as whole words in a single
+    pass over the text, however many names there are.
+    """
+
+    def __init__(self, names: dict[str, str]):
+        # names maps a casefolded, single-spaced pattern to the label it reports
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        self._out: list[list[tuple[int, str]]] = [[]]
+        for pattern, label in names.items():
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._out[state].append((len(pattern), label))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def labels(self, text: str) -> set[str]:
+        """Labels of every pattern found in text as whole words."""
+        text = name_key(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state] and (i == last or not text[i + 1].isalnum()):
+                for length, label in out[state]:
+                    start = i - length + 1
+                    if start == 0 or not text[start - 1].isalnum():
+                        found.add(label)
+        return found
+
+
+class RelationshipPrefilter:
+    """Decides whether a chunk can yield a relationship between two characters.
+
+    aliases maps every casefolded way of naming a character to its node ID
+    (build_alias_index() over the characters found so far). Spans of two or
+    more capitalised words that match no known character count as candidate
+    names too, so a character the character pass missed still lets a chunk
+    through.
+    """
+
+    def __init__(self, aliases: dict[str, str], min_names: int = MIN_RELATIONSHIP_NAMES):
+        self.min_names = min_names
+        self._known = NameAutomaton(aliases)
+
+    def candidates(self, chunk: str) -> set[str]:
+        """Node IDs of known characters plus unknown capitalised spans named in chunk."""
+        names = self._known.labels(chunk)
+        for match in _CAPITALIZED_SPAN_RE.finditer(chunk):
+            words = match.group().split()
+            # The first word of a sentence is capitalised anyway
+            if _starts_sentence(chunk, match.start()):
+                words = words[1:]
+            if len(words) < 2:
+                continue
+            span = " ".join(words)
+            if not self._known.labels(span):
+                names.add("?" + span.casefold())
+        return names
+
+    def worth_extracting(self, chunk: str) -> bool:
+        return len(self.candidates(chunk)) >= self.min_names
+
+
+def find_dramatis_personae(text: str) -> tuple[int, int] | None:
+    """(start, end) of a book's dramatis personae section, or None if it has none.
+
+    The section runs from its heading to the first heading that starts the
+    story (prologue, part, chapter, "One") or DRAMATIS_MAX_CHARS, whichever
+    comes first.
+    """
+    match = _DRAMATIS_RE.search(text)
+    if match is None:
+        return None
+    limit = min(len(text), match.start() + DRAMATIS_MAX_CHARS)
+    story = _STORY_START_RE.search(text, match.end(), limit)
+    return match.start(), story.start() if story else limit
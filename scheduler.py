@@ -0,0 +1,141 @@
+"""Concurrent chunk scheduling with adaptive, backpressure-aware concurrency."""
+
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+DEFAULT_CONCURRENCY = 4
+
+# Error classes, matched against provider error messages in this order
+_ERROR_KINDS = (
+    ("overflow", re.compile(r"exceeded max context length|prompt too long|context (?:length|window)")),
+    ("rate_limit", re.compile(r"\b429\b|too many requests|rate limit|resource.exhausted|quota")),
+    ("timeout", re.compile(r"timed out|timeout")),
+    ("unavailable", re.compile(r"\b50[0234]\b|overloaded|unavailable|connection")),
+    ("parse", re.compile(r"pars(?:e|ing)|json|yaml|decode")),
+)
+ERROR_KINDS = tuple(kind for kind, _ in _ERROR_KINDS) + ("other",)
+# Error classes worth waiting out: the same request may succeed later. They
+# also mean the backend is saturated, so they shrink the AdaptiveLimiter.
+TRANSIENT_ERRORS = frozenset({"rate_limit", "timeout", "unavailable"})
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+# Pool threads per limiter slot. A chunk backing off sleeps on its thread
+# without holding a slot, and the spare threads let other chunks use the slot.
+THREADS_PER_SLOT = 2
+
+
+def classify_error(error: Exception) -> str:
+    """Class of a failed model request: overflow, rate_limit, timeout,
+    unavailable, parse or other."""
+    message = str(error).lower()
+    for kind, pattern in _ERROR_KINDS:
+        if pattern.search(message):
+            return kind
+    return "other"
+
+
+def backoff_delay(attempt: int) -> float:
+    """Seconds to wait before retry number attempt (1-based) of a transient error.
+
+    Exponential with full jitter, so requests that failed together do not all
+    come back at the same moment.
+    """
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+
+
+class AdaptiveLimiter:
+    """Caps the number of in-flight model requests.
+
+    The limit is halved on backpressure (TRANSIENT_ERRORS) and grows back by one
+    after a streak of successful requests, never exceeding max_limit.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, increase_after: int = 4):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = self.max_limit
+        self.increase_after = increase_after
+        self.backoffs = 0
+        self._in_flight = 0
+        self._streak = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Hold one request slot for the duration of the block."""
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._streak += 1
+            if self._streak >= self.increase_after and self.limit < self.max_limit:
+                self.limit += 1
+                self._streak = 0
+                self._cond.notify_all()
+
+    def on_backpressure(self) -> None:
+        with self._cond:
+            self._streak = 0
+            new_limit = max(self.min_limit, self.limit // 2)
+            if new_limit < self.limit:
+                self.limit = new_limit
+                self.backoffs += 1
+
+
+class ChunkScheduler:
+    """Runs chunk requests on a thread pool gated by an AdaptiveLimiter.
+
+    The pool has THREADS_PER_SLOT threads per slot, so chunks waiting out a
+    backoff do not leave slots idle; the limiter alone caps requests in flight.
+
+    endpoints, an EndpointPool, spreads those requests over several model
+    servers; the scheduler closes it on shutdown.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, endpoints=None):
+        self.concurrency = max(1, concurrency)
+        self.limiter = AdaptiveLimiter(self.concurrency)
+        self.endpoints = endpoints
+        self.threads = self.concurrency * THREADS_PER_SLOT
+        self._executor = ThreadPoolExecutor(max_workers=self.threads)
+
+    def map(self, fn, items: list, on_done=None) -> list:
+        """Apply fn to every item concurrently and return results in input order.
+
+        on_done(index, result), if given, is called from the calling thread as
+        each item finishes, in completion order.
+        """
+        futures = {self._executor.submit(fn, item): i for i, item in enumerate(items)}
+        results = [None] * len(items)
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            if on_done is not None:
+                on_done(i, results[i])
+        return results
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+        if self.endpoints is not None:
+            self.endpoints.close()
+
+    def summary(self) -> str:
+        """Human-readable concurrency line for the end-of-run report."""
+        line = f"Concurrency: {self.limiter.limit}/{self.concurrency} slots at end of run"
+        if self.limiter.backoffs:
+            line += f", backed off {self.limiter.backoffs} time(s)"
+        if self.endpoints is not None:
+            line += "\n" + self.endpoints.summary()
+        return line
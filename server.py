@@ -0,0 +1,132 @@
+"""Local HTTP server for the viewer: static files plus subgraph queries against the graph store.
+
+    uv run server.py            # then open http://localhost:8000/
+
+Static files: index.html, data/data.json and data/visualization*; nothing
+else under the project root is served.
+
+Endpoints (all GET, JSON; limit is clamped to 1..DEFAULT_QUERY_LIMIT):
+    /api/summary                          graph size, factions and books
+    /api/top?limit=N                      the N most connected characters
+    /api/neighborhood?id=ID&hops=K        characters within K relationships of ID
+    /api/faction?name=NAME                characters of one faction
+    /api/book?name=NAME                   characters mentioned in one book
+    /api/search?q=TEXT                    characters whose name or alias contains TEXT
+"""
+
+import argparse
+import json
+import os
+import posixpath
+import re
+import sys
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from graphstore import DEFAULT_QUERY_LIMIT, DEFAULT_STORE_NAME, GraphStore
+
+
+# The only files served from the project root: the viewer, its graph and the
+# extraction details. Everything else (.env, .git, caches, journals) is not.
+_STATIC_FILES = frozenset({"/index.html", "/data/data.json", "/data/visualization.html"})
+_VIZ_PAGE_RE = re.compile(r"/data/visualization/[\w-][\w.-]*\.html")
+
+
+def static_path(request_path: str) -> str | None:
+    """The allowlisted file a request path names, or None if it names no such file.
+
+    The path is unquoted and normalised the way SimpleHTTPRequestHandler
+    does before checking, so %2e and .. tricks cannot reach other files.
+    """
+    path = posixpath.normpath(unquote(request_path, errors="surrogatepass"))
+    if path == "/":
+        return "/index.html"
+    if path in _STATIC_FILES or _VIZ_PAGE_RE.fullmatch(path):
+        return path
+    return None
+
+
+def _handler(store: GraphStore):
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if not url.path.startswith("/api/"):
+                return super().do_GET()
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                # LIMIT -1 would mean no limit to SQLite: never return more than a page
+                limit = min(max(int(params.get("limit", DEFAULT_QUERY_LIMIT)), 1), DEFAULT_QUERY_LIMIT)
+                match url.path:
+                    case "/api/summary":
+                        payload = store.summary()
+                    case "/api/top":
+                        payload = store.top(limit)
+                    case "/api/neighborhood":
+                        payload = store.neighborhood(params["id"], int(params.get("hops", 1)), limit)
+                    case "/api/faction":
+                        payload = store.faction(params["name"], limit)
+                    case "/api/book":
+                        payload = store.book(params["name"], limit)
+                    case "/api/search":
+                        payload = {"matches": store.search(params.get("q", ""), min(limit, 50))}
+                    case _:
+                        return self._reply(404, {"error": f"Unknown endpoint {url.path}"})
+            except (KeyError, ValueError) as e:
+                return self._reply(400, {"error": f"Bad query parameter: {e}"})
+            self._reply(200, payload)
+
+        def send_head(self):
+            # Shared by GET and HEAD: serve the canonical allowlisted path, never the raw one
+            path = static_path(urlparse(self.path).path)
+            if path is None:
+                self.send_error(404)
+                return None
+            self.path = path
+            return super().send_head()
+
+        def _reply(self, status: int, payload: dict):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the graph viewer with on-demand subgraph queries")
+    parser.add_argument(
+        "--store", default=os.path.join("data", DEFAULT_STORE_NAME),
+        help=f"Graph store written by main.py (default: data/{DEFAULT_STORE_NAME})"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", "-p", type=int, default=8000, help="Port to listen on (default: 8000)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.store):
+        print(f"Error: {args.store} not found; run main.py first to build the graph store", file=sys.stderr)
+        sys.exit(1)
+    store = GraphStore(args.store)
+    root = os.path.dirname(os.path.abspath(__file__))
+    server = ThreadingHTTPServer((args.host, args.port), partial(_handler(store), directory=root))
+    server.daemon_threads = True
+    summary = store.summary()
+    print(f"Serving {summary['nodes']} characters and {summary['edges']} relationships from {args.store}")
+    print(f"Open http://{args.host}:{args.port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
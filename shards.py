@@ -0,0 +1,123 @@
+"""Per-book JSONL shards of annotated documents, written as chunks complete."""
+
+import json
+import os
+import threading
+from collections.abc import Iterator
+
+DEFAULT_SHARD_DIR_NAME = "extractions"
+# Names of the books the last run's graph was built from
+RUN_BOOKS_NAME = "books.json"
+
+
+class AnnotationShards:
+    """One JSONL file per book under shard_dir, each line one chunk's annotated
+    document together with the pass, chunk index and offset it came from.
+
+    Lines are appended in completion order, so nothing is held in memory
+    between chunks; readers sort by (pass, chunk) themselves. The book's page
+    offsets are kept next to its shard in <book>.pages.json, so extractions
+    read back later can still be traced to their pages. Shards of books an
+    earlier run extracted stay on disk; RUN_BOOKS_NAME lists the ones that
+    belong to the last run's graph.
+    """
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = shard_dir
+        self._lock = threading.Lock()
+        os.makedirs(shard_dir, exist_ok=True)
+
+    def path(self, book: str) -> str:
+        return os.path.join(self.shard_dir, f"{book}.jsonl")
+
+    def pages_path(self, book: str) -> str:
+        return os.path.join(self.shard_dir, f"{book}.pages.json")
+
+    def reset(self, book: str) -> None:
+        """Empty a book's shard before it is extracted again."""
+        with self._lock:
+            open(self.path(book), "w").close()
+
+    def remove(self, book: str) -> None:
+        with self._lock:
+            for path in (self.path(book), self.pages_path(book)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def write_pages(self, book: str, page_starts: list[int]) -> None:
+        """Save a book's page offsets, as extract_pdf_pages() returns them."""
+        with self._lock:
+            with open(self.pages_path(book), "w") as f:
+                json.dump(page_starts, f)
+
+    def page_starts(self, book: str) -> list[int] | None:
+        """A book's saved page offsets, or None if none were saved."""
+        try:
+            with open(self.pages_path(book)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def write_run_books(self, books: list[str]) -> None:
+        """Record the books whose shards make up the current graph."""
+        path = os.path.join(self.shard_dir, RUN_BOOKS_NAME)
+        with self._lock:
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(books, f, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+
+    def run_books(self) -> list[str] | None:
+        """The books write_run_books() last recorded, or None if it never ran."""
+        try:
+            with open(os.path.join(self.shard_dir, RUN_BOOKS_NAME)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def write(self, book: str, pass_name: str, chunk: int, offset: int, document: dict) -> None:
+        """Append one chunk's annotated document (as annotated_document_to_dict) to the book's shard."""
+        line = json.dumps(
+            {"book": book, "pass": pass_name, "chunk": chunk, "offset": offset, "document": document},
+            ensure_ascii=False,
+        )
+        with self._lock:
+            with open(self.path(book), "a") as f:
+                f.write(line + "\n")
+
+    def index(self, book: str) -> list[tuple[str, int, int]]:
+        """(pass, chunk, file offset) of every record in a book's shard, sorted by pass and chunk.
+
+        Only the small index is kept in memory; records are read one at a time
+        with read_at().
+        """
+        entries = []
+        try:
+            with open(self.path(book), "rb") as f:
+                while True:
+                    position = f.tell()
+                    line = f.readline()
+                    if not line:
+                        break
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run killed mid-write leaves a truncated last line
+                        continue
+                    entries.append((record["pass"], record["chunk"], position))
+        except FileNotFoundError:
+            return []
+        entries.sort()
+        return entries
+
+    def read_at(self, book: str, positions: list[int]) -> Iterator[dict]:
+        """Yield the records starting at the given file offsets, in that order."""
+        with open(self.path(book), "rb") as f:
+            for position in positions:
+                f.seek(position)
+                yield json.loads(f.readline())
+
+    def records(self, book: str) -> Iterator[dict]:
+        """Yield every record of a book's shard in (pass, chunk) order."""
+        yield from self.read_at(book, [position for _, _, position in self.index(book)])
@@ -26,10 +26,11 @@ print("---\n")
 print(f"Using Ollama model: {model_id} at {model_url}")
 print("Extracting characters (1 pass for speed)...")
 import langextract as lx
-from extract import CHARACTER_PROMPT, CHARACTER_EXAMPLES, _build_config
+from extract import CHARACTER_PROMPT, CHARACTER_EXAMPLES, build_provider_config
 
 # Use 1 pass instead of 3 for quick test
-config = _build_config(model_id, model_url)
+config = build_provider_config("ollama", model_id)
+config["model_url"] = model_url
 result = lx.extract(
     text_or_documents=sample,
     prompt_description=CHARACTER_PROMPT,
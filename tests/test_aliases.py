@@ -0,0 +1,57 @@
+from extract import _resolve_name, build_alias_index, build_graph_data
+
+
+def character(name):
+    return {"name": name, "faction": "Unknown", "role": "Unknown", "description": ""}
+
+
+ALIASES = build_alias_index([
+    character("Garviel Loken"),
+    character("Tarik Torgaddon"),
+    character("Horus Lupercal"),
+    character("Horus Aximand"),
+])
+
+
+def test_full_names_resolve_regardless_of_case_and_spacing():
+    assert _resolve_name("Garviel Loken", ALIASES) == "garviel-loken"
+    assert _resolve_name("  garviel   LOKEN ", ALIASES) == "garviel-loken"
+
+
+def test_titles_are_stripped():
+    assert _resolve_name("Captain Garviel Loken", ALIASES) == "garviel-loken"
+
+
+def test_unique_name_tokens_resolve():
+    assert _resolve_name("Loken", ALIASES) == "garviel-loken"
+    assert _resolve_name("Torgaddon", ALIASES) == "tarik-torgaddon"
+    assert _resolve_name("Lupercal", ALIASES) == "horus-lupercal"
+
+
+def test_shared_name_tokens_are_ambiguous():
+    assert _resolve_name("Horus", ALIASES) is None
+    assert _resolve_name("Warmaster Horus", ALIASES) is None
+
+
+def test_unknown_names_do_not_resolve():
+    assert _resolve_name("Sejanus", ALIASES) is None
+
+
+def test_full_name_beats_a_shared_token():
+    aliases = build_alias_index([character("Horus"), character("Horus Aximand")])
+    assert _resolve_name("Horus", aliases) == "horus"
+    assert _resolve_name("Aximand", aliases) == "horus-aximand"
+
+
+def test_relationships_aggregate_into_weighted_edges():
+    characters = [character("Garviel Loken"), character("Tarik Torgaddon")]
+    relationships = [
+        {"source_character": source, "target_character": "Torgaddon", "type": "ally", "description": description}
+        for source, description in [("Loken", "brothers"), ("Captain Loken", "brothers"), ("Garviel", "friends")]
+    ]
+    relationships.append({"source_character": "Sejanus", "target_character": "Loken", "type": "ally", "description": ""})
+    graph = build_graph_data(characters, relationships)
+    assert graph["edges"] == [{
+        "source": "garviel-loken", "target": "tarik-torgaddon", "type": "ally", "weight": 3,
+        "descriptions": ["brothers", "friends"],
+    }]
@@ -0,0 +1,78 @@
+import copy
+import os
+
+from cache import ExtractionCache, make_key
+from extract import _cache_key, build_provider_config
+
+
+def entry_size(tmp_path):
+    probe = ExtractionCache(str(tmp_path / "probe"))
+    probe.put(make_key("probe"), {"value": "x" * 100})
+    return probe._total
+
+
+def test_evicts_least_recently_used(tmp_path):
+    size = entry_size(tmp_path)
+    cache = ExtractionCache(str(tmp_path / "cache"), max_bytes=3 * size)
+    keys = [make_key(i) for i in range(4)]
+    for key in keys[:3]:
+        cache.put(key, {"value": "x" * 100})
+    # Using the oldest entry makes the second one least recently used
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[3], {"value": "x" * 100})
+    assert cache.evictions == 1
+    assert cache.get(keys[1]) is None
+    assert all(cache.get(key) is not None for key in (keys[0], keys[2], keys[3]))
+
+
+def test_new_entry_is_kept_even_if_over_limit(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"), max_bytes=10)
+    cache.put(make_key("a"), {"value": "x" * 100})
+    cache.put(make_key("b"), {"value": "x" * 100})
+    assert cache.get(make_key("a")) is None
+    assert cache.get(make_key("b")) == {"value": "x" * 100}
+
+
+def test_recency_survives_reopening(tmp_path):
+    size = entry_size(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+    cache = ExtractionCache(cache_dir, max_bytes=10 * size)
+    keys = [make_key(i) for i in range(3)]
+    for mtime, key in enumerate(keys):
+        cache.put(key, {"value": "x" * 100})
+        os.utime(cache._path(key), (1000 + mtime, 1000 + mtime))
+
+    reopened = ExtractionCache(cache_dir, max_bytes=3 * size)
+    assert reopened._total == 3 * size
+    reopened.get(keys[0])
+    reopened.put(make_key("new"), {"value": "x" * 100})
+    assert reopened.get(keys[1]) is None
+    assert reopened.get(keys[0]) is not None
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    cache.get(make_key("missing"))
+    cache.put(make_key("here"), {})
+    cache.get(make_key("here"))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_key_ignores_where_and_how_long_the_model_is_served():
+    config = build_provider_config("ollama", "llama3.1:latest")
+    moved = copy.deepcopy(config)
+    moved["model_url"] = "http://gpu-box:11434"
+    moved["language_model_params"]["timeout"] = 30
+    moved["language_model_params"]["keep_alive"] = 60
+    assert _cache_key("chunk", "prompt", [], moved) == _cache_key("chunk", "prompt", [], config)
+
+
+def test_cache_key_changes_with_the_model_and_its_options():
+    config = build_provider_config("ollama", "llama3.1:latest")
+    other_model = build_provider_config("ollama", "qwen3:8b")
+    other_ctx = copy.deepcopy(config)
+    other_ctx["language_model_params"]["num_ctx"] = 4096
+    key = _cache_key("chunk", "prompt", [], config)
+    assert _cache_key("chunk", "prompt", [], other_model) != key
+    assert _cache_key("chunk", "prompt", [], other_ctx) != key
+    assert _cache_key("other chunk", "prompt", [], config) != key
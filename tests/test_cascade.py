@@ -0,0 +1,126 @@
+import pytest
+
+from extract import ModelCascade, build_alias_index
+from metrics import METRICS
+
+data = pytest.importorskip("langextract.data")
+
+KNOWN = build_alias_index([
+    {"name": name, "faction": "", "role": "", "description": ""} for name in ("Garviel Loken", "Tarik Torgaddon")
+])
+
+
+def character(name):
+    return data.Extraction("character", name)
+
+
+def relationship(source, target):
+    return data.Extraction(
+        "relationship", f"{source} and {target}",
+        attributes={"source_character": source, "target_character": target, "type": "ally"},
+    )
+
+
+def document(*extractions):
+    return data.AnnotatedDocument(text="chunk", extractions=list(extractions))
+
+
+CASCADE = ModelCascade([{"model_id": "small"}, {"model_id": "large"}], max_unresolved=0.5)
+
+
+def test_empty_result_escalates():
+    assert CASCADE.escalation_reason(document(), KNOWN) == "empty"
+
+
+def test_resolved_relationships_are_kept():
+    assert CASCADE.escalation_reason(document(relationship("Loken", "Torgaddon")), KNOWN) is None
+
+
+def test_mostly_unresolved_names_escalate():
+    result = document(relationship("Loken", "Sejanus"), relationship("Vipus", "Abaddon"))
+    assert CASCADE.escalation_reason(result, KNOWN) == "unresolved"
+
+
+def test_unresolved_share_up_to_the_threshold_is_kept():
+    result = document(relationship("Loken", "Sejanus"), relationship("Torgaddon", "Abaddon"))
+    assert CASCADE.escalation_reason(result, KNOWN) is None
+    strict = ModelCascade(CASCADE.configs, max_unresolved=0.25)
+    assert strict.escalation_reason(result, KNOWN) == "unresolved"
+
+
+def test_characters_found_in_the_chunk_count_as_known():
+    result = document(character("Hastur Sejanus"), relationship("Loken", "Sejanus"))
+    assert CASCADE.escalation_reason(result, KNOWN) is None
+
+
+def test_nothing_known_yet_does_not_escalate():
+    assert CASCADE.escalation_reason(document(relationship("Loken", "Sejanus")), {}) is None
+
+
+def test_characters_only_result_is_kept():
+    assert CASCADE.escalation_reason(document(character("Loken")), KNOWN) is None
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """Fake lx.extract() answering per model ID from a dict of callables."""
+    import langextract
+
+    behaviour = {}
+    calls = []
+
+    def extract(text_or_documents, model_id, **kwargs):
+        calls.append(model_id)
+        return behaviour[model_id]()
+
+    monkeypatch.setattr(langextract, "extract", extract)
+    monkeypatch.setattr("extract.MAX_RETRIES", 0)
+    return behaviour, calls
+
+
+def test_cascade_escalates_to_the_next_model(models):
+    from extract import _extract_cascade
+
+    behaviour, calls = models
+    behaviour["small"] = lambda: document()
+    behaviour["large"] = lambda: document(character("Loken"))
+    escalated = METRICS.total("cascade_escalations", model="small", reason="empty")
+    result = _extract_cascade("chunk", "prompt", [], CASCADE, KNOWN)
+    assert calls == ["small", "large"]
+    assert [e.extraction_text for e in result.extractions] == ["Loken"]
+    assert METRICS.total("cascade_escalations", model="small", reason="empty") == escalated + 1
+
+
+def test_cascade_stops_at_the_first_usable_result(models):
+    from extract import _extract_cascade
+
+    behaviour, calls = models
+    behaviour["small"] = lambda: document(relationship("Loken", "Torgaddon"))
+    _extract_cascade("chunk", "prompt", [], CASCADE, KNOWN)
+    assert calls == ["small"]
+
+
+def test_failed_chunk_escalates_and_the_last_model_result_is_kept(models):
+    from extract import _extract_cascade
+
+    def fail():
+        raise RuntimeError("Failed to parse JSON output")
+
+    behaviour, calls = models
+    behaviour["small"] = fail
+    behaviour["large"] = lambda: document()
+    result = _extract_cascade("chunk", "prompt", [], CASCADE, KNOWN)
+    assert calls == ["small", "large"]
+    assert result.extractions == []
+
+
+def test_last_model_failing_raises(models):
+    from extract import ChunkExtractionError, _extract_cascade
+
+    def fail():
+        raise RuntimeError("Failed to parse JSON output")
+
+    behaviour, _ = models
+    behaviour["small"] = behaviour["large"] = fail
+    with pytest.raises(ChunkExtractionError):
+        _extract_cascade("chunk", "prompt", [], CASCADE, KNOWN)
@@ -0,0 +1,63 @@
+from extract import (
+    CONTEXT_SIZE,
+    MIN_CHUNK_TOKENS,
+    _chunk_spans,
+    _chunk_text,
+    _prompt_tokens,
+    chunk_token_budget,
+    estimate_tokens,
+)
+
+SENTENCE = "Loken walked the long corridor of the Vengeful Spirit in silence. "
+TEXT = "".join(SENTENCE * 6 + "\n\n" for _ in range(20))
+
+
+def test_chunks_fit_budget_and_cover_text():
+    spans = _chunk_spans(TEXT, 120)
+    assert len(spans) > 1
+    assert spans[0][0] == 0 and spans[-1][1] == len(TEXT)
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert end == start
+    for start, end in spans:
+        assert estimate_tokens(TEXT[start:end]) <= 120
+
+
+def test_chunks_break_at_sentences():
+    for chunk in _chunk_text(TEXT, 120):
+        assert chunk.rstrip().endswith(".")
+
+
+def test_chunks_prefer_paragraph_ends():
+    paragraph_tokens = estimate_tokens(SENTENCE * 6 + "\n\n")
+    # Room for one and a half paragraphs: the chunk stops at the first one
+    for chunk in _chunk_text(TEXT, paragraph_tokens * 3 // 2)[:-1]:
+        assert chunk.endswith("\n\n")
+
+
+def test_overlap_repeats_trailing_sentences():
+    spans = _chunk_spans(TEXT, 120, overlap=30)
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert start < end
+        assert estimate_tokens(TEXT[start:end]) <= 30
+
+
+def test_overlong_sentence_is_split_at_whitespace():
+    text = "word " * 500 + "."
+    spans = _chunk_spans(text, 100)
+    assert "".join(text[start:end] for start, end in spans) == text
+    assert all(estimate_tokens(text[start:end]) <= 100 for start, end in spans)
+
+
+def test_empty_text_has_no_chunks():
+    assert _chunk_spans("", 100) == []
+
+
+def test_budget_leaves_room_for_prompt():
+    config = {"language_model_params": {"num_ctx": 8192}}
+    prompt = "Extract every character. " * 20
+    assert chunk_token_budget(prompt, [], config, fill=0.5) == 4096 - _prompt_tokens(prompt, [])
+
+
+def test_budget_defaults_and_floor():
+    assert chunk_token_budget("", [], {}, fill=1.0) == CONTEXT_SIZE - _prompt_tokens("", [])
+    assert chunk_token_budget("x " * 5000, [], {"language_model_params": {"num_ctx": 1024}}) == MIN_CHUNK_TOKENS
@@ -0,0 +1,60 @@
+import os
+
+from corpus import CorpusStore, file_sha256
+
+LOKEN = {"name": "Loken", "faction": "Luna Wolves", "role": "Captain", "description": ""}
+
+
+def test_new_books_are_added(tmp_path):
+    corpus = CorpusStore(str(tmp_path / "books"))
+    assert corpus.plan({"a.pdf": "1", "b.pdf": "2"}, "fp") == {
+        "added": ["a.pdf", "b.pdf"], "changed": [], "unchanged": [], "removed": [],
+    }
+
+
+def test_only_new_or_changed_books_are_extracted(tmp_path):
+    corpus = CorpusStore(str(tmp_path / "books"))
+    corpus.save_book("a.pdf", "1", "fp", [LOKEN], [])
+    corpus.save_book("b.pdf", "2", "fp", [], [])
+    plan = CorpusStore(str(tmp_path / "books")).plan({"a.pdf": "1", "b.pdf": "3", "c.pdf": "4"}, "fp")
+    assert plan == {"added": ["c.pdf"], "changed": ["b.pdf"], "unchanged": ["a.pdf"], "removed": []}
+
+
+def test_new_fingerprint_changes_every_book(tmp_path):
+    corpus = CorpusStore(str(tmp_path / "books"))
+    corpus.save_book("a.pdf", "1", "fp", [], [])
+    assert corpus.plan({"a.pdf": "1"}, "other model")["changed"] == ["a.pdf"]
+
+
+def test_incomplete_book_counts_as_changed_until_saved_whole(tmp_path):
+    corpus = CorpusStore(str(tmp_path / "books"))
+    corpus.save_book("a.pdf", "1", "fp", [], [], complete=False)
+    assert CorpusStore(str(tmp_path / "books")).plan({"a.pdf": "1"}, "fp")["changed"] == ["a.pdf"]
+    corpus.save_book("a.pdf", "1", "fp", [LOKEN], [])
+    assert CorpusStore(str(tmp_path / "books")).plan({"a.pdf": "1"}, "fp")["unchanged"] == ["a.pdf"]
+
+
+def test_removed_books_are_pruned_only_for_a_whole_library(tmp_path):
+    corpus = CorpusStore(str(tmp_path / "books"))
+    corpus.save_book("a.pdf", "1", "fp", [], [])
+    corpus.save_book("b.pdf", "2", "fp", [], [])
+    assert corpus.plan({"a.pdf": "1"}, "fp", prune=False)["removed"] == []
+    assert corpus.plan({"a.pdf": "1"}, "fp")["removed"] == ["b.pdf"]
+    corpus.remove_book("b.pdf")
+    assert [artifact["book"] for artifact in corpus.load_books()] == ["a.pdf"]
+    assert not os.path.exists(os.path.join(corpus.corpus_dir, "2.json"))
+
+
+def test_artifact_shared_by_two_names_survives_removing_one(tmp_path):
+    corpus = CorpusStore(str(tmp_path / "books"))
+    corpus.save_book("a.pdf", "1", "fp", [LOKEN], [])
+    corpus.save_book("copy of a.pdf", "1", "fp", [LOKEN], [])
+    corpus.remove_book("copy of a.pdf")
+    assert corpus.load_books()[0]["characters"] == [LOKEN]
+
+
+def test_file_hash_is_content_based(tmp_path):
+    first, second = tmp_path / "first.pdf", tmp_path / "second.pdf"
+    first.write_bytes(b"%PDF" * 1000)
+    second.write_bytes(b"%PDF" * 1000)
+    assert file_sha256(str(first)) == file_sha256(str(second))
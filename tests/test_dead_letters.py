@@ -0,0 +1,28 @@
+import json
+
+from journal import DeadLetters
+
+
+def test_dead_letters_round_trip(tmp_path):
+    path = str(tmp_path / "dead_letters.jsonl")
+    dead = DeadLetters(path)
+    dead.record("a.pdf", "characters", 0, 0, "first chunk", "timeout", "timed out", 6)
+    dead.record("a.pdf", "characters", 1, 100, "second chunk", "parse", "bad JSON", 3)
+    dead.record("b.pdf", "relationships", 0, 0, "other book", "other", "boom", 3)
+    dead.resolve("a.pdf", "characters", 0, "first chunk")
+
+    # The appended log is replayed on open, before close() compacts it
+    reopened = DeadLetters(path)
+    assert [(e["book"], e["chunk"]) for e in reopened.entries()] == [("a.pdf", 1), ("b.pdf", 0)]
+    entry = reopened.entries()[0]
+    assert (entry["text"], entry["offset"], entry["error_kind"], entry["attempts"]) == ("second chunk", 100, "parse", 3)
+    reopened.close()
+    dead.close()
+
+    dead = DeadLetters(path)
+    dead.discard_books(["b.pdf"])
+    dead.close()
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert [(e["book"], e["chunk"]) for e in lines] == [("a.pdf", 1)]
+    assert len(DeadLetters(path)) == 1
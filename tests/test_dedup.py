@@ -0,0 +1,71 @@
+import random
+
+from extract import _DisjointSet, deduplicate_characters
+
+
+def character(name, faction="Unknown", role="Unknown", description=""):
+    return {"name": name, "faction": faction, "role": role, "description": description}
+
+
+def names(characters):
+    return sorted(c["name"] for c in characters)
+
+
+def test_disjoint_set_unions_transitively():
+    sets = _DisjointSet(5)
+    sets.union(0, 1)
+    sets.union(1, 2)
+    assert sets.find(0) == sets.find(2)
+    assert sets.find(3) != sets.find(0)
+    assert sets.size[sets.find(0)] == 3
+
+
+def test_name_variants_merge_into_longest_name():
+    result = deduplicate_characters([
+        character("Loken"),
+        character("Garviel Loken", faction="Luna Wolves"),
+        character("Captain Loken", role="Captain", description="Captain of the Tenth"),
+        character("Captain Garviel Loken"),
+    ])
+    assert len(result) == 1
+    merged = result[0]
+    assert merged["name"] == "Captain Garviel Loken"
+    assert merged["role"] == "Captain"
+    assert merged["faction"] == "Luna Wolves"
+    assert merged["description"] == "Captain of the Tenth"
+
+
+def test_merging_is_transitive():
+    result = deduplicate_characters([character("Ezekyle Abaddon"), character("Abaddon"), character("Ezekyle")])
+    assert len(result) == 1
+
+
+def test_titles_do_not_merge_characters():
+    result = deduplicate_characters([character("Captain Loken"), character("Captain Torgaddon")])
+    assert names(result) == ["Captain Loken", "Captain Torgaddon"]
+
+
+def test_title_only_names_merge_with_exact_repeats():
+    result = deduplicate_characters([character("The Emperor"), character("the  emperor"), character("Warmaster")])
+    assert len(result) == 2
+
+
+def test_most_specific_faction_and_role_win():
+    result = deduplicate_characters([
+        character("Horus", faction="Astartes", role="Primarch"),
+        character("Horus Lupercal", faction="Luna Wolves Legion", role="Warmaster"),
+    ])
+    assert result[0]["faction"] == "Luna Wolves Legion"
+    assert result[0]["role"] == "Warmaster"
+
+
+def test_grouping_does_not_depend_on_input_order():
+    characters = [
+        character("Loken"), character("Garviel Loken"), character("Tarik Torgaddon"), character("Torgaddon"),
+        character("Abaddon"), character("Ezekyle Abaddon"), character("Little Horus Aximand"), character("Horus"),
+    ]
+    expected = names(deduplicate_characters(characters))
+    for seed in range(5):
+        shuffled = characters[:]
+        random.Random(seed).shuffle(shuffled)
+        assert names(deduplicate_characters(shuffled)) == expected
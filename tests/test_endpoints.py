@@ -0,0 +1,128 @@
+import pytest
+
+import endpoints
+from endpoints import EJECT_AFTER_FAILURES, EndpointPool
+
+A, B = "http://a:11434", "http://b:11434"
+
+
+class FakeHTTP:
+    """Answers health checks with 200 unless the URL is marked down."""
+
+    def __init__(self):
+        self.down = set()
+
+    def get(self, url, **kwargs):
+        return type("Response", (), {"status_code": 503 if url.rsplit("/api/", 1)[0] in self.down else 200})()
+
+
+@pytest.fixture
+def http(monkeypatch):
+    http = FakeHTTP()
+    monkeypatch.setattr(endpoints, "HTTP", http)
+    return http
+
+
+@pytest.fixture
+def make_pool(http):
+    pools = []
+
+    def make(urls=(A, B), make_model=lambda url, model_id, http: (url, model_id)):
+        pool = EndpointPool(list(urls), make_model, health_interval=3600)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def fail(pool, message, exclude=()):
+    with pytest.raises(RuntimeError):
+        with pool.acquire(exclude) as endpoint:
+            raise RuntimeError(message)
+    return endpoint
+
+
+def test_requests_spread_over_endpoints_in_flight(make_pool):
+    pool = make_pool()
+    with pool.acquire() as first, pool.acquire() as second:
+        assert {first.url, second.url} == {A, B}
+
+
+def test_faster_endpoint_gets_the_request(make_pool):
+    pool = make_pool()
+    pool.endpoints[0].latency = 10.0
+    pool.endpoints[1].latency = 1.0
+    with pool.acquire() as endpoint:
+        assert endpoint.url == B
+    # Until enough requests queue up on it that the slow one is the shorter wait
+    pool.endpoints[1].in_flight = 20
+    with pool.acquire() as endpoint:
+        assert endpoint.url == A
+
+
+def test_excluded_endpoint_is_avoided(make_pool):
+    pool = make_pool()
+    pool.endpoints[1].latency = 0.001
+    with pool.acquire(exclude={B}) as endpoint:
+        assert endpoint.url == A
+    # Unless nothing else is left
+    with pool.acquire(exclude={A, B}) as endpoint:
+        assert endpoint.url in (A, B)
+
+
+def test_endpoint_failing_its_health_check_is_routed_around(http, make_pool):
+    http.down.add(A)
+    pool = make_pool()
+    assert [e.healthy for e in pool.endpoints] == [False, True]
+    for _ in range(3):
+        with pool.acquire() as endpoint:
+            assert endpoint.url == B
+    http.down.clear()
+    assert pool.check(pool.endpoints[0])
+    assert pool.endpoints[0].healthy
+
+
+def test_requests_still_routed_when_every_endpoint_is_down(http, make_pool):
+    http.down.update({A, B})
+    pool = make_pool()
+    with pool.acquire() as endpoint:
+        assert endpoint.url in (A, B)
+
+
+def test_transport_errors_eject_an_endpoint_that_passes_health_checks(make_pool):
+    pool = make_pool(urls=(A,))
+    for _ in range(EJECT_AFTER_FAILURES):
+        fail(pool, "Bad status code from Ollama: 503")
+    endpoint = pool.endpoints[0]
+    assert (endpoint.healthy, endpoint.failures, endpoint.ejections) == (False, EJECT_AFTER_FAILURES, 1)
+
+
+def test_model_errors_do_not_count_against_the_endpoint(make_pool):
+    pool = make_pool(urls=(A,))
+    for _ in range(EJECT_AFTER_FAILURES + 1):
+        fail(pool, "Failed to parse JSON output")
+        fail(pool, "exceeded max context length")
+    endpoint = pool.endpoints[0]
+    assert (endpoint.healthy, endpoint.failures, endpoint.failure_streak, endpoint.latency) == (True, 0, 0, None)
+    assert endpoint.requests == 2 * (EJECT_AFTER_FAILURES + 1)
+
+
+def test_success_resets_the_failure_streak(make_pool):
+    pool = make_pool(urls=(A,))
+    for _ in range(EJECT_AFTER_FAILURES - 1):
+        fail(pool, "read timed out")
+    with pool.acquire():
+        pass
+    fail(pool, "read timed out")
+    assert pool.endpoints[0].healthy and pool.endpoints[0].failure_streak == 1
+
+
+def test_models_are_built_once_per_endpoint_and_model(make_pool):
+    built = []
+    pool = make_pool(make_model=lambda url, model_id, http: built.append((url, model_id)) or object())
+    endpoint = pool.endpoints[0]
+    assert endpoint.model("small") is endpoint.model("small")
+    endpoint.model("large")
+    assert built == [(A, "small"), (A, "large")]
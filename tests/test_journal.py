@@ -0,0 +1,37 @@
+from journal import RunJournal
+
+
+def test_journal_replays_completed_chunks_on_resume(tmp_path):
+    path = str(tmp_path / "run_journal.jsonl")
+    journal = RunJournal(path)
+    journal.record_chunk("book.pdf", "characters", 0, "chunk zero", {"extractions": [1]})
+    journal.record_failed_book("broken.pdf", "not a PDF")
+    journal.close()
+
+    resumed = RunJournal(path, resume=True)
+    assert resumed.get_chunk("book.pdf", "characters", 0, "chunk zero") == {"extractions": [1]}
+    assert resumed.resumed_chunks == 1
+    # Other passes, indexes and texts are not replayed, nor are failed books
+    assert resumed.get_chunk("book.pdf", "relationships", 0, "chunk zero") is None
+    assert resumed.get_chunk("book.pdf", "characters", 0, "rechunked text") is None
+    assert resumed.failed_books == {}
+    resumed.close()
+
+
+def test_journal_without_resume_starts_over(tmp_path):
+    path = str(tmp_path / "run_journal.jsonl")
+    journal = RunJournal(path)
+    journal.record_chunk("book.pdf", "characters", 0, "chunk zero", {})
+    journal.close()
+    RunJournal(path).close()
+    assert RunJournal(path, resume=True).get_chunk("book.pdf", "characters", 0, "chunk zero") is None
+
+
+def test_journal_skips_truncated_last_line(tmp_path):
+    path = tmp_path / "run_journal.jsonl"
+    journal = RunJournal(str(path))
+    journal.record_chunk("book.pdf", "characters", 0, "chunk zero", {"ok": True})
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"kind": "chunk", "book": "bo')
+    assert RunJournal(str(path), resume=True).get_chunk("book.pdf", "characters", 0, "chunk zero") == {"ok": True}
@@ -0,0 +1,57 @@
+import numpy as np
+
+from layout import NODE_SPACING, apply_layout, force_layout
+
+# Two triangles joined by one edge
+EDGES = [(0, 1, 1), (1, 2, 1), (2, 0, 1), (3, 4, 1), (4, 5, 1), (5, 3, 1), (2, 3, 1)]
+
+
+def test_same_seed_same_layout():
+    assert np.array_equal(force_layout(6, EDGES, iterations=50, seed=7), force_layout(6, EDGES, iterations=50, seed=7))
+    assert not np.array_equal(force_layout(6, EDGES, iterations=50, seed=7), force_layout(6, EDGES, iterations=50, seed=8))
+
+
+def test_layout_is_centred_and_separates_nodes():
+    pos = force_layout(6, EDGES, iterations=100)
+    assert np.allclose(pos.mean(axis=0), 0)
+    distances = np.linalg.norm(pos[:, None] - pos[None, :], axis=2)
+    assert distances[~np.eye(6, dtype=bool)].min() > 1
+
+
+def test_approximate_repulsion_for_large_graphs():
+    n = 600
+    edges = [(i, i + 1, 1) for i in range(n - 1)]
+    pos = force_layout(n, edges, iterations=10)
+    assert pos.shape == (n, 2) and np.isfinite(pos).all()
+    assert np.array_equal(pos, force_layout(n, edges, iterations=10))
+
+
+def test_warm_start_stays_closer_to_the_previous_layout_than_a_cold_start():
+    settled = force_layout(6, EDGES, iterations=300)
+    initial = np.vstack([settled, [[np.nan, np.nan]]])
+    edges = EDGES + [(6, 0, 1)]
+
+    def shift(pos):
+        return np.linalg.norm((pos[:6] - pos[:6].mean(axis=0)) - (settled - settled.mean(axis=0)), axis=1).max()
+
+    warm = force_layout(7, edges, iterations=30, initial=initial)
+    cold = force_layout(7, edges, iterations=30)
+    assert shift(warm) < shift(cold)
+
+
+def test_new_node_starts_next_to_its_placed_neighbour():
+    settled = force_layout(6, EDGES, iterations=300)
+    start = force_layout(7, EDGES + [(6, 0, 1)], iterations=0, initial=np.vstack([settled, [[np.nan, np.nan]]]))
+    assert np.allclose(start[:6] - start[:6].mean(axis=0), settled - settled.mean(axis=0))
+    assert np.linalg.norm(start[6] - start[0]) <= 2 * NODE_SPACING
+
+
+def test_apply_layout_adds_coordinates_and_uses_initial_positions():
+    graph = {
+        "nodes": [{"id": "a"}, {"id": "b"}, {"id": "c"}],
+        "edges": [{"source": "a", "target": "b", "weight": 2}, {"source": "b", "target": "c"}],
+    }
+    apply_layout(graph, iterations=0, initial={"a": (10.0, 0.0), "b": (-10.0, 0.0)})
+    assert all(isinstance(node["x"], float) and isinstance(node["y"], float) for node in graph["nodes"])
+    # With no steps only the re-centring moves the placed nodes
+    assert graph["nodes"][0]["x"] - graph["nodes"][1]["x"] == 20.0
@@ -0,0 +1,62 @@
+import json
+
+from metrics import Metrics
+
+
+def test_counters_and_summaries():
+    metrics = Metrics()
+    metrics.incr("chunks", extraction_pass="characters")
+    metrics.incr("chunks", 2, extraction_pass="characters")
+    metrics.observe("latency_seconds", 1.0)
+    metrics.observe("latency_seconds", 3.0)
+    assert metrics.total("chunks", extraction_pass="characters") == 3
+    assert metrics.total("latency_seconds") == 4.0
+    assert metrics.count("latency_seconds") == 2
+    assert metrics.total("never_recorded") == 0
+
+
+def test_prometheus_families():
+    metrics = Metrics()
+    metrics.incr("chunk_errors", kind="timeout")
+    metrics.incr("chunk_errors", kind="parse")
+    metrics.observe("stage_seconds", 1.5, stage="extract")
+    metrics.observe("stage_seconds", 0.5, stage="dedup")
+    lines = metrics.to_prometheus().splitlines()
+    assert lines == [
+        "# TYPE lore_graph_chunk_errors_total counter",
+        'lore_graph_chunk_errors_total{kind="parse"} 1',
+        'lore_graph_chunk_errors_total{kind="timeout"} 1',
+        "# TYPE lore_graph_stage_seconds summary",
+        'lore_graph_stage_seconds_sum{stage="dedup"} 0.5',
+        'lore_graph_stage_seconds_count{stage="dedup"} 1',
+        'lore_graph_stage_seconds_sum{stage="extract"} 1.5',
+        'lore_graph_stage_seconds_count{stage="extract"} 1',
+        "# TYPE lore_graph_stage_seconds_max gauge",
+        'lore_graph_stage_seconds_max{stage="dedup"} 0.5',
+        'lore_graph_stage_seconds_max{stage="extract"} 1.5',
+    ]
+
+
+def test_prometheus_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.incr("books", book='Horus "Rising"\\vol\n1')
+    assert metrics.to_prometheus().splitlines()[1] == 'lore_graph_books_total{book="Horus \\"Rising\\"\\\\vol\\n1"} 1'
+
+
+def test_unlabelled_series():
+    metrics = Metrics()
+    metrics.incr("chunk_attempts")
+    assert "lore_graph_chunk_attempts_total 1" in metrics.to_prometheus().splitlines()
+
+
+def test_report_and_textfile(tmp_path):
+    metrics = Metrics()
+    metrics.incr("chunks")
+    prom_path = metrics.write_report(str(tmp_path / "run_report.json"), {"model": "llama3.1"})
+    with open(tmp_path / "run_report.json") as f:
+        report = json.load(f)
+    assert report["model"] == "llama3.1"
+    assert report["metrics"]["counters"] == [{"name": "chunks", "labels": {}, "value": 1}]
+    assert prom_path == str(tmp_path / "run_report.prom")
+    with open(prom_path) as f:
+        assert f.read() == metrics.to_prometheus()
@@ -0,0 +1,98 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from endpoints import _SessionHTTP
+from extract import OLLAMA_KEEP_ALIVE, _ollama_model, build_provider_config
+
+TIMINGS = {
+    "total_duration": 900_000_000, "load_duration": 1_000_000, "prompt_eval_count": 42,
+    "prompt_eval_duration": 300_000_000, "eval_count": 7, "eval_duration": 500_000_000,
+}
+
+
+@pytest.fixture
+def ollama():
+    """A minimal Ollama /api/generate that records every request body."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            body = json.dumps({"model": "fake", "response": "{}", "done": True, **TIMINGS}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def model(ollama):
+    pytest.importorskip("langextract")
+    url, requests = ollama
+    http = _SessionHTTP()
+    config = build_provider_config("ollama", "llama3.1:latest")
+    return _ollama_model(config, url, "llama3.1:latest", http), http, requests
+
+
+def test_request_carries_a_top_level_keep_alive(model):
+    model, _, requests = model
+    list(model.infer(["Who is Loken?"]))
+    assert requests[0]["keep_alive"] == OLLAMA_KEEP_ALIVE
+
+
+def test_timings_of_the_last_response_are_kept_once(model):
+    model, http, _ = model
+    list(model.infer(["Who is Loken?"]))
+    assert http.take_timings() == TIMINGS
+    assert http.take_timings() is None
+
+
+def test_timings_are_per_thread(model):
+    model, http, _ = model
+    list(model.infer(["Who is Loken?"]))
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(http.take_timings()))
+    thread.start()
+    thread.join()
+    assert seen == [None]
+    assert http.take_timings() == TIMINGS
+
+
+def test_keep_alive_is_copied_from_options(ollama):
+    url, requests = ollama
+    http = _SessionHTTP()
+    http.post(f"{url}/api/generate", json={"model": "fake", "options": {"keep_alive": 60, "num_ctx": 4096}})
+    http.post(f"{url}/api/generate", json={"model": "fake", "keep_alive": 5, "options": {"keep_alive": 60}})
+    http.post(f"{url}/api/generate", json={"model": "fake", "options": {"num_ctx": 4096}})
+    assert [r.get("keep_alive") for r in requests] == [60, 5, None]
+
+
+def test_missing_transport_hook_is_reported_once(monkeypatch, capsys):
+    factory = pytest.importorskip("langextract.factory")
+
+    class NoHook:
+        pass
+
+    monkeypatch.setattr(factory, "create_model", lambda *args, **kwargs: NoHook())
+    config = build_provider_config("ollama", "llama3.1:latest")
+    for _ in range(2):
+        assert isinstance(_ollama_model(config, "http://localhost:11434", "llama3.1:latest"), NoHook)
+    assert capsys.readouterr().err.count("Warning: NoHook has no _requests") == 1
+
+
+def test_installed_provider_takes_the_transport(model):
+    model, http, _ = model
+    assert model._requests is http
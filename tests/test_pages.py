@@ -0,0 +1,59 @@
+import pytest
+
+from extract import book_provenance, extract_pdf_pages, page_for_offset
+
+
+def test_offsets_map_to_pages():
+    # Pages 1-3 start at 0, 100 and 250; page 4 is blank
+    page_starts = [0, 100, 250, 250]
+    assert page_for_offset(page_starts, 0) == 1
+    assert page_for_offset(page_starts, 99) == 1
+    assert page_for_offset(page_starts, 100) == 2
+    assert page_for_offset(page_starts, 249) == 2
+    # Text after a blank page belongs to the page after it
+    assert page_for_offset(page_starts, 250) == 4
+    assert page_for_offset(page_starts, 10_000) == 4
+
+
+def test_offsets_before_any_page_are_page_one():
+    assert page_for_offset([], 0) == 1
+    assert page_for_offset([5, 10], 2) == 1
+
+
+def test_pdf_page_starts(tmp_path):
+    pymupdf = pytest.importorskip("pymupdf")
+    path = str(tmp_path / "book.pdf")
+    doc = pymupdf.open()
+    for text in ("First page.", None, "Third page."):
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+    text, page_starts = extract_pdf_pages(path)
+    assert len(page_starts) == 3
+    assert page_starts[1] == page_starts[2]
+    assert text[page_starts[2]:].startswith("Third page.")
+    assert page_for_offset(page_starts, text.index("Third")) == 3
+
+
+def test_provenance_keeps_the_first_page_of_each_book():
+    characters = [
+        {"name": "Garviel Loken", "faction": "", "role": "", "description": ""},
+        {"name": "Tarik Torgaddon", "faction": "", "role": "", "description": ""},
+    ]
+    books = [
+        ("a.pdf", [{"name": "Loken", "page": 12}, {"name": "Garviel Loken", "page": 3}], [
+            {"source_character": "Loken", "target_character": "Torgaddon", "type": "ally", "page": 40},
+            {"source_character": "Loken", "target_character": "Torgaddon", "type": "ally", "page": 7},
+        ]),
+        ("b.pdf", [{"name": "Loken"}], []),
+    ]
+    provenance = book_provenance(books, characters)
+    assert sorted(provenance["nodes"]) == [
+        ("garviel-loken", "a.pdf", 2, 3),
+        ("garviel-loken", "b.pdf", 1, None),
+        ("tarik-torgaddon", "a.pdf", 0, None),
+    ]
+    assert provenance["edges"] == [("garviel-loken", "tarik-torgaddon", "ally", "a.pdf", 2, 7)]
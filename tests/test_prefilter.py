@@ -0,0 +1,59 @@
+from prefilter import DRAMATIS_MAX_CHARS, NameAutomaton, RelationshipPrefilter, find_dramatis_personae
+
+ALIASES = {"garviel loken": "loken", "loken": "loken", "torgaddon": "torgaddon", "horus": "horus"}
+
+
+def test_automaton_finds_whole_word_names():
+    automaton = NameAutomaton(ALIASES)
+    assert automaton.labels("Loken and TORGADDON walked in.") == {"loken", "torgaddon"}
+    assert automaton.labels("Garviel\n  Loken spoke.") == {"loken"}
+
+
+def test_automaton_ignores_names_inside_words():
+    automaton = NameAutomaton(ALIASES)
+    assert automaton.labels("The Horusian fleet and the Lokenites.") == set()
+
+
+def test_automaton_finds_overlapping_patterns():
+    automaton = NameAutomaton({"horus": "horus", "horus aximand": "aximand", "aximand": "aximand"})
+    assert automaton.labels("Horus Aximand laughed.") == {"horus", "aximand"}
+
+
+def test_automaton_with_no_names():
+    assert NameAutomaton({}).labels("Anything at all.") == set()
+
+
+def test_prefilter_needs_two_names():
+    prefilter = RelationshipPrefilter(ALIASES)
+    assert prefilter.worth_extracting("Loken saluted Torgaddon.")
+    assert not prefilter.worth_extracting("Loken stood alone on the deck. He waited.")
+
+
+def test_unknown_capitalised_names_count_as_candidates():
+    prefilter = RelationshipPrefilter(ALIASES)
+    assert prefilter.candidates("Loken met with Nero Vipus.") == {"loken", "?nero vipus"}
+    assert prefilter.worth_extracting("Loken met with Nero Vipus.")
+
+
+def test_sentence_start_does_not_make_a_name():
+    prefilter = RelationshipPrefilter(ALIASES)
+    # "The Warmaster" at a sentence start is one capitalised word, not two
+    assert prefilter.candidates("Loken waited. The Warmaster came.") == {"loken"}
+
+
+def test_dramatis_personae_section():
+    text = "Front matter\n\nDRAMATIS PERSONAE\nGarviel Loken, Captain\nHorus, Warmaster\n\nPrologue\nIt begins."
+    start, end = find_dramatis_personae(text)
+    assert text[start:end].startswith("DRAMATIS PERSONAE")
+    assert "Horus, Warmaster" in text[start:end]
+    assert text[end:].startswith("Prologue")
+
+
+def test_dramatis_personae_is_bounded():
+    text = "Dramatis Personae\n" + "Loken, Captain\n" * 5000
+    start, end = find_dramatis_personae(text)
+    assert end - start == DRAMATIS_MAX_CHARS
+
+
+def test_book_without_dramatis_personae():
+    assert find_dramatis_personae("Chapter One\nLoken woke.") is None
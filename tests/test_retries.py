@@ -0,0 +1,136 @@
+import random
+
+import pytest
+
+import scheduler
+from extract import _split_point
+from scheduler import ERROR_KINDS, TRANSIENT_ERRORS, backoff_delay, classify_error
+
+
+@pytest.mark.parametrize("message, kind", [
+    ("Ollama Model timed out (timeout=600, num_threads=None)", "timeout"),
+    ("Read timeout", "timeout"),
+    ("Bad status code from Ollama: 503", "unavailable"),
+    ("Bad status code from Ollama: 500", "unavailable"),
+    ("Server overloaded, try again", "unavailable"),
+    ("Connection refused", "unavailable"),
+    ("429 Too Many Requests", "rate_limit"),
+    ("RESOURCE_EXHAUSTED: quota exceeded", "rate_limit"),
+    ("Prompt too long: exceeded max context length", "overflow"),
+    ("Failed to parse JSON output", "parse"),
+    ("something else went wrong", "other"),
+    # Status codes only match as whole numbers
+    ("chunk 15030 failed", "other"),
+])
+def test_errors_are_classified_from_their_message(message, kind):
+    assert classify_error(Exception(message)) == kind
+
+
+def test_transient_errors_are_error_kinds():
+    assert TRANSIENT_ERRORS < set(ERROR_KINDS)
+    assert "overflow" not in TRANSIENT_ERRORS and "parse" not in TRANSIENT_ERRORS
+
+
+def test_backoff_grows_exponentially_with_jitter(monkeypatch):
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: high)
+    assert [backoff_delay(n) for n in (1, 2, 3, 4)] == [
+        scheduler.BACKOFF_BASE_SECONDS * 2 ** i for i in range(4)
+    ]
+    assert backoff_delay(50) == scheduler.BACKOFF_MAX_SECONDS
+
+
+def test_backoff_is_jittered_within_its_cap():
+    random.seed(1)
+    delays = [backoff_delay(3) for _ in range(200)]
+    assert all(0 <= d <= scheduler.BACKOFF_BASE_SECONDS * 4 for d in delays)
+    assert len(set(delays)) > 100
+
+
+def test_split_at_the_sentence_break_nearest_the_middle():
+    chunk = "First sentence here. Second one is here. Third sentence is the last one."
+    split = _split_point(chunk)
+    assert chunk[:split] == "First sentence here. Second one is here. "
+
+
+def test_split_at_a_paragraph_break():
+    chunk = "a" * 40 + "\n\n" + "b" * 40
+    assert _split_point(chunk) == 42
+
+
+def test_split_at_whitespace_without_sentence_breaks():
+    chunk = "word " * 20
+    split = _split_point(chunk)
+    assert chunk[split - 1] == " " and abs(split - len(chunk) // 2) <= 5
+
+
+def test_split_in_the_middle_as_a_last_resort():
+    assert _split_point("x" * 101) == 50
+
+
+class FakeModel:
+    """Stands in for lx.extract(): fails with the queued errors, then extracts
+    one character per chunk, and raises an overflow for chunks over max_chars."""
+
+    def __init__(self, errors=(), max_chars=None):
+        self.errors = list(errors)
+        self.max_chars = max_chars
+        self.chunks = []
+
+    def __call__(self, text_or_documents, **kwargs):
+        from langextract.data import AnnotatedDocument, CharInterval, Extraction
+
+        self.chunks.append(text_or_documents)
+        if self.errors:
+            raise RuntimeError(self.errors.pop(0))
+        if self.max_chars is not None and len(text_or_documents) > self.max_chars:
+            raise RuntimeError("exceeded max context length")
+        extraction = Extraction("character", text_or_documents[:5], char_interval=CharInterval(0, 5))
+        return AnnotatedDocument(text=text_or_documents, extractions=[extraction])
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    langextract = pytest.importorskip("langextract")
+    monkeypatch.setattr("extract.backoff_delay", lambda attempt: 0)
+
+    def install(**kwargs):
+        model = FakeModel(**kwargs)
+        monkeypatch.setattr(langextract, "extract", model)
+        return model
+
+    return install
+
+
+CONFIG = {"model_id": "fake"}
+
+
+def test_transient_errors_are_retried(fake_model):
+    from extract import _extract_chunk
+
+    model = fake_model(errors=["Bad status code from Ollama: 503", "read timed out"])
+    result = _extract_chunk("Loken spoke.", "prompt", [], CONFIG)
+    assert len(model.chunks) == 3
+    assert [e.extraction_text for e in result.extractions] == ["Loken"]
+
+
+def test_chunk_out_of_retries_raises_its_error_class(fake_model):
+    from extract import MAX_RETRIES, ChunkExtractionError, _extract_chunk
+
+    fake_model(errors=["Failed to parse JSON output"] * 10)
+    with pytest.raises(ChunkExtractionError) as raised:
+        _extract_chunk("Loken spoke.", "prompt", [], CONFIG)
+    assert (raised.value.kind, raised.value.attempts) == ("parse", MAX_RETRIES + 1)
+
+
+def test_overflowing_chunk_is_split_and_merged(fake_model):
+    from extract import MIN_SPLIT_CHARS, _extract_chunk
+
+    chunk = "Loken spoke to his brothers. " * 40
+    model = fake_model(max_chars=len(chunk) // 2 + MIN_SPLIT_CHARS // 10)
+    result = _extract_chunk(chunk, "prompt", [], CONFIG)
+    halves = model.chunks[1:]
+    assert "".join(halves) == chunk
+    assert result.text == chunk
+    # The second half's extraction is shifted back onto the whole chunk
+    starts = sorted(e.char_interval.start_pos for e in result.extractions)
+    assert starts == [0, len(halves[0])]
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from scheduler import AdaptiveLimiter, ChunkScheduler
+
+
+def test_limiter_halves_on_backpressure_and_grows_back():
+    limiter = AdaptiveLimiter(8, increase_after=2)
+    limiter.on_backpressure()
+    limiter.on_backpressure()
+    assert (limiter.limit, limiter.backoffs) == (2, 2)
+    for _ in range(4):
+        limiter.on_success()
+    assert limiter.limit == 4
+
+
+def test_limiter_stays_within_bounds():
+    limiter = AdaptiveLimiter(2, increase_after=1)
+    for _ in range(5):
+        limiter.on_backpressure()
+    assert limiter.limit == 1
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.limit == 2
+
+
+def test_map_keeps_input_order():
+    scheduler = ChunkScheduler(concurrency=4)
+    try:
+        done = []
+        results = scheduler.map(
+            lambda i: time.sleep(0.01 * (5 - i)) or i * i, list(range(5)), on_done=lambda i, r: done.append(i)
+        )
+    finally:
+        scheduler.shutdown()
+    assert results == [0, 1, 4, 9, 16]
+    assert sorted(done) == [0, 1, 2, 3, 4]
+
+
+def test_requests_in_flight_never_exceed_the_limit():
+    scheduler = ChunkScheduler(concurrency=3)
+    lock = threading.Lock()
+    in_flight = peak = 0
+
+    def request(_):
+        nonlocal in_flight, peak
+        with scheduler.limiter.slot():
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight -= 1
+
+    try:
+        scheduler.map(request, list(range(20)))
+    finally:
+        scheduler.shutdown()
+    assert peak == 3
+
+
+def test_chunk_backing_off_does_not_idle_its_slot():
+    scheduler = ChunkScheduler(concurrency=1)
+
+    def request(i):
+        with scheduler.limiter.slot():
+            time.sleep(0.02)
+        if i == 0:
+            # Waiting out a backoff, without the slot
+            time.sleep(0.3)
+
+    start = time.perf_counter()
+    try:
+        scheduler.map(request, list(range(6)))
+    finally:
+        scheduler.shutdown()
+    # The other five requests ran during the wait instead of after it
+    assert time.perf_counter() - start < 0.3 + 5 * 0.02
@@ -0,0 +1,95 @@
+import json
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+import server
+from extract import build_alias_index, build_graph_data
+from graphstore import GraphStore
+from server import static_path
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/", "/index.html"),
+    ("/index.html", "/index.html"),
+    ("/data/data.json", "/data/data.json"),
+    ("/data/visualization.html", "/data/visualization.html"),
+    ("/data/visualization/horus-rising-2.html", "/data/visualization/horus-rising-2.html"),
+    ("/data/../index.html", "/index.html"),
+    ("/data/%64ata.json", "/data/data.json"),
+])
+def test_allowlisted_files_are_served(path, expected):
+    assert static_path(path) == expected
+
+
+@pytest.mark.parametrize("path", [
+    "/.env",
+    "/%2eenv",
+    "/%2Egit/config",
+    "/data/%2e%2e/.env",
+    "/data/..%2f.env",
+    "/data/graph.db",
+    "/data/run_journal.jsonl",
+    "/data/extractions/book.pdf.jsonl",
+    "/data/visualization/../graph.db",
+    "/data/visualization/.hidden.html",
+    "/data/visualization/page.html/../../../main.py",
+    "/main.py",
+    "//etc/passwd",
+])
+def test_everything_else_is_refused(path):
+    assert static_path(path) is None
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "DEFAULT_QUERY_LIMIT", 3)
+    characters = [
+        {"name": name, "faction": "Luna Wolves", "role": "", "description": ""}
+        for name in ("Garviel Loken", "Tarik Torgaddon", "Ezekyle Abaddon", "Horus Aximand", "Nero Vipus")
+    ]
+    relationships = [
+        {"source_character": "Loken", "target_character": other, "type": "ally", "description": ""}
+        for other in ("Torgaddon", "Abaddon", "Aximand", "Vipus")
+    ]
+    graph = build_graph_data(characters, relationships)
+    store = GraphStore(str(tmp_path / "graph.db"))
+    store.replace(graph, build_alias_index(characters))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(server._handler(store), directory=str(tmp_path)))
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+
+    def get(path):
+        try:
+            with urlopen(f"http://127.0.0.1:{httpd.server_port}{path}") as response:
+                return response.status, json.load(response)
+        except HTTPError as e:
+            return e.code, json.load(e)
+
+    yield get
+    httpd.shutdown()
+    httpd.server_close()
+    store.close()
+
+
+@pytest.mark.parametrize("limit, expected", [("2", 2), ("3", 3), ("-1", 1), ("0", 1), ("100000", 3)])
+def test_limit_is_clamped(api, limit, expected):
+    status, payload = api(f"/api/top?limit={limit}")
+    assert status == 200
+    assert len(payload["nodes"]) == expected
+
+
+def test_default_limit_is_the_cap(api):
+    status, payload = api("/api/faction?name=Luna%20Wolves")
+    assert (status, len(payload["nodes"])) == (200, 3)
+
+
+@pytest.mark.parametrize("limit", ["abc", "1.5"])
+def test_non_integer_limit_is_rejected(api, limit):
+    status, payload = api(f"/api/top?limit={limit}")
+    assert status == 400
+    assert "error" in payload
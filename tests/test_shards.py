@@ -0,0 +1,52 @@
+import os
+
+from extract import _viz_slugs
+from shards import AnnotationShards
+
+
+def test_records_come_back_in_pass_and_chunk_order(tmp_path):
+    shards = AnnotationShards(str(tmp_path))
+    # Written in completion order
+    for pass_name, chunk in [("relationships", 0), ("characters", 2), ("characters", 0), ("characters", 1)]:
+        shards.write("a.pdf", pass_name, chunk, chunk * 100, {"text": f"{pass_name} {chunk}", "extractions": []})
+    records = list(shards.records("a.pdf"))
+    assert [(r["pass"], r["chunk"]) for r in records] == [
+        ("characters", 0), ("characters", 1), ("characters", 2), ("relationships", 0),
+    ]
+    assert records[2]["offset"] == 200
+    assert records[2]["document"] == {"text": "characters 2", "extractions": []}
+
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    shards = AnnotationShards(str(tmp_path))
+    shards.write("a.pdf", "characters", 0, 0, {"text": "ok"})
+    with open(shards.path("a.pdf"), "a") as f:
+        f.write('{"book": "a.pdf", "pass": "charac')
+    assert [r["document"]["text"] for r in shards.records("a.pdf")] == ["ok"]
+
+
+def test_reset_and_remove(tmp_path):
+    shards = AnnotationShards(str(tmp_path))
+    shards.write("a.pdf", "characters", 0, 0, {})
+    shards.write_pages("a.pdf", [0, 1200, 2400])
+    shards.reset("a.pdf")
+    assert list(shards.records("a.pdf")) == []
+    assert shards.page_starts("a.pdf") == [0, 1200, 2400]
+    shards.remove("a.pdf")
+    assert not os.path.exists(shards.path("a.pdf"))
+    assert shards.page_starts("a.pdf") is None
+    assert shards.index("a.pdf") == []
+
+
+def test_run_books(tmp_path):
+    shards = AnnotationShards(str(tmp_path))
+    assert shards.run_books() is None
+    shards.write_run_books(["b.pdf", "a.pdf"])
+    assert AnnotationShards(str(tmp_path)).run_books() == ["b.pdf", "a.pdf"]
+
+
+def test_visualization_slugs_stay_unique():
+    slugs = _viz_slugs(["Horus Rising.pdf", "Horus_Rising.pdf", "horus rising.pdf", "???"])
+    assert slugs["Horus Rising.pdf"] == "Horus-Rising.pdf"
+    assert slugs["???"] == "book"
+    assert len({slug.casefold() for slug in slugs.values()}) == 4
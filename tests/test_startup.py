@@ -0,0 +1,23 @@
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_MODULES = ("langextract", "pymupdf", "requests", "numpy")
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_importing_the_cli_loads_no_heavy_libraries():
+    # A fresh interpreter: other tests have already imported these libraries here
+    code = f"import sys, main; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    assert result.stdout.strip() == ""
+
+
+def test_graph_without_precomputed_layout_loads_no_numpy():
+    code = (
+        "import sys; from extract import build_graph_data; "
+        "build_graph_data([{'name': 'Garviel Loken', 'faction': '', 'role': '', 'description': ''}], []); "
+        "print('numpy' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    assert result.stdout.strip() == "False"
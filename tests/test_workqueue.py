@@ -0,0 +1,86 @@
+import pytest
+
+import workqueue
+from workqueue import WorkQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(workqueue.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"))
+    queue.enqueue([("book.pdf", "characters", 0, 0, "chunk zero"), ("book.pdf", "characters", 1, 50, "chunk one")])
+    yield queue
+    queue.close()
+
+
+def test_leased_task_is_not_claimed_again_before_expiry(queue, clock):
+    first = queue.claim("a", 1, lease_seconds=60)
+    second = queue.claim("b", 1, lease_seconds=60)
+    assert first[0]["id"] != second[0]["id"]
+    assert queue.claim("c", 1, lease_seconds=60) == []
+    assert queue.counts()["leased"] == 2
+
+
+def test_expired_lease_is_requeued(queue, clock):
+    task = queue.claim("a", 1, lease_seconds=60)[0]
+    queue.claim("b", 1, lease_seconds=60)
+    clock.now += 61
+    reclaimed = queue.claim("c", 2, lease_seconds=60)
+    assert {t["id"] for t in reclaimed} >= {task["id"]}
+    assert all(t["requeued"] for t in reclaimed)
+    assert queue.requeued() == 2
+
+
+def test_heartbeat_keeps_the_lease(queue, clock):
+    task = queue.claim("a", 1, lease_seconds=60)[0]
+    clock.now += 50
+    queue.heartbeat("a", [task["id"]], lease_seconds=60)
+    clock.now += 50
+    assert [t["id"] for t in queue.claim("b", 2, lease_seconds=60)] != [task["id"]]
+    assert queue.requeued() == 0
+
+
+def test_heartbeat_of_another_worker_does_not_extend(queue, clock):
+    task = queue.claim("a", 1, lease_seconds=60)[0]
+    clock.now += 50
+    queue.heartbeat("b", [task["id"]], lease_seconds=60)
+    clock.now += 50
+    assert task["id"] in [t["id"] for t in queue.claim("c", 2, lease_seconds=60)]
+
+
+def test_first_result_wins_after_expiry(queue, clock):
+    task = queue.claim("a", 1, lease_seconds=60)[0]
+    clock.now += 61
+    queue.claim("b", 1, lease_seconds=60)
+    queue.complete(task["id"], {"from": "a"})
+    queue.complete(task["id"], {"from": "b"})
+    assert list(queue.results([task["id"]])) == [{"from": "a"}]
+
+
+def test_failed_task_is_retried_then_left_failed(queue, clock):
+    queue.complete(queue.claim("a", 1, lease_seconds=60)[0]["id"], {})
+    for _ in range(workqueue.MAX_TASK_ATTEMPTS):
+        task = queue.claim("a", 1, lease_seconds=60)[0]
+        queue.fail(task["id"], "a", "timeout")
+    assert queue.claim("a", 1, lease_seconds=60) == []
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1, "failed": 1}
+
+
+def test_only_the_lease_holder_can_fail_a_task(queue, clock):
+    task = queue.claim("a", 1, lease_seconds=60)[0]
+    queue.fail(task["id"], "b", "not mine")
+    assert queue.counts()["leased"] == 1
@@ -0,0 +1,218 @@
+"""SQLite work queue of chunk tasks, shared by a coordinator and any number of workers."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+
+DEFAULT_QUEUE_NAME = "queue.db"
+# A worker that stops heartbeating for this long is presumed dead and its
+# tasks go back to the queue; well above the model's 600s request timeout
+DEFAULT_LEASE_SECONDS = 900
+# Tasks whose extraction failed this many times are left failed rather than retried
+MAX_TASK_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    book TEXT NOT NULL,
+    pass TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    requeues INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    UNIQUE (book, pass, chunk, hash)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+"""
+
+
+def _chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+class QueueConfigError(Exception):
+    """The queue was created for a different provider, model, prompts or chunking."""
+
+
+class WorkQueue:
+    """Chunk tasks with status pending -> leased -> done (or failed).
+
+    A worker claims tasks under a lease it keeps extending with heartbeat();
+    a task whose lease has expired is claimable again, so chunks held by a
+    crashed worker are picked up by the others. Every process opens its own
+    WorkQueue on the same file; SQLite's locking keeps claims atomic, so the
+    file must live on a local disk (or a filesystem with working locks).
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Autocommit, with explicit BEGIN IMMEDIATE where a read must not race a write
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def get_meta(self) -> dict:
+        with self._lock:
+            return {k: json.loads(v) for k, v in self._db.execute("SELECT key, value FROM meta")}
+
+    def set_meta(self, meta: dict) -> None:
+        """Record the run configuration workers need, refusing to mix two runs in one queue.
+
+        meta["fingerprint"] identifies the provider, model, prompts and chunking;
+        a queue that already holds a different fingerprint raises QueueConfigError.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+                if row is not None and json.loads(row[0]) != meta["fingerprint"]:
+                    raise QueueConfigError(
+                        f"{self.path} holds tasks for a different configuration; use a new queue file"
+                    )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    ((k, json.dumps(v)) for k, v in meta.items()),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, tasks: list[tuple[str, str, int, int, str]]) -> list[int]:
+        """Add (book, pass, chunk, offset, text) tasks and return their IDs in input order.
+
+        Tasks already in the queue with the same text keep their result, so
+        enqueueing a run again only adds what is missing; tasks that had
+        failed get a fresh set of attempts.
+        """
+        rows = [(book, pass_name, chunk, offset, _chunk_hash(text), text) for book, pass_name, chunk, offset, text in tasks]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO tasks (book, pass, chunk, offset, hash, text) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                ids = [
+                    self._db.execute(
+                        "SELECT id FROM tasks WHERE book = ? AND pass = ? AND chunk = ? AND hash = ?", row[:3] + row[4:5]
+                    ).fetchone()[0]
+                    for row in rows
+                ]
+                self._db.execute(
+                    "UPDATE tasks SET status = 'pending', attempts = 0 "
+                    "WHERE status = 'failed' AND id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(ids),),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return ids
+
+    def claim(self, worker: str, limit: int = 1, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> list[dict]:
+        """Lease up to limit pending or lease-expired tasks to worker.
+
+        Returns dicts with id, book, pass, chunk, offset and text.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, book, pass, chunk, offset, text, status FROM tasks "
+                    "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, "
+                    "requeues = requeues + (status = 'leased') WHERE id = ?",
+                    ((worker, now + lease_seconds, row[0]) for row in rows),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        keys = ("id", "book", "pass", "chunk", "offset", "text")
+        return [dict(zip(keys, row)) | {"requeued": row[6] == "leased"} for row in rows]
+
+    def heartbeat(self, worker: str, task_ids: list[int], lease_seconds: float = DEFAULT_LEASE_SECONDS) -> None:
+        """Extend worker's leases on task_ids."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET lease_expires = ? "
+                "WHERE id IN (SELECT value FROM json_each(?)) AND status = 'leased' AND worker = ?",
+                (time.time() + lease_seconds, json.dumps(list(task_ids)), worker),
+            )
+
+    def complete(self, task_id: int, result: dict) -> None:
+        """Store a task's annotated document (as annotated_document_to_dict).
+
+        A result is accepted even if the lease expired meanwhile; whichever
+        worker finishes first wins and later results for the task are dropped.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET status = 'done', lease_expires = NULL, error = NULL, result = ? "
+                "WHERE id = ? AND status != 'done'",
+                (json.dumps(result, ensure_ascii=False), task_id),
+            )
+
+    def fail(self, task_id: int, worker: str, error: str, max_attempts: int = MAX_TASK_ATTEMPTS) -> None:
+        """Return worker's task to the queue, or mark it failed after max_attempts."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET attempts = attempts + 1, error = ?, lease_expires = NULL, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE id = ? AND status = 'leased' AND worker = ?",
+                (error, max_attempts, task_id, worker),
+            )
+
+    def counts(self, task_ids: list[int] | None = None) -> dict[str, int]:
+        """Number of tasks per status, over the whole queue or only task_ids."""
+        sql = "SELECT status, COUNT(*) FROM tasks"
+        params = ()
+        if task_ids is not None:
+            sql += " WHERE id IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(list(task_ids)),)
+        with self._lock:
+            counts = dict(self._db.execute(sql + " GROUP BY status", params).fetchall())
+        return {status: counts.get(status, 0) for status in ("pending", "leased", "done", "failed")}
+
+    def requeued(self) -> int:
+        """How many times a task was reclaimed after its worker's lease expired."""
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(requeues), 0) FROM tasks").fetchone()[0]
+
+    def results(self, task_ids: list[int]) -> Iterator[dict | None]:
+        """Yield the annotated document dict of each of task_ids in input order,
+        or None for tasks that failed or are unfinished. Documents are read one
+        at a time, so a large run is never held in memory at once."""
+        for task_id in task_ids:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT result FROM tasks WHERE id = ? AND status = 'done'", (task_id,)
+                ).fetchone()
+            yield json.loads(row[0]) if row else None